@@ -0,0 +1,189 @@
+"""Benchmark for constructing the neighbourhood reference groups of a synthetic city.
+
+Usage (from the repository root):
+    PYTHONPATH=src python benchmarks/bench_neighbourhoods.py --units 500 --neighbourhoods 100
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from hcp.eml_types import (
+    CandidateIdentifier,
+    IdentifierRegistry,
+    ReportingUnitInfo,
+)
+from hcp.neighbourhood import NeighbourhoodData, _build_reference_groups
+
+
+def legacy_reference_groups(
+    reporting_unit_id_to_neighbourhood_id: Dict[str, Optional[str]],
+    reporting_unit_info: Dict[str, ReportingUnitInfo],
+) -> Dict[str, ReportingUnitInfo]:
+    """The reference group construction as it was before it was done in a single pass:
+    every reporting unit is visited for every neighbourhood, and every addition
+    allocates a new dict."""
+
+    def add_dict(a, b):
+        return {key_a: a[key_a] + b[key_a] for key_a in a.keys()}
+
+    neighbourhood_id_to_reporting_unit_ids: Dict[str, Set[str]] = defaultdict(set)
+    for (
+        reporting_unit_id,
+        neighbourhood_id,
+    ) in reporting_unit_id_to_neighbourhood_id.items():
+        if neighbourhood_id:
+            neighbourhood_id_to_reporting_unit_ids[neighbourhood_id].add(
+                reporting_unit_id
+            )
+
+    reference_groups = {}
+    for (
+        neighbourhood_id,
+        reporting_unit_ids,
+    ) in neighbourhood_id_to_reporting_unit_ids.items():
+        summed_votes_per_party: dict = {}
+        summed_votes_per_candidate: dict = {}
+        for reporting_unit_id, reporting_unit in reporting_unit_info.items():
+            if reporting_unit_id not in reporting_unit_ids:
+                continue
+            if len(summed_votes_per_party) == 0:
+                summed_votes_per_party = reporting_unit.votes_per_party
+            else:
+                summed_votes_per_party = add_dict(
+                    summed_votes_per_party, reporting_unit.votes_per_party
+                )
+            if len(summed_votes_per_candidate) == 0:
+                summed_votes_per_candidate = reporting_unit.votes_per_candidate
+            else:
+                summed_votes_per_candidate = add_dict(
+                    summed_votes_per_candidate, reporting_unit.votes_per_candidate
+                )
+
+        reference_groups[neighbourhood_id] = ReportingUnitInfo(
+            reporting_unit_id=neighbourhood_id,
+            reporting_unit_name=f"Reference group for {neighbourhood_id}",
+            cast=0,
+            total_counted=0,
+            rejected_votes={},
+            uncounted_votes={},
+            votes_per_party=summed_votes_per_party,
+            votes_per_candidate=summed_votes_per_candidate,
+        )
+
+    return reference_groups
+
+
+def synthetic_city(
+    n_units: int, n_parties: int, n_candidates: int, seed: int = 0
+) -> Dict[str, ReportingUnitInfo]:
+    rng = random.Random(seed)
+    identifiers = IdentifierRegistry()
+    parties = [identifiers.party(id, f"Partij {id}") for id in range(1, n_parties + 1)]
+    candidates = [
+        identifiers.candidate(party, cand_id)
+        for party in parties
+        for cand_id in range(1, n_candidates + 1)
+    ]
+
+    reporting_unit_info = {}
+    for unit_number in range(1, n_units + 1):
+        votes_per_candidate: Dict[CandidateIdentifier, int] = {
+            candidate: rng.randint(0, 20) for candidate in candidates
+        }
+        votes_per_party = dict.fromkeys(parties, 0)
+        for candidate, votes in votes_per_candidate.items():
+            votes_per_party[candidate.party] += votes
+        reporting_unit_id = f"0363::SB{unit_number}"
+        reporting_unit_info[reporting_unit_id] = ReportingUnitInfo(
+            reporting_unit_id=reporting_unit_id,
+            reporting_unit_name=f"Stembureau {unit_number}",
+            cast=0,
+            total_counted=sum(votes_per_party.values()),
+            rejected_votes={},
+            uncounted_votes={},
+            votes_per_party=votes_per_party,
+            votes_per_candidate=votes_per_candidate,
+        )
+
+    return reporting_unit_info
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--units", type=int, default=500)
+    p.add_argument("--neighbourhoods", type=int, default=100)
+    p.add_argument("--parties", type=int, default=20)
+    p.add_argument("--candidates", type=int, default=50)
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+
+    reporting_unit_info = synthetic_city(args.units, args.parties, args.candidates)
+    # Polling stations are spread evenly over the neighbourhoods, one zip per station
+    reporting_unit_zips = {
+        reporting_unit_id: f"{1000 + number}AA"
+        for number, reporting_unit_id in enumerate(reporting_unit_info)
+    }
+    reporting_unit_id_to_neighbourhood_id: Dict[str, Optional[str]] = {
+        reporting_unit_id: f"WK0363{number % args.neighbourhoods:02d}"
+        for number, reporting_unit_id in enumerate(reporting_unit_info)
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "neighbourhoods.csv"
+        path.write_text(
+            "zip_code,neighbourhood_code,ambiguous\n"
+            + "".join(
+                f"{reporting_unit_zips[reporting_unit_id]},{neighbourhood_id},no\n"
+                for reporting_unit_id, neighbourhood_id in (
+                    reporting_unit_id_to_neighbourhood_id.items()
+                )
+            )
+        )
+        neighbourhood_data = NeighbourhoodData.from_path(str(path))
+        assert neighbourhood_data is not None
+
+        print(
+            f"{args.units} units in {args.neighbourhoods} neighbourhoods, "
+            f"{args.parties} parties x {args.candidates} candidates"
+        )
+
+        def legacy():
+            return legacy_reference_groups(
+                reporting_unit_id_to_neighbourhood_id, reporting_unit_info
+            )
+
+        def single_pass():
+            return _build_reference_groups(
+                reporting_unit_id_to_neighbourhood_id, reporting_unit_info
+            )
+
+        def fetch_reporting_neighbourhoods():
+            # Including the zip lookup
+            return neighbourhood_data.fetch_reporting_neighbourhoods(
+                reporting_unit_zips, reporting_unit_info
+            ).neighbourhood_id_to_reference_group
+
+        reference = None
+        for name, build in [
+            ("legacy", legacy),
+            ("single pass", single_pass),
+            ("fetch_reporting_neighbourhoods", fetch_reporting_neighbourhoods),
+        ]:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                reference_groups = build()
+                timings.append(time.perf_counter() - start)
+            if reference is None:
+                reference = reference_groups
+            assert reference_groups == reference, f"{name} gave different groups"
+            print(f"{name:<32} best of {args.repeat}: {min(timings):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark for parsing a large synthetic EML file.
+
+Usage (from the repository root):
+    PYTHONPATH=src python benchmarks/bench_parse.py --units 300
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict
+
+from synthetic import write_synthetic_eml
+
+from hcp import xml_parser
+from hcp.eml import EML
+
+
+def legacy_from_xml(file_path: str) -> EML:
+    """The DOM-based parse as it was before the metadata was folded into the
+    reporting unit walk: `get_metadata` scans the full tree a second time."""
+    xml_root = xml_parser.parse_xml(file_path)
+    eml_file_id = xml_parser.get_eml_type(xml_root)
+    assert eml_file_id is not None
+    main_unit_info = xml_parser.get_reporting_unit_info(
+        xml_parser.get_main_unit(xml_root)
+    )
+    reporting_units_info = {}
+    for reporting_unit in xml_parser.get_reporting_units(xml_root):
+        info = xml_parser.get_reporting_unit_info(reporting_unit)
+        assert info.reporting_unit_id is not None
+        reporting_units_info[info.reporting_unit_id] = info
+    metadata = xml_parser.get_metadata(xml_root)
+    return EML(eml_file_id, main_unit_info, reporting_units_info, metadata)
+
+
+LOADERS: Dict[str, Callable[[str], EML]] = {
+    "legacy (two tree scans)": legacy_from_xml,
+    "single pass": EML.from_xml,
+}
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--units", type=int, default=300)
+    p.add_argument("--parties", type=int, default=20)
+    p.add_argument("--candidates", type=int, default=50)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--workers", type=int, default=os.cpu_count())
+    args = p.parse_args()
+
+    loaders = dict(LOADERS)
+    loaders["streaming"] = partial(EML.from_xml, streaming=True)
+    if args.workers > 1:
+        loaders[f"parallel ({args.workers} workers)"] = partial(
+            EML.from_xml, workers=args.workers
+        )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "synthetic.eml.xml"
+        with open(path, "w", encoding="utf-8") as out:
+            write_synthetic_eml(out, args.units, args.parties, args.candidates)
+        print(
+            f"{args.units} units x {args.parties} parties x {args.candidates} candidates, "
+            f"{path.stat().st_size / 1e6:.1f} MB"
+        )
+
+        reference = None
+        for name, loader in loaders.items():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                eml = loader(str(path))
+                timings.append(time.perf_counter() - start)
+            if reference is None:
+                reference = eml
+            assert eml == reference, f"{name} produced a different EML"
+            print(f"{name:<30} best of {args.repeat}: {min(timings):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
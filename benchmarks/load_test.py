@@ -0,0 +1,171 @@
+"""Load test for `hcp serve`, comparing its latency with starting `hcp` per upload.
+
+Usage (from the repository root), against a running instance:
+    uv run hcp serve &
+    PYTHONPATH=src python benchmarks/load_test.py --requests 200 --concurrency 4
+
+Or against an instance started by this script on a free port:
+    PYTHONPATH=src python benchmarks/load_test.py --local --cold 3
+
+By default the fake Dordrecht count from the test data is uploaded, packed like the
+output of OSV-2020U.
+"""
+
+import argparse
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+from zipfile import ZipFile
+
+from hcp.eml_cache import EmlCache
+from hcp.neighbourhood import NeighbourhoodRegistry
+from hcp.serve import DURATION_HEADER, HcpService, make_server
+
+REPOSITORY = Path(__file__).parent.parent
+TEST_DATA = REPOSITORY / "test" / "data" / "FAKE_TEST_DATA_TK2023_DORDRECHT"
+
+
+def osv_zip() -> bytes:
+    inner_zip = io.BytesIO()
+    with ZipFile(inner_zip, "w") as inner_zipfile:
+        eml_path = (
+            TEST_DATA / "Fake_test_data_Telling_TK2023_gemeente_Dordrecht.eml.xml"
+        )
+        inner_zipfile.write(eml_path, eml_path.name)
+    outer_zip = io.BytesIO()
+    with ZipFile(outer_zip, "w") as outer_zipfile:
+        outer_zipfile.writestr("tellingen.zip", inner_zip.getvalue())
+        outer_zipfile.write(TEST_DATA / "Model_Na31-1.odt", "Model_Na31-1.odt")
+    return outer_zip.getvalue()
+
+
+def post(url: str, body: bytes) -> Tuple[float, Optional[float]]:
+    start = time.perf_counter()
+    request = urllib.request.Request(url, data=body, method="POST")
+    with urllib.request.urlopen(request, timeout=300) as response:
+        response.read()
+        server_seconds = response.headers.get(DURATION_HEADER)
+    return time.perf_counter() - start, (
+        float(server_seconds) if server_seconds is not None else None
+    )
+
+
+def cold_run(zip_path: Path, cache_directory: Path) -> float:
+    # A fresh interpreter per upload, like the platform does without the service
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from hcp.cli import start; sys.argv[0] = 'hcp'; start()",
+                str(zip_path),
+            ],
+            cwd=tmp_dir,
+            env={
+                **os.environ,
+                "PYTHONPATH": str(REPOSITORY / "src"),
+                "HCP_CACHE_DIR": str(cache_directory),
+            },
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        return time.perf_counter() - start
+
+
+def percentile(timings: List[float], fraction: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--url", default="http://127.0.0.1:8080/run")
+    p.add_argument("--zip", help="The .zip file to upload, by default the test data.")
+    p.add_argument("--requests", type=int, default=100)
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument(
+        "--local",
+        action="store_true",
+        help="Start an instance with the packaged neighbourhood data in this process.",
+    )
+    p.add_argument(
+        "--cold",
+        type=int,
+        default=0,
+        help="Also time this amount of runs of the hcp command line tool.",
+    )
+    args = p.parse_args()
+
+    body = Path(args.zip).read_bytes() if args.zip else osv_zip()
+    url = args.url
+    server = None
+    cache_directory = tempfile.TemporaryDirectory()
+    if args.local:
+        service = HcpService(
+            cache=EmlCache(directory=Path(cache_directory.name)),
+            neighbourhood_registry=NeighbourhoodRegistry.from_directory(
+                REPOSITORY / "data", index_directory=Path(cache_directory.name)
+            ),
+        )
+        service.warm_up()
+        server = make_server(service, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+        url = f"http://{host}:{port}/run"
+
+    # Warm the cache of the service, like repeated uploads of the same count
+    post(url, body)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda _: post(url, body), range(args.requests)))
+    total = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in results]
+    server_seconds = [seconds for _, seconds in results if seconds is not None]
+    print(
+        f"{args.requests} requests, concurrency {args.concurrency}: "
+        f"{args.requests / total:.1f} requests/s"
+    )
+    print(
+        f"latency p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+        f"p90 {percentile(latencies, 0.9) * 1000:.1f} ms, "
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, "
+        f"max {max(latencies) * 1000:.1f} ms"
+    )
+    if server_seconds:
+        print(
+            f"time spent running HCP: mean {statistics.mean(server_seconds) * 1000:.1f} ms"
+        )
+
+    if args.cold:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            zip_path = Path(tmp_dir) / "upload.zip"
+            zip_path.write_bytes(body)
+            # The first run builds the cache and the neighbourhood index, which the
+            # service has done as well
+            cold_run(zip_path, Path(cache_directory.name))
+            timings = [
+                cold_run(zip_path, Path(cache_directory.name)) for _ in range(args.cold)
+            ]
+        print(
+            f"hcp command line tool: best of {args.cold}: {min(timings) * 1000:.1f} ms"
+        )
+
+    if server is not None:
+        server.shutdown()
+    cache_directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Generator for large synthetic EML (510) files used by the benchmarks.
+
+The generated files are structurally valid counts: the `TotalVotes` of the main unit
+is the sum of all generated `ReportingUnitVotes`.
+"""
+
+import random
+from typing import Dict, List, Optional, TextIO, Tuple
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<!-- This is SYNTHETIC BENCHMARK DATA and not a real election result -->
+<EML xmlns="urn:oasis:names:tc:evs:schema:eml"
+    xmlns:ds="http://www.w3.org/2000/09/xmldsig#"
+    xmlns:kr="http://www.kiesraad.nl/extensions"
+    xmlns:xal="urn:oasis:names:tc:ciq:xsdschema:xAL:2.0"
+    xmlns:xnl="urn:oasis:names:tc:ciq:xsdschema:xNL:2.0" Id="{eml_id}" SchemaVersion="5">
+    <TransactionId>1</TransactionId>
+    <ManagingAuthority>
+        <AuthorityIdentifier Id="{authority_id}">Synthetica</AuthorityIdentifier>
+        <AuthorityAddress></AuthorityAddress>
+    </ManagingAuthority>
+    <kr:CreationDateTime>2025-01-01T12:00:00.000</kr:CreationDateTime>
+    <Count>
+        <EventIdentifier></EventIdentifier>
+        <Election>
+            <ElectionIdentifier Id="TK2025">
+                <ElectionName>Tweede Kamer der Staten-Generaal 2025</ElectionName>
+                <ElectionCategory>TK</ElectionCategory>
+                <kr:ElectionSubcategory>TK</kr:ElectionSubcategory>
+                <kr:ElectionDate>2025-10-29</kr:ElectionDate>
+            </ElectionIdentifier>
+            <Contests>
+                <Contest>
+                    <ContestIdentifier Id="1"></ContestIdentifier>
+"""
+FOOTER = """                </Contest>
+            </Contests>
+        </Election>
+    </Count>
+</EML>
+"""
+UNCOUNTED_REASON_CODES = [
+    "geldige stempassen",
+    "geldige volmachtbewijzen",
+    "geldige kiezerspassen",
+    "toegelaten kiezers",
+    "meer getelde stembiljetten",
+    "minder getelde stembiljetten",
+    "meegenomen stembiljetten",
+    "te weinig uitgereikte stembiljetten",
+    "te veel uitgereikte stembiljetten",
+    "geen verklaring",
+    "andere verklaring",
+]
+
+Unit = Tuple[
+    Optional[Tuple[str, str]], List[Tuple[int, List[int]]], Dict[str, int], int
+]
+
+
+def write_synthetic_eml(
+    out: TextIO,
+    n_units: int,
+    n_parties: int = 20,
+    n_candidates: int = 50,
+    eml_id: str = "510b",
+    authority_id: str = "0363",
+    zips: Optional[List[str]] = None,
+    seed: int = 0,
+) -> None:
+    """Write a synthetic count with `n_units` polling stations, `n_parties` lists and
+    `n_candidates` candidates per list to `out`.
+
+    Args:
+        out: Text stream to write the EML to.
+        n_units: Amount of reporting units (polling stations).
+        n_parties: Amount of parties (lists).
+        n_candidates: Amount of candidates per party.
+        eml_id: EML id to use, e.g. `"510b"`.
+        authority_id: Municipality code used for the reporting unit ids.
+        zips: Zip codes (without space) to use for the reporting units, cycled through.
+            Random zip codes are generated if not specified.
+        seed: Seed for the random vote counts.
+    """
+    rng = random.Random(seed)
+    units: List[Unit] = []
+    for unit_number in range(1, n_units + 1):
+        zip_code = (
+            zips[(unit_number - 1) % len(zips)]
+            if zips
+            else f"{rng.randint(1000, 9999)}{rng.choice('ABCDEFGH')}{rng.choice('ABCDEFGH')}"
+        )
+        name = f"Stembureau Synthetisch {unit_number} (postcode: {zip_code[:4]} {zip_code[4:]})"
+        selections = []
+        for _ in range(n_parties):
+            candidate_votes = [
+                rng.randint(0, 20) if rng.random() < 0.5 else 0
+                for _ in range(n_candidates)
+            ]
+            selections.append((sum(candidate_votes), candidate_votes))
+        total_counted = sum(party_votes for party_votes, _ in selections)
+        rejected = {"ongeldig": rng.randint(0, 5), "blanco": rng.randint(0, 5)}
+        units.append(
+            (
+                (f"{authority_id}::SB{unit_number}", name),
+                selections,
+                rejected,
+                total_counted,
+            )
+        )
+
+    # The main unit is the sum of all reporting units
+    main_selections = [
+        (
+            sum(unit[1][party][0] for unit in units),
+            [
+                sum(unit[1][party][1][candidate] for unit in units)
+                for candidate in range(n_candidates)
+            ],
+        )
+        for party in range(n_parties)
+    ]
+    main_rejected = {
+        kind: sum(unit[2][kind] for unit in units) for kind in ("ongeldig", "blanco")
+    }
+    main_unit: Unit = (
+        None,
+        main_selections,
+        main_rejected,
+        sum(unit[3] for unit in units),
+    )
+
+    out.write(HEADER.format(eml_id=eml_id, authority_id=authority_id))
+    _write_unit(out, "TotalVotes", main_unit)
+    for unit in units:
+        _write_unit(out, "ReportingUnitVotes", unit)
+    out.write(FOOTER)
+
+
+def _write_unit(out: TextIO, tag: str, unit: Unit) -> None:
+    identifier, selections, rejected, total_counted = unit
+    indent = " " * 24
+    lines = [f"{' ' * 20}<{tag}>"]
+    if identifier:
+        lines.append(
+            f'{indent}<ReportingUnitIdentifier Id="{identifier[0]}">{identifier[1]}</ReportingUnitIdentifier>'
+        )
+    for party_number, (party_votes, candidate_votes) in enumerate(selections, start=1):
+        lines.append(
+            f'{indent}<Selection><AffiliationIdentifier Id="{party_number}">'
+            f"<RegisteredName>Partij {party_number}</RegisteredName></AffiliationIdentifier>"
+            f"<ValidVotes>{party_votes}</ValidVotes></Selection>"
+        )
+        for candidate_number, votes in enumerate(candidate_votes, start=1):
+            lines.append(
+                f'{indent}<Selection><Candidate><CandidateIdentifier Id="{candidate_number}">'
+                f"</CandidateIdentifier></Candidate><ValidVotes>{votes}</ValidVotes></Selection>"
+            )
+
+    total_votes = total_counted + rejected["ongeldig"] + rejected["blanco"]
+    uncounted = dict.fromkeys(UNCOUNTED_REASON_CODES, 0)
+    uncounted["geldige stempassen"] = total_votes
+    uncounted["toegelaten kiezers"] = total_votes
+    lines.append(f"{indent}<Cast>{total_votes * 2}</Cast>")
+    lines.append(f"{indent}<TotalCounted>{total_counted}</TotalCounted>")
+    for kind, amount in rejected.items():
+        lines.append(
+            f'{indent}<RejectedVotes ReasonCode="{kind}">{amount}</RejectedVotes>'
+        )
+    for reason_code, amount in uncounted.items():
+        lines.append(
+            f'{indent}<UncountedVotes ReasonCode="{reason_code}">{amount}</UncountedVotes>'
+        )
+    lines.append(f"{' ' * 20}</{tag}>\n")
+    out.write("\n".join(lines))
@@ -0,0 +1,205 @@
+"""Running HCP on a directory of .zip files as output by OSV-2020U.
+
+The .zip files are divided over a pool of worker processes. Every worker loads the
+neighbourhood data once, instead of once per .zip file. The neighbourhood index files
+are built before the workers are started, so all workers memory map the same files.
+The output of every .zip file is written to a subdirectory of its own.
+"""
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, List, Optional, Union
+
+from .eml_cache import EmlCache
+from .ingest import open_election_result_zip
+from .main import create_csv_files, load_neighbourhood_data
+
+if TYPE_CHECKING:
+    from .nearest_reporting_units import ZipCentroidData
+    from .neighbourhood import NeighbourhoodData, NeighbourhoodRegistry
+
+PARQUET_FILE_NAME = "results.parquet"
+
+
+@dataclass
+class BatchConfig:
+    """Configuration shared by all .zip files of a batch, see `create_csv_files`."""
+
+    output_directory: Path
+    path_to_neighbourhood_data: Optional[str] = None
+    neighbourhood_registry: Optional["NeighbourhoodRegistry"] = None
+    path_to_zip_centroids: Optional[str] = None
+    nearest_reporting_units: Optional[int] = None
+    cache: Optional[EmlCache] = None
+    parquet: bool = False
+
+
+@dataclass
+class BatchResult:
+    """The result of running HCP on a single .zip file."""
+
+    zip_path: Path
+    output_directory: Path
+    seconds: float
+    error: Optional[str] = None
+
+
+def find_zip_files(directory: Path) -> List[Path]:
+    """Find the .zip files in a directory, not including subdirectories.
+
+    Args:
+        directory: The directory to search.
+
+    Returns:
+        The paths of the .zip files, sorted by name.
+    """
+    return sorted(
+        path for path in directory.iterdir() if path.suffix == ".zip" and path.is_file()
+    )
+
+
+def run_batch(
+    zip_paths: Iterable[Path], config: BatchConfig, processes: int = 1
+) -> List[BatchResult]:
+    """Run HCP on several .zip files as output by OSV-2020U. The output files of a
+    .zip file are written to a subdirectory of `config.output_directory` named after
+    the .zip file. A failing .zip file does not stop the others.
+
+    Args:
+        zip_paths: Paths to the .zip files.
+        config: Configuration of the batch.
+        processes: Amount of worker processes. With 1, all .zip files are processed
+            in the current process.
+
+    Raises:
+        InvalidZipCentroidsException: when `config.path_to_zip_centroids` is specified
+            but the zip code centroids could not be read from it.
+
+    Returns:
+        A `BatchResult` for each .zip file, in the order of `zip_paths`.
+    """
+    zip_paths = list(zip_paths)
+    if config.neighbourhood_registry is not None:
+        # Builds the index files once, before the workers load them
+        config.neighbourhood_registry.preload()
+
+    if processes <= 1 or len(zip_paths) <= 1:
+        _init_worker(config)
+        return [_run_zip(zip_path) for zip_path in zip_paths]
+
+    if config.path_to_zip_centroids is not None:
+        # Fail before starting the workers, which would all fail to initialise
+        load_neighbourhood_data(
+            path_to_zip_centroids=config.path_to_zip_centroids,
+            nearest_reporting_units=config.nearest_reporting_units,
+        )
+
+    # Forking a process in which polars has started its thread pool may deadlock
+    with ProcessPoolExecutor(
+        max_workers=min(processes, len(zip_paths)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(_without_loaded_data(config),),
+    ) as executor:
+        return list(executor.map(_run_zip, zip_paths))
+
+
+def format_summary(results: List[BatchResult], seconds: float) -> str:
+    """Format the results of a batch as a table with the time and status per file.
+
+    Args:
+        results: The results of `run_batch`.
+        seconds: The total (wall clock) time of the batch.
+
+    Returns:
+        The summary, ending with a line with the totals.
+    """
+    name_width = max([len("file")] + [len(result.zip_path.name) for result in results])
+    lines = [f"{'file':<{name_width}}  {'seconds':>8}  result"]
+    for result in results:
+        lines.append(
+            f"{result.zip_path.name:<{name_width}}  {result.seconds:>8.2f}  "
+            f"{'failed: ' + result.error if result.error else 'ok'}"
+        )
+
+    failed = sum(1 for result in results if result.error)
+    lines.append(
+        f"{len(results)} files, {failed} failed, {seconds:.2f} seconds in total"
+    )
+    return "\n".join(lines)
+
+
+# Implementation details
+
+# Set once per worker process by `_init_worker`
+_config: Optional[BatchConfig] = None
+_neighbourhood_data: Optional[Union["NeighbourhoodData", "ZipCentroidData"]] = None
+
+
+def _without_loaded_data(config: BatchConfig) -> BatchConfig:
+    # Loaded (memory mapped) datasets can not be sent to worker processes, every
+    # worker loads them itself from the index files built by `preload`
+    registry = config.neighbourhood_registry
+    if registry is None:
+        return config
+
+    from .neighbourhood import NeighbourhoodRegistry
+
+    return BatchConfig(
+        **{
+            **vars(config),
+            "neighbourhood_registry": NeighbourhoodRegistry(
+                paths=registry.paths, index_directory=registry.index_directory
+            ),
+        }
+    )
+
+
+def _init_worker(config: BatchConfig) -> None:
+    global _config, _neighbourhood_data
+    _config = config
+    # The registry is passed on per .zip file, as its dataset depends on the election
+    _neighbourhood_data = load_neighbourhood_data(
+        path_to_neighbourhood_data=config.path_to_neighbourhood_data,
+        path_to_zip_centroids=config.path_to_zip_centroids,
+        nearest_reporting_units=config.nearest_reporting_units,
+    )
+    if config.neighbourhood_registry is not None:
+        config.neighbourhood_registry.preload()
+
+
+def _run_zip(zip_path: Path) -> BatchResult:
+    if _config is None:
+        raise RuntimeError("Worker has not been initialised")
+    output_directory = _config.output_directory / zip_path.stem
+    start = time.perf_counter()
+    try:
+        output_directory.mkdir(parents=True, exist_ok=True)
+        with open_election_result_zip(zip_path) as election_result_zip:
+            create_csv_files(
+                path_to_xml=election_result_zip.eml_file,
+                odt=election_result_zip.odt,
+                dest_a=str(output_directory / "a.csv"),
+                dest_b=str(output_directory / "b.csv"),
+                dest_c=str(output_directory / "c.csv"),
+                dest_parquet=(
+                    str(output_directory / PARQUET_FILE_NAME)
+                    if _config.parquet
+                    else None
+                ),
+                cache=_config.cache,
+                neighbourhood_data=_neighbourhood_data,
+                neighbourhood_registry=_config.neighbourhood_registry,
+            )
+    except Exception as error:
+        return BatchResult(
+            zip_path,
+            output_directory,
+            time.perf_counter() - start,
+            f"{type(error).__name__}: {error}",
+        )
+
+    return BatchResult(zip_path, output_directory, time.perf_counter() - start)
@@ -1,47 +1,357 @@
 import argparse
-from os import remove, rmdir
+import os
+import sys
+import time
+from contextlib import ExitStack
 from pathlib import Path
-from zipfile import ZipFile
+from typing import TYPE_CHECKING, Optional, Tuple
 
+from .eml_cache import EmlCache
 from .main import create_csv_files
 
-CURRENT_NEIGHBOURHOOD_FILE = "zip_to_neighbourhood_2024.parquet"
+# The subcommands, the neighbourhood modules and the zip code centroids are only
+# imported in the branches which use them, so they are not loaded on every run
+if TYPE_CHECKING:
+    from .nearest_reporting_units import ZipCentroidData
+    from .neighbourhood import NeighbourhoodRegistry
 
 p = argparse.ArgumentParser()
-p.add_argument("data_source", help="The election result to run HCP on.")
+p.add_argument("data_source", nargs="?", help="The election result to run HCP on.")
 p.add_argument("--neighbourhoods", required=False)
+p.add_argument(
+    "--zip-centroids",
+    required=False,
+    help="Compare polling stations with the polling stations nearest to them instead "
+    "of with those in the same neighbourhood, using the zip code centroids in this "
+    ".csv file.",
+)
+p.add_argument(
+    "--nearest",
+    type=int,
+    required=False,
+    help="The amount of polling stations to compare with when using --zip-centroids, "
+    "10 by default.",
+)
+p.add_argument(
+    "--workers",
+    type=int,
+    required=False,
+    help="Parse the reporting units of large counts in parallel using this amount of "
+    "processes. Only applies to .eml.xml files, the count in a .zip file is parsed "
+    "incrementally instead.",
+)
+p.add_argument(
+    "--parquet",
+    required=False,
+    help="Additionally write all check results to this .parquet file.",
+)
+p.add_argument(
+    "--vectorised",
+    action="store_true",
+    help="Run the checks for all polling stations at once, which is faster for large counts.",
+)
+p.add_argument(
+    "--no-cache",
+    action="store_true",
+    help="Do not use the cache of previously parsed .eml.xml files.",
+)
+p.add_argument(
+    "--clear-cache",
+    action="store_true",
+    help="Clear the cache of previously parsed .eml.xml files before running.",
+)
 
 
-def start():
-    """Helper CLI tool to run HCP on either a .zip file as output by OSV-2020U"""
-    args = p.parse_args()
-    extract_path = Path() / "tmp"
+def build_neighbourhoods(argv):
+    """Helper CLI tool to convert neighbourhood data to an index or .parquet file"""
+    from .neighbourhood import LazyFrameNeighbourhoodData, NeighbourhoodData
+    from .neighbourhood_index import INDEX_SUFFIX
 
-    neighbourhood_file = (
-        Path(args.neighbourhoods) if args.neighbourhoods is not None else None
+    build_parser = argparse.ArgumentParser(
+        prog="hcp build-neighbourhoods",
+        description="Convert neighbourhood data to an index file for fast zip code "
+        "lookups, or to a .parquet file sorted and grouped by municipality.",
+    )
+    build_parser.add_argument(
+        "source", help="The neighbourhood data, a .parquet or .csv file."
+    )
+    build_parser.add_argument(
+        "destination", help="The file to write, an index (.idx) or a .parquet file."
     )
+    args = build_parser.parse_args(argv)
+    neighbourhood_data = NeighbourhoodData.from_path(args.source)
+    if not isinstance(neighbourhood_data, LazyFrameNeighbourhoodData):
+        print("Could not read specified neighbourhood file!")
+        return
 
-    # Neighbourhood file not specified as argument
-    if not neighbourhood_file:
-        # Find the packaged neighbourhood file
-        neighbourhood_file = (
-            Path(__file__).parent.parent / "data" / CURRENT_NEIGHBOURHOOD_FILE
-        )
+    destination = Path(args.destination)
+    if destination.suffix == INDEX_SUFFIX:
+        zip_amount = neighbourhood_data.write_index(args.destination)
+        print(f"Wrote index of {zip_amount} zip codes to {args.destination}")
+    elif destination.suffix == ".parquet":
+        zip_amount = neighbourhood_data.write_parquet(args.destination)
+        print(f"Wrote {zip_amount} zip codes to {args.destination}")
+    else:
+        print("Destination should be an .idx or .parquet file!")
+
+
+def _packaged_neighbourhood_registry(
+    index_directory: Optional[Path],
+) -> Optional["NeighbourhoodRegistry"]:
+    from .neighbourhood import NeighbourhoodRegistry
 
-        # If we did not find the neighbourhood file, we might be in editable mode
-        # for example when running `uv run hcp`. Then we use the data folder in the source
-        # here.
+    # The data folder is installed next to the package, or in editable mode (for
+    # example when running `uv run hcp`) it is the data folder in the source
+    for data_directory in [
+        Path(__file__).parent.parent / "data",
+        Path(__file__).parent.parent.parent / "data",
+    ]:
+        registry = NeighbourhoodRegistry.from_directory(data_directory, index_directory)
+        if registry.paths:
+            return registry
+    return None
+
+
+def _neighbourhood_source(
+    neighbourhoods: Optional[str], cache: Optional[EmlCache]
+) -> Optional[Tuple[Optional[Path], Optional["NeighbourhoodRegistry"]]]:
+    # Either the specified neighbourhood file or the packaged neighbourhood data,
+    # `None` if neither can be found
+    index_directory = cache.directory if cache is not None else None
+    if neighbourhoods is not None:
+        neighbourhood_file = Path(neighbourhoods)
+
+        # Path to the neighbourhood file should exist
         if not neighbourhood_file.exists():
-            neighbourhood_file = (
-                Path(__file__).parent.parent.parent
-                / "data"
-                / CURRENT_NEIGHBOURHOOD_FILE
-            )
+            print("Could not find specified neighbourhood file!")
+            return None
+
+        # Look up zip codes in a (cached) index instead of scanning the full dataset
+        if index_directory is not None:
+            from .neighbourhood import cached_index
+
+            neighbourhood_file = cached_index(neighbourhood_file, index_directory)
+        return neighbourhood_file, None
+
+    # Use the packaged neighbourhood data matching the date of the election
+    neighbourhood_registry = _packaged_neighbourhood_registry(index_directory)
+    if neighbourhood_registry is None:
+        print("Could not find bundled neighbourhood files!")
+        return None
+    return None, neighbourhood_registry
+
+
+def _add_neighbourhood_arguments(parser: argparse.ArgumentParser) -> None:
+    # Shared by the subcommands, see the arguments of `p`
+    parser.add_argument("--neighbourhoods", required=False)
+    parser.add_argument(
+        "--zip-centroids",
+        required=False,
+        help="See hcp --zip-centroids.",
+    )
+    parser.add_argument(
+        "--nearest",
+        type=int,
+        required=False,
+        help="See hcp --nearest.",
+    )
+
+
+def _load_zip_centroids(
+    path_to_zip_centroids: str, nearest: Optional[int]
+) -> Optional["ZipCentroidData"]:
+    from .nearest_reporting_units import (
+        DEFAULT_NEAREST_REPORTING_UNITS,
+        ZipCentroidData,
+    )
+
+    zip_centroid_data = ZipCentroidData.from_path(
+        path_to_zip_centroids, nearest or DEFAULT_NEAREST_REPORTING_UNITS
+    )
+    if zip_centroid_data is None:
+        print("Could not read specified zip centroids file!")
+    return zip_centroid_data
+
+
+def batch(argv):
+    """Helper CLI tool to run HCP on all .zip files as output by OSV-2020U in a directory"""
+    from .batch import (
+        PARQUET_FILE_NAME,
+        BatchConfig,
+        find_zip_files,
+        format_summary,
+        run_batch,
+    )
+    from .nearest_reporting_units import InvalidZipCentroidsException
+
+    batch_parser = argparse.ArgumentParser(
+        prog="hcp batch",
+        description="Run HCP on all .zip files as output by OSV-2020U in a directory. "
+        "The output of each .zip file is written to a subdirectory named after the "
+        "file.",
+    )
+    batch_parser.add_argument(
+        "directory", help="The directory containing the .zip files."
+    )
+    batch_parser.add_argument(
+        "--output",
+        default=".",
+        help="The directory to write the output subdirectories to.",
+    )
+    batch_parser.add_argument(
+        "--processes",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="The amount of .zip files to process in parallel, by default the amount "
+        "of CPU cores.",
+    )
+    _add_neighbourhood_arguments(batch_parser)
+    batch_parser.add_argument(
+        "--parquet",
+        action="store_true",
+        help=f"Additionally write all check results to {PARQUET_FILE_NAME} in each "
+        "output subdirectory.",
+    )
+    batch_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not use the cache of previously parsed .eml.xml files.",
+    )
+    args = batch_parser.parse_args(argv)
+    directory = Path(args.directory)
+    if not directory.is_dir():
+        print("Could not find specified directory!")
+        return
+
+    zip_paths = find_zip_files(directory)
+    if not zip_paths:
+        print("Specified directory does not contain any .zip files!")
+        return
+
+    cache = None if args.no_cache else EmlCache.default()
+    neighbourhoods = _neighbourhood_source(args.neighbourhoods, cache)
+    if neighbourhoods is None:
+        return
+    neighbourhood_file, neighbourhood_registry = neighbourhoods
+
+    if args.zip_centroids is not None and not Path(args.zip_centroids).exists():
+        print("Could not find specified zip centroids file!")
+        return
+
+    config = BatchConfig(
+        output_directory=Path(args.output),
+        path_to_neighbourhood_data=(
+            str(neighbourhood_file) if neighbourhood_file else None
+        ),
+        neighbourhood_registry=neighbourhood_registry,
+        path_to_zip_centroids=args.zip_centroids,
+        nearest_reporting_units=args.nearest,
+        cache=cache,
+        parquet=args.parquet,
+    )
+    start_time = time.perf_counter()
+    try:
+        results = run_batch(zip_paths, config, processes=args.processes)
+    except InvalidZipCentroidsException:
+        print("Could not read specified zip centroids file!")
+        return
+    print(format_summary(results, time.perf_counter() - start_time))
+
+
+def serve(argv):
+    """Helper CLI tool to run HCP as a local HTTP service"""
+    from .neighbourhood import NeighbourhoodData
+    from .serve import DEFAULT_HOST, DEFAULT_PORT, HcpService, make_server
+
+    serve_parser = argparse.ArgumentParser(
+        prog="hcp serve",
+        description="Run HCP as a local HTTP service which keeps the neighbourhood "
+        "data and the cache loaded. POST a .zip file as output by OSV-2020U to /run to "
+        "get a .zip file with a.csv, b.csv and c.csv.",
+    )
+    serve_parser.add_argument(
+        "--host", default=DEFAULT_HOST, help="The address to listen on."
+    )
+    serve_parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help="The port to listen on."
+    )
+    _add_neighbourhood_arguments(serve_parser)
+    serve_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not use the cache of previously parsed .eml.xml files.",
+    )
+    args = serve_parser.parse_args(argv)
+    cache = None if args.no_cache else EmlCache.default()
+    neighbourhoods = _neighbourhood_source(args.neighbourhoods, cache)
+    if neighbourhoods is None:
+        return
+    neighbourhood_file, neighbourhood_registry = neighbourhoods
+
+    neighbourhood_data = None
+    if args.zip_centroids is not None:
+        neighbourhood_data = _load_zip_centroids(args.zip_centroids, args.nearest)
+        if neighbourhood_data is None:
+            return
+    elif neighbourhood_file is not None:
+        neighbourhood_data = NeighbourhoodData.from_path(str(neighbourhood_file))
+        if neighbourhood_data is None:
+            print("Could not read specified neighbourhood file!")
+            return
+
+    service = HcpService(
+        cache=cache,
+        neighbourhood_data=neighbourhood_data,
+        neighbourhood_registry=neighbourhood_registry,
+    )
+    service.warm_up()
+    server = make_server(service, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Serving HCP on http://{host}:{port}/run")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
-    # Path to the neighbourhood file should exist
-    if not neighbourhood_file.exists():
-        print("Could not find specified or bundled neighbourhood file!")
+
+def start():
+    """Helper CLI tool to run HCP on either a .zip file as output by OSV-2020U"""
+    if sys.argv[1:2] == ["build-neighbourhoods"]:
+        build_neighbourhoods(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["batch"]:
+        batch(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["serve"]:
+        serve(sys.argv[2:])
+        return
+
+    args = p.parse_args()
+    cache = None if args.no_cache else EmlCache.default()
+    if args.clear_cache:
+        EmlCache.default().clear()
+        # Only clearing the cache is a valid use
+        if args.data_source is None:
+            return
+
+    if args.data_source is None:
+        p.error("the following arguments are required: data_source")
+
+    neighbourhoods = _neighbourhood_source(args.neighbourhoods, cache)
+    if neighbourhoods is None:
         return
+    neighbourhood_file, neighbourhood_registry = neighbourhoods
+
+    if args.zip_centroids is not None and not Path(args.zip_centroids).exists():
+        print("Could not find specified zip centroids file!")
+        return
+    zip_centroid_data = None
+    if args.zip_centroids is not None:
+        zip_centroid_data = _load_zip_centroids(args.zip_centroids, args.nearest)
+        if zip_centroid_data is None:
+            return
 
     # Path to specified file should exist
     if not Path(args.data_source).exists():
@@ -49,26 +359,24 @@ def start():
         return
 
     file_suffix = Path(args.data_source).suffix
-    # If we were supplied a zip file we unpack it and use the supplied odt
+    # If we were supplied a zip file we read the .eml.xml and the odt straight from it
     if file_suffix == ".zip":
-        with ZipFile(args.data_source, "r") as outer_zipfile:
+        from .ingest import InvalidZipException, open_election_result_zip
+
+        # The parallel parser reads byte ranges of a file on disk, which a count in a
+        # .zip file is not
+        if args.workers is not None and args.workers > 1:
+            print(
+                "Warning: --workers only applies to .eml.xml files, the .eml.xml file "
+                "in the .zip file is parsed incrementally instead."
+            )
+
+        with ExitStack() as stack:
             try:
-                # Find and extract the .eml.xml and .odt file
-                odt_zipinfo = next(
-                    f for f in outer_zipfile.filelist if f.filename.endswith(".odt")
+                election_result_zip = stack.enter_context(
+                    open_election_result_zip(args.data_source)
                 )
-                inner_zipinfo = next(
-                    f for f in outer_zipfile.filelist if f.filename.endswith(".zip")
-                )
-                with ZipFile(outer_zipfile.open(inner_zipinfo), "r") as inner_zipfile:
-                    eml_zipinfo = next(
-                        f
-                        for f in inner_zipfile.filelist
-                        if f.filename.endswith(".eml.xml")
-                    )
-                    inner_zipfile.extract(eml_zipinfo, extract_path)
-                outer_zipfile.extract(odt_zipinfo, extract_path)
-            except StopIteration:
+            except InvalidZipException:
                 print(
                     """Zip file did not contain expected files! Make sure to specify the direct OSV-2020U output.
 Don't try to extract or modify the .zip file"""
@@ -80,33 +388,39 @@ Don't try to extract or modify the .zip file"""
 
             # Run HCP
             create_csv_files(
-                path_to_xml=str(extract_path / eml_zipinfo.filename),
-                path_to_odt=str(extract_path / odt_zipinfo.filename),
-                path_to_neighbourhood_data=str(neighbourhood_file),
+                path_to_xml=election_result_zip.eml_file,
+                odt=election_result_zip.odt,
+                path_to_neighbourhood_data=(
+                    str(neighbourhood_file) if neighbourhood_file else None
+                ),
+                neighbourhood_registry=neighbourhood_registry,
                 dest_a="a.csv",
                 dest_b="b.csv",
                 dest_c="c.csv",
+                workers=args.workers,
+                cache=cache,
+                neighbourhood_data=zip_centroid_data,
+                dest_parquet=args.parquet,
+                vectorised=args.vectorised,
             )
 
-            # Clean up after ourselves
-            remove(extract_path / eml_zipinfo.filename)
-            remove(extract_path / odt_zipinfo.filename)
-            try:
-                rmdir(extract_path)
-            except OSError as error:
-                print(error)
-                print(f"Not deleting {extract_path}, could not clean up")
-                return
-
     # If we are given an eml file we have nothing to unpack and don't use the odt
     elif file_suffix == ".xml":
         create_csv_files(
             path_to_xml=args.data_source,
             path_to_odt=None,
-            path_to_neighbourhood_data=str(neighbourhood_file),
+            path_to_neighbourhood_data=(
+                str(neighbourhood_file) if neighbourhood_file else None
+            ),
+            neighbourhood_registry=neighbourhood_registry,
             dest_a="a.csv",
             dest_b="b.csv",
             dest_c="c.csv",
+            workers=args.workers,
+            cache=cache,
+            neighbourhood_data=zip_centroid_data,
+            dest_parquet=args.parquet,
+            vectorised=args.vectorised,
         )
     else:
         print("Please specify either a .zip file or .eml.xml file!")
@@ -1,10 +1,24 @@
 import csv
+import io
 import re
-from typing import Dict, List, Literal, Optional
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from .eml import EML, CheckResult
 from .eml_types import (
     EmlMetadata,
+    PartyIdentifier,
     SummaryType,
     SwitchedCandidate,
     VoteDifference,
@@ -26,6 +40,25 @@ PROTOCOL_VERSION = "TK2025"
 ZIP_CODE_PATTERN = re.compile(r"\(\s*postcode:\s*\d{4}\s*[A-Z]{2}\s*\)")
 STEMBUREAU_PREFIX_PATTERN = re.compile(r"^(Stembureau\s)+")
 
+# A path to write to, or a writable binary stream
+CsvDestination = Union[str, Path, BinaryIO]
+
+
+@contextmanager
+def _open_destination(csv_destination: CsvDestination) -> Iterator[io.TextIOBase]:
+    if isinstance(csv_destination, (str, Path)):
+        with open(csv_destination, "w", newline="", encoding="utf-8") as csvfile:
+            yield csvfile
+        return
+
+    # Encode into the stream of the caller, which is left open
+    csvfile = io.TextIOWrapper(csv_destination, encoding="utf-8", newline="")
+    try:
+        yield csvfile
+    finally:
+        csvfile.flush()
+        csvfile.detach()
+
 
 def _write_header(writer, metadata: EmlMetadata, description: str) -> None:
     writer.writerow(["Versie controleprotocol", PROTOCOL_VERSION])
@@ -68,9 +101,14 @@ def _format_potentially_switched_candidates(
 
 
 def _format_percentage_deviation(percentage: float) -> str:
-    percentage_rounded = round(percentage, 1)
-    sign = "+" if percentage_rounded > 0.0 else ""
-    return f"{sign}{percentage_rounded}%"
+    # Differences are an integer 0 for reporting units without votes
+    if isinstance(percentage, int):
+        return f"+{percentage}%" if percentage > 0 else f"{percentage}%"
+    # Same as formatting `round(percentage, 1)`, but without the intermediate float
+    formatted = f"{percentage:.1f}"
+    if formatted[0] == "-" or formatted == "0.0":
+        return f"{formatted}%"
+    return f"+{formatted}%"
 
 
 def _format_reporting_unit_name(reporting_unit_name: Optional[str]) -> str:
@@ -101,147 +139,263 @@ def write_csv_a(
     check_results: Dict[str, CheckResult],
     eml_metadata: EmlMetadata,
     odt_used: bool,
-    csv_destination,
+    csv_destination: CsvDestination,
 ) -> None:
-    with open(csv_destination, "w", newline="", encoding="utf-8") as csvfile:
+    with _open_destination(csv_destination) as csvfile:
         writer = csv.writer(csvfile, delimiter=";")
-        _write_header(
-            writer,
-            eml_metadata,
-            f"Stembureaus met geen verklaring voor telverschillen (odt {("gebruikt" if odt_used else "niet gebruikt")})",
-        )
-
-        writer.writerow(
-            HEADER_COLS
-            + [
-                "Aantal geen verklaring voor verschil",
-                "Aantal ontbrekende verklaringen voor verschil",
-                "Al herteld",
-                "Samenvatting",
-            ]
-        )
-
+        _write_header_a(writer, eml_metadata, odt_used)
         for id, results in check_results.items():
-            inexplicable_difference = results.inexplicable_difference or None
-            explanation_sum_difference = results.explanation_sum_difference or None
-            already_recounted = "ja" if results.already_recounted else None
-
-            if (
-                inexplicable_difference or explanation_sum_difference
-            ) and not results.already_recounted:
-                writer.writerow(
-                    _id_cols(eml_metadata, id, "A")
-                    + [
-                        inexplicable_difference,
-                        explanation_sum_difference,
-                        already_recounted,
-                        results.summarise(SummaryType.A),
-                    ]
-                )
+            _write_row_a(writer, eml_metadata, id, results)
 
 
 def write_csv_b(
     check_results: Dict[str, CheckResult],
     eml_metadata: EmlMetadata,
     neighbourhoods_used: bool,
-    csv_destination,
+    csv_destination: CsvDestination,
+) -> None:
+    with _open_destination(csv_destination) as csvfile:
+        writer = csv.writer(csvfile, delimiter=";")
+        _write_header_b(writer, eml_metadata, neighbourhoods_used)
+        for id, results in check_results.items():
+            _write_row_b(writer, eml_metadata, id, results)
+
+
+def write_csv_c(
+    check_results: Dict[str, CheckResult],
+    eml_metadata: EmlMetadata,
+    csv_destination: CsvDestination,
+    parties: Optional[Iterable[PartyIdentifier]] = None,
 ) -> None:
-    with open(csv_destination, "w", newline="", encoding="utf-8") as csvfile:
+    with _open_destination(csv_destination) as csvfile:
         writer = csv.writer(csvfile, delimiter=";")
-        _write_header(
-            writer,
-            eml_metadata,
+        _write_header_c(writer, eml_metadata)
+
+        party_columns = _get_party_columns(
+            parties,
+            next(iter(check_results.values()), None) if parties is None else None,
+        )
+        _write_party_header_c(writer, party_columns)
+
+        for id, results in check_results.items():
+            _write_row_c(writer, eml_metadata, id, results, party_columns)
+
+
+def write_csv_files(
+    check_results: Iterable[Tuple[str, CheckResult]],
+    eml_metadata: EmlMetadata,
+    odt_used: bool,
+    neighbourhoods_used: bool,
+    csv_destination_a: CsvDestination,
+    csv_destination_b: CsvDestination,
+    csv_destination_c: CsvDestination,
+    parties: Optional[Iterable[PartyIdentifier]] = None,
+) -> None:
+    """Write output files a, b and c in a single pass over the check results, so the
+    results can be written as soon as they are computed (see `EML.iter_protocol`).
+    The files are identical to those of `write_csv_a`, `write_csv_b` and `write_csv_c`.
+
+    Args:
+        check_results: Pairs of reporting unit id and `CheckResult`.
+        eml_metadata: Metadata of the EML the results are computed for.
+        odt_used: Whether an ODT was used to determine already recounted reporting units.
+        neighbourhoods_used: Whether neighbourhood data was used.
+        csv_destination_a: Path or writable binary stream to write output file a to.
+        csv_destination_b: Path or writable binary stream to write output file b to.
+        csv_destination_c: Path or writable binary stream to write output file c to.
+        parties: The parties to write a column for in output file c, for example
+            those of the main unit. By default the parties of the first result.
+    """
+    with (
+        _open_destination(csv_destination_a) as csvfile_a,
+        _open_destination(csv_destination_b) as csvfile_b,
+        _open_destination(csv_destination_c) as csvfile_c,
+    ):
+        writer_a = csv.writer(csvfile_a, delimiter=";")
+        writer_b = csv.writer(csvfile_b, delimiter=";")
+        writer_c = csv.writer(csvfile_c, delimiter=";")
+        _write_header_a(writer_a, eml_metadata, odt_used)
+        _write_header_b(writer_b, eml_metadata, neighbourhoods_used)
+        _write_header_c(writer_c, eml_metadata)
+
+        party_columns = None
+        if parties is not None:
+            party_columns = _get_party_columns(parties, None)
+            _write_party_header_c(writer_c, party_columns)
+
+        for id, results in check_results:
+            _write_row_a(writer_a, eml_metadata, id, results)
+            _write_row_b(writer_b, eml_metadata, id, results)
+
+            if party_columns is None:
+                party_columns = _get_party_columns(None, results)
+                _write_party_header_c(writer_c, party_columns)
+            _write_row_c(writer_c, eml_metadata, id, results, party_columns)
+
+        if party_columns is None:
+            # Without reporting units and given parties, there are no party columns
+            _write_party_header_c(writer_c, [])
+
+
+def _write_header_a(writer, eml_metadata: EmlMetadata, odt_used: bool) -> None:
+    _write_header(
+        writer,
+        eml_metadata,
+        f"Stembureaus met geen verklaring voor telverschillen (odt {("gebruikt" if odt_used else "niet gebruikt")})",
+    )
+
+    writer.writerow(
+        HEADER_COLS
+        + [
+            "Aantal geen verklaring voor verschil",
+            "Aantal ontbrekende verklaringen voor verschil",
+            "Al herteld",
+            "Samenvatting",
+        ]
+    )
+
+
+def _write_row_a(
+    writer, eml_metadata: EmlMetadata, id: str, results: CheckResult
+) -> None:
+    inexplicable_difference = results.inexplicable_difference or None
+    explanation_sum_difference = results.explanation_sum_difference or None
+    already_recounted = "ja" if results.already_recounted else None
+
+    if (
+        inexplicable_difference or explanation_sum_difference
+    ) and not results.already_recounted:
+        writer.writerow(
+            _id_cols(eml_metadata, id, "A")
+            + [
+                inexplicable_difference,
+                explanation_sum_difference,
+                already_recounted,
+                results.summarise(SummaryType.A),
+            ]
+        )
+
+
+def _write_header_b(
+    writer, eml_metadata: EmlMetadata, neighbourhoods_used: bool
+) -> None:
+    _write_header(
+        writer,
+        eml_metadata,
+        (
+            f"Spreadsheet afwijkende percentages blanco en ongeldige stemmen, "
+            "stembureaus met nul stemmen, "
+            f"afwijkingen van het lijstgemiddelde >={EML.PARTY_DIFFERENCE_THRESHOLD_PCT}% "
+            f"en mogelijk verwisselde kandidaten (wijkdata {"gebruikt" if neighbourhoods_used else "niet_gebruikt"})"
+        ),
+    )
+
+    writer.writerow(
+        HEADER_COLS
+        + [
+            "Stembureau met nul stemmen",
+            f"Stembureau >={EML.INVALID_VOTE_THRESHOLD_PCT}% ongeldig",
+            f"Stembureau >={EML.BLANK_VOTE_THRESHOLD_PCT}% blanco",
             (
-                f"Spreadsheet afwijkende percentages blanco en ongeldige stemmen, "
-                "stembureaus met nul stemmen, "
-                f"afwijkingen van het lijstgemiddelde >={EML.PARTY_DIFFERENCE_THRESHOLD_PCT}% "
-                f"en mogelijk verwisselde kandidaten (wijkdata {"gebruikt" if neighbourhoods_used else "niet_gebruikt"})"
+                f"Stembureau >={EML.DIFF_VOTE_THRESHOLD} of >={EML.DIFF_VOTE_THRESHOLD_PCT}% verschil "
+                "tussen toegelaten kiezers en uitgebrachte stemmen"
             ),
-        )
+            f"Stembureau met lijst >={EML.PARTY_DIFFERENCE_THRESHOLD_PCT}% afwijking",
+            "Mogelijk verwisselde kandidaten",
+            "Al herteld",
+            "Samenvatting",
+        ]
+    )
+
 
+def _write_row_b(
+    writer, eml_metadata: EmlMetadata, id: str, results: CheckResult
+) -> None:
+    zero_votes = "ja" if results.zero_votes else None
+    high_invalid_vote_percentage = _format_percentage(
+        results.high_invalid_vote_percentage
+    )
+    high_blank_vote_percentage = _format_percentage(results.high_blank_vote_percentage)
+    high_explained_difference_percentage = _format_vote_difference(
+        results.high_vote_difference
+    )
+    parties_with_high_difference_percentage = ", ".join(
+        results.parties_with_high_difference_percentage
+    )
+    potentially_switched_candidates = _format_potentially_switched_candidates(
+        results.potentially_switched_candidates
+    )
+    already_recounted = "ja" if results.already_recounted else None
+
+    if (
+        zero_votes
+        or high_invalid_vote_percentage
+        or high_blank_vote_percentage
+        or high_explained_difference_percentage
+        or parties_with_high_difference_percentage
+        or potentially_switched_candidates
+    ):
         writer.writerow(
-            HEADER_COLS
+            _id_cols(eml_metadata, id, "B")
             + [
-                "Stembureau met nul stemmen",
-                f"Stembureau >={EML.INVALID_VOTE_THRESHOLD_PCT}% ongeldig",
-                f"Stembureau >={EML.BLANK_VOTE_THRESHOLD_PCT}% blanco",
-                (
-                    f"Stembureau >={EML.DIFF_VOTE_THRESHOLD} of >={EML.DIFF_VOTE_THRESHOLD_PCT}% verschil "
-                    "tussen toegelaten kiezers en uitgebrachte stemmen"
-                ),
-                f"Stembureau met lijst >={EML.PARTY_DIFFERENCE_THRESHOLD_PCT}% afwijking",
-                "Mogelijk verwisselde kandidaten",
-                "Al herteld",
-                "Samenvatting",
+                zero_votes,
+                high_invalid_vote_percentage,
+                high_blank_vote_percentage,
+                high_explained_difference_percentage,
+                parties_with_high_difference_percentage,
+                potentially_switched_candidates,
+                already_recounted,
+                results.summarise(SummaryType.B),
             ]
         )
 
-        for id, results in check_results.items():
-            zero_votes = "ja" if results.zero_votes else None
-            high_invalid_vote_percentage = _format_percentage(
-                results.high_invalid_vote_percentage
-            )
-            high_blank_vote_percentage = _format_percentage(
-                results.high_blank_vote_percentage
-            )
-            high_explained_difference_percentage = _format_vote_difference(
-                results.high_vote_difference
-            )
-            parties_with_high_difference_percentage = ", ".join(
-                results.parties_with_high_difference_percentage
-            )
-            potentially_switched_candidates = _format_potentially_switched_candidates(
-                results.potentially_switched_candidates
-            )
-            already_recounted = "ja" if results.already_recounted else None
-
-            if (
-                zero_votes
-                or high_invalid_vote_percentage
-                or high_blank_vote_percentage
-                or high_explained_difference_percentage
-                or parties_with_high_difference_percentage
-                or potentially_switched_candidates
-            ):
-                writer.writerow(
-                    _id_cols(eml_metadata, id, "B")
-                    + [
-                        zero_votes,
-                        high_invalid_vote_percentage,
-                        high_blank_vote_percentage,
-                        high_explained_difference_percentage,
-                        parties_with_high_difference_percentage,
-                        potentially_switched_candidates,
-                        already_recounted,
-                        results.summarise(SummaryType.B),
-                    ]
-                )
 
+def _write_header_c(writer, eml_metadata: EmlMetadata) -> None:
+    _write_header(writer, eml_metadata, "Afwijking per stembureau per partij")
 
-def write_csv_c(
-    check_results: Dict[str, CheckResult], eml_metadata: EmlMetadata, csv_destination
+
+def _get_party_columns(
+    parties: Optional[Iterable[PartyIdentifier]],
+    first_results: Optional[CheckResult],
+) -> List[PartyIdentifier]:
+    # The column order of output file c is fixed once, instead of sorting the
+    # parties of every reporting unit. Without given parties, assume all reporting
+    # units have the same parties as the first one.
+    if parties is None:
+        if first_results is None:
+            return []
+        parties = first_results.party_difference_percentages.keys()
+    return sorted(parties)
+
+
+def _write_party_header_c(writer, party_columns: List[PartyIdentifier]) -> None:
+    writer.writerow(HEADER_COLS + [party.name for party in party_columns])
+
+
+def _write_row_c(
+    writer,
+    eml_metadata: EmlMetadata,
+    id: str,
+    results: CheckResult,
+    party_columns: List[PartyIdentifier],
 ) -> None:
-    with open(csv_destination, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile, delimiter=";")
-        _write_header(writer, eml_metadata, "Afwijking per stembureau per partij")
-
-        # Assuming all parties are the same
-        parties = [
-            identifier.name
-            for identifier in sorted(
-                list(
-                    next(
-                        iter(check_results.values())
-                    ).party_difference_percentages.keys()
-                )
+    differences = results.party_difference_percentages
+    try:
+        towrite = list(
+            map(
+                _format_percentage_deviation,
+                map(differences.__getitem__, party_columns),
             )
+        )
+    except KeyError:
+        # Parties the reporting unit has no votes for are left empty
+        towrite = [
+            (
+                _format_percentage_deviation(differences[party])
+                if party in differences
+                else None
+            )
+            for party in party_columns
         ]
-        writer.writerow(HEADER_COLS + parties)
-
-        for id, results in check_results.items():
-            towrite = []
-            differences = sorted(results.party_difference_percentages.items())
-            for _, difference in differences:
-                towrite.append(_format_percentage_deviation(difference))
 
-            writer.writerow(_id_cols(eml_metadata, id, "C") + towrite)
+    writer.writerow(_id_cols(eml_metadata, id, "C") + towrite)
@@ -1,16 +1,39 @@
+import io
+import multiprocessing
 import re
-from dataclasses import dataclass
-from typing import ClassVar, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import repeat
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    ClassVar,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from defusedxml import ElementTree as ET
 
 from . import protocol_checks, xml_parser
+from .eml_cache import EmlCache
 from .eml_types import (
     CheckResult,
     EmlMetadata,
+    IdentifierRegistry,
     InvalidEmlException,
+    MainUnitComplement,
     ReportingUnitInfo,
     SwitchedCandidateConfig,
 )
-from .neighbourhood import NeighbourhoodData, ReportingNeighbourhoods
+from .vote_matrix import VoteMatrix
+
+if TYPE_CHECKING:
+    from .nearest_reporting_units import ZipCentroidData
+    from .neighbourhood import NeighbourhoodData, ReportingNeighbourhoods
 
 
 @dataclass
@@ -24,6 +47,12 @@ class EML:
     main_unit_info: ReportingUnitInfo
     reporting_units_info: Dict[str, ReportingUnitInfo]
     metadata: EmlMetadata
+    # Interned party and candidate identifiers shared by all reporting units
+    identifiers: IdentifierRegistry = field(
+        default_factory=IdentifierRegistry, compare=False, repr=False
+    )
+    # Set when the vote counts are backed by a `VoteMatrix`, see `EML.to_columnar`
+    vote_matrix: Optional[VoteMatrix] = field(default=None, compare=False, repr=False)
 
     # Config ---
     INVALID_VOTE_THRESHOLD_PCT: ClassVar[float] = 3.0
@@ -45,78 +74,170 @@ class EML:
     # ---
 
     def run_protocol(
-        self, neighbourhood_data: Optional[NeighbourhoodData] = None
+        self,
+        neighbourhood_data: Optional[
+            Union["NeighbourhoodData", "ZipCentroidData"]
+        ] = None,
+        vectorised: bool = False,
     ) -> Dict[str, CheckResult]:
         """Run all specified protocol checks on this EML instance.
 
         Args:
             neighbourhood_data: If NeighbourhoodData is specified, also run some checks at neighbourhood level.
+                If ZipCentroidData is specified, the nearest reporting units are used as
+                neighbourhood instead.
+            vectorised: If True, run the checks which do not depend on a reference group
+                for all polling stations at once (see `vectorised_checks`) instead of for
+                every polling station separately. Gives the same results.
 
         Returns:
             Dictionary mapping reporting unit ids to resulting CheckResults obtained by running all checks
         """
+        return dict(self.iter_protocol(neighbourhood_data, vectorised))
+
+    def iter_protocol(
+        self,
+        neighbourhood_data: Optional[
+            Union["NeighbourhoodData", "ZipCentroidData"]
+        ] = None,
+        vectorised: bool = False,
+    ) -> Iterator[Tuple[str, CheckResult]]:
+        """Run all specified protocol checks on this EML instance, yielding the result
+        of each reporting unit as soon as it is computed. See `run_protocol`.
+
+        Args:
+            neighbourhood_data: If NeighbourhoodData is specified, also run some checks at neighbourhood level.
+                If ZipCentroidData is specified, the nearest reporting units are used as
+                neighbourhood instead.
+            vectorised: If True, run the checks which do not depend on a reference group
+                for all polling stations at once (see `vectorised_checks`).
+
+        Yields:
+            Pairs of reporting unit id and the `CheckResult` of that reporting unit, in
+                the order of the reporting units in the EML.
+        """
         # Generate reporting neighbourhoods data which can be reused for all individual
         # polling stations
-        reporting_neighbourhoods: Optional[ReportingNeighbourhoods] = (
+        reporting_neighbourhoods: Optional["ReportingNeighbourhoods"] = (
             neighbourhood_data.fetch_reporting_neighbourhoods(
-                self.metadata.reporting_unit_zips, self.reporting_units_info
+                self.metadata.reporting_unit_zips,
+                self.reporting_units_info,
+                self.metadata.authority_id,
             )
             if neighbourhood_data
             else None
         )
 
-        protocol_results = {}
+        vectorised_check_results: Optional[Iterator[CheckResult]] = (
+            iter(self._run_vectorised_checks()) if vectorised else None
+        )
 
         for polling_station_id, polling_station in self.reporting_units_info.items():
-            check_result = CheckResult(
-                zero_votes=protocol_checks.check_zero_votes(polling_station),
-                inexplicable_difference=protocol_checks.check_inexplicable_difference(
-                    polling_station
-                ),
-                explanation_sum_difference=protocol_checks.check_explanation_sum_difference(
-                    polling_station
-                ),
-                high_invalid_vote_percentage=protocol_checks.check_too_many_rejected_votes(
-                    polling_station, "ongeldig", EML.INVALID_VOTE_THRESHOLD_PCT
-                ),
-                high_blank_vote_percentage=protocol_checks.check_too_many_rejected_votes(
-                    polling_station, "blanco", EML.BLANK_VOTE_THRESHOLD_PCT
-                ),
-                high_vote_difference=protocol_checks.check_too_many_differences(
-                    polling_station,
-                    EML.DIFF_VOTE_THRESHOLD_PCT,
-                    EML.DIFF_VOTE_THRESHOLD,
-                ),
-                parties_with_high_difference_percentage=protocol_checks.check_parties_with_large_percentage_difference(
-                    self.main_unit_info,
-                    polling_station,
-                    EML.PARTY_DIFFERENCE_THRESHOLD_PCT,
-                ),
-                party_difference_percentages=protocol_checks.get_party_difference_percentages(
-                    self.main_unit_info, polling_station
-                ),
-                potentially_switched_candidates=protocol_checks.check_potentially_switched_candidates(
+            # The municipality without this polling station, shared by the party
+            # difference and switched candidate checks
+            complement = protocol_checks.get_main_unit_complement(
+                self.main_unit_info, polling_station
+            )
+            check_result = (
+                next(vectorised_check_results)
+                if vectorised_check_results is not None
+                else self._run_checks(polling_station, complement)
+            )
+            check_result.potentially_switched_candidates = (
+                protocol_checks.check_potentially_switched_candidates(
                     polling_station_id,
                     self.main_unit_info,
                     polling_station,
                     self.metadata.reporting_unit_amount,
                     reporting_neighbourhoods,
                     EML.SWITCHED_CANDIDATE_CONFIG,
-                ),
-                already_recounted=False,
+                    complement,
+                )
             )
 
-            protocol_results[polling_station_id] = check_result
+            yield polling_station_id, check_result
+
+    def _run_checks(
+        self, polling_station: ReportingUnitInfo, complement: MainUnitComplement
+    ) -> CheckResult:
+        # Shared by both party difference checks
+        party_difference_percentages = protocol_checks.get_party_difference_percentages(
+            self.main_unit_info, polling_station, complement
+        )
+        return CheckResult(
+            zero_votes=protocol_checks.check_zero_votes(polling_station),
+            inexplicable_difference=protocol_checks.check_inexplicable_difference(
+                polling_station
+            ),
+            explanation_sum_difference=protocol_checks.check_explanation_sum_difference(
+                polling_station
+            ),
+            high_invalid_vote_percentage=protocol_checks.check_too_many_rejected_votes(
+                polling_station, "ongeldig", EML.INVALID_VOTE_THRESHOLD_PCT
+            ),
+            high_blank_vote_percentage=protocol_checks.check_too_many_rejected_votes(
+                polling_station, "blanco", EML.BLANK_VOTE_THRESHOLD_PCT
+            ),
+            high_vote_difference=protocol_checks.check_too_many_differences(
+                polling_station,
+                EML.DIFF_VOTE_THRESHOLD_PCT,
+                EML.DIFF_VOTE_THRESHOLD,
+            ),
+            parties_with_high_difference_percentage=protocol_checks.check_parties_with_large_percentage_difference(
+                self.main_unit_info,
+                polling_station,
+                EML.PARTY_DIFFERENCE_THRESHOLD_PCT,
+                party_difference_percentages,
+            ),
+            party_difference_percentages=party_difference_percentages,
+            # Filled in by `run_protocol`, as it needs the reference groups
+            potentially_switched_candidates=[],
+            already_recounted=False,
+        )
 
-        return protocol_results
+    def _run_vectorised_checks(self) -> List[CheckResult]:
+        # Imports polars, so only when used
+        from . import vectorised_checks
+
+        vote_matrix = self.to_columnar().vote_matrix
+        assert vote_matrix is not None
+        return vectorised_checks.run_checks(
+            vote_matrix,
+            list(self.reporting_units_info.values()),
+            invalid_vote_threshold_pct=EML.INVALID_VOTE_THRESHOLD_PCT,
+            blank_vote_threshold_pct=EML.BLANK_VOTE_THRESHOLD_PCT,
+            diff_vote_threshold_pct=EML.DIFF_VOTE_THRESHOLD_PCT,
+            diff_vote_threshold=EML.DIFF_VOTE_THRESHOLD,
+            party_difference_threshold_pct=EML.PARTY_DIFFERENCE_THRESHOLD_PCT,
+        )
 
     @staticmethod
-    def from_xml(file_path: str) -> "EML":
+    def from_xml(
+        file_path: Union[str, IO[bytes]],
+        streaming: bool = False,
+        workers: Optional[int] = None,
+        cache: Optional[EmlCache] = None,
+        columnar: bool = False,
+    ) -> "EML":
         """Static method for constructing an instance of the EML class
         from a given file_path
 
         Args:
-            file_path: Path to the .eml.xml file to read.
+            file_path: Path to (or binary stream of) the .eml.xml file to read. A
+                stream, such as a member of a .zip file opened with `ZipFile.open`,
+                is parsed without writing it to disk.
+            streaming: If True, parse the file incrementally instead of loading the full
+                DOM-tree into memory. Results in the same `EML` instance but keeps memory
+                usage roughly constant for very large counts.
+            workers: If larger than 1, split the reporting units into byte ranges and parse
+                these in parallel using this amount of worker processes. Useful for
+                central (510c/510d) counts with many reporting units. Streams, and
+                files declaring namespaces below the root element, are parsed
+                incrementally instead, as they can not be split into ranges.
+            cache: If specified, return the parsed EML from this cache when the same file
+                has been parsed before, and store it in the cache otherwise.
+            columnar: If True, store the vote counts in a `VoteMatrix` instead of
+                separate dicts per reporting unit, see `EML.to_columnar`.
 
         Raises:
             InvalidEmlException: when specified .eml.xml is of incorrect type.
@@ -125,36 +246,200 @@ class EML:
         Returns:
             EML class instance with all relevant data to run the protocol checks.
         """
+        cache_key = cache.key(file_path) if cache else None
+        if cache and cache_key:
+            cached_eml = cache.get(cache_key)
+            if cached_eml is not None:
+                return cached_eml.to_columnar() if columnar else cached_eml
+
+        if workers is not None and workers > 1 and isinstance(file_path, str):
+            eml = EML._from_xml_parallel(file_path, workers)
+        elif streaming or (workers is not None and workers > 1):
+            eml = EML._from_xml_stream(file_path)
+        else:
+            eml = EML._from_xml_dom(file_path)
+
+        if cache and cache_key:
+            cache.put(cache_key, eml)
+
+        return eml.to_columnar() if columnar else eml
+
+    def to_columnar(self) -> "EML":
+        """Construct an equal EML whose vote counts are stored in a `VoteMatrix`: a
+        shared index of parties, candidates and reason codes with dense integer columns
+        for all reporting units. The reporting units are views on the rows of the matrix
+        (the main unit being the first row), which uses several times less memory than
+        a dict per reporting unit.
+
+        Returns:
+            EML class instance backed by a `VoteMatrix`.
+        """
+        if self.vote_matrix is not None:
+            return self
+
+        vote_matrix = VoteMatrix.from_identifiers(self.identifiers)
+        main_unit_info = vote_matrix.append(self.main_unit_info)
+        reporting_units_info = {
+            reporting_unit_id: vote_matrix.append(info)
+            for reporting_unit_id, info in self.reporting_units_info.items()
+        }
+
+        return EML(
+            self.eml_file_id,
+            main_unit_info,
+            reporting_units_info,
+            self.metadata,
+            identifiers=self.identifiers,
+            vote_matrix=vote_matrix,
+        )
+
+    @staticmethod
+    def _from_xml_dom(file_path: Union[str, IO[bytes]]) -> "EML":
         # Root element of the XML file
         xml_root = xml_parser.parse_xml(file_path)
 
         # EML id
-        eml_file_id = xml_parser.get_eml_type(xml_root)
-        # Check if EML is of type 510
-        if not eml_file_id or not re.match("510[a-dqrs]", eml_file_id):
-            raise InvalidEmlException(
-                f"Tried to load EML with id {eml_file_id}, expected 510[a-dqrs]"
-            )
+        eml_file_id = _check_eml_type(xml_parser.get_eml_type(xml_root))
 
         # XML elements with votes of the main unit (the unit itself) and
         # the reporting_units (subunits, so for GSB these are SBs, for HSB GSBs etc..)
         main_unit = xml_parser.get_main_unit(xml_root)
         reporting_units = xml_parser.get_reporting_units(xml_root)
 
-        # Fetch vote information for main unit
-        main_unit_info = xml_parser.get_reporting_unit_info(main_unit)
+        # Fetch vote information for main unit, its identifiers are interned first
+        identifiers = IdentifierRegistry()
+        main_unit_info = xml_parser.get_reporting_unit_info(main_unit, identifiers)
 
-        # Fetch vote information for each individual subunit and index by reporting unit id
+        # Fetch vote information for each individual subunit and index by reporting unit id.
+        # The reporting unit identifiers for the metadata are collected along the way,
+        # so that we do not have to scan the full DOM-tree for them a second time.
         reporting_units_info = {}
+        reporting_unit_identifiers = []
         for reporting_unit in reporting_units:
-            info = xml_parser.get_reporting_unit_info(reporting_unit)
+            info = xml_parser.get_reporting_unit_info(reporting_unit, identifiers)
             if info.reporting_unit_id is None:
                 raise InvalidEmlException(
                     f"Tried to add reporting unit {reporting_unit} without ID!"
                 )
             reporting_units_info[info.reporting_unit_id] = info
+            reporting_unit_identifiers.append(
+                (info.reporting_unit_id, info.reporting_unit_name)
+            )
 
         # Fetch metadata of main EML
-        metadata = xml_parser.get_metadata(xml_root)
+        metadata = xml_parser.get_metadata(xml_root, reporting_unit_identifiers)
 
-        return EML(eml_file_id, main_unit_info, reporting_units_info, metadata)
+        return EML(
+            eml_file_id, main_unit_info, reporting_units_info, metadata, identifiers
+        )
+
+    @staticmethod
+    def _from_xml_stream(file_path: Union[str, IO[bytes]]) -> "EML":
+        xml_root, vote_elements = xml_parser.iterparse_eml(file_path)
+        eml_file_id = _check_eml_type(xml_parser.get_eml_type(xml_root))
+        identifiers = IdentifierRegistry()
+
+        main_unit_info: Optional[ReportingUnitInfo] = None
+        reporting_units_info = {}
+        reporting_unit_identifiers = []
+
+        for vote_element in vote_elements:
+            if vote_element.tag == xml_parser.TOTAL_VOTES_TAG:
+                # Only the first main unit is used, as in `xml_parser.get_main_unit`
+                if main_unit_info is None:
+                    main_unit_info = xml_parser.get_reporting_unit_info(
+                        vote_element, identifiers
+                    )
+                continue
+
+            info = xml_parser.get_reporting_unit_info(vote_element, identifiers)
+            if info.reporting_unit_id is None:
+                raise InvalidEmlException(
+                    f"Tried to add reporting unit {vote_element} without ID!"
+                )
+            reporting_units_info[info.reporting_unit_id] = info
+            reporting_unit_identifiers.append(
+                (info.reporting_unit_id, info.reporting_unit_name)
+            )
+
+        if main_unit_info is None:
+            raise AttributeError("EML had no main reporting unit!")
+
+        # Vote elements have been removed from the tree, so we have to pass the
+        # reporting unit identifiers we collected along the way
+        metadata = xml_parser.get_metadata(xml_root, reporting_unit_identifiers)
+
+        return EML(
+            eml_file_id, main_unit_info, reporting_units_info, metadata, identifiers
+        )
+
+    @staticmethod
+    def _from_xml_parallel(file_path: str, workers: int) -> "EML":
+        # Use a few ranges per worker so that uneven ranges are balanced out
+        unit_ranges = xml_parser.split_reporting_units(file_path, workers * 4)
+
+        infos: List[ReportingUnitInfo] = []
+        try:
+            # The skeleton contains everything except for the reporting units
+            xml_root = xml_parser.parse_xml(io.BytesIO(unit_ranges.skeleton))
+            eml_file_id = _check_eml_type(xml_parser.get_eml_type(xml_root))
+            if unit_ranges.ranges:
+                starts, ends = zip(*unit_ranges.ranges)
+                # Forking a process in which polars has started its thread pool (e.g.
+                # to build a neighbourhood index) may deadlock
+                with ProcessPoolExecutor(
+                    max_workers=min(workers, len(unit_ranges.ranges)),
+                    mp_context=multiprocessing.get_context("spawn"),
+                ) as executor:
+                    # `map` returns the results in the order of the ranges, which is
+                    # the document order
+                    for range_infos in executor.map(
+                        xml_parser.parse_reporting_unit_range,
+                        repeat(file_path),
+                        starts,
+                        ends,
+                        repeat(unit_ranges.head),
+                        repeat(unit_ranges.tail),
+                    ):
+                        infos.extend(range_infos)
+        except ET.ParseError:
+            return EML._from_xml_stream(file_path)
+
+        if len(infos) != unit_ranges.unit_count:
+            # The ranges are parsed with only the namespace declarations of the root
+            # element, so reporting units in another namespace are left out
+            return EML._from_xml_stream(file_path)
+
+        identifiers = IdentifierRegistry()
+        main_unit_info = xml_parser.get_reporting_unit_info(
+            xml_parser.get_main_unit(xml_root), identifiers
+        )
+
+        reporting_units_info = {}
+        reporting_unit_identifiers = []
+        for info in infos:
+            if info.reporting_unit_id is None:
+                raise InvalidEmlException(
+                    f"Tried to add reporting unit {info} without ID!"
+                )
+            # Each worker has interned its own identifiers
+            identifiers.intern_unit(info)
+            reporting_units_info[info.reporting_unit_id] = info
+            reporting_unit_identifiers.append(
+                (info.reporting_unit_id, info.reporting_unit_name)
+            )
+
+        metadata = xml_parser.get_metadata(xml_root, reporting_unit_identifiers)
+
+        return EML(
+            eml_file_id, main_unit_info, reporting_units_info, metadata, identifiers
+        )
+
+
+def _check_eml_type(eml_file_id: Optional[str]) -> str:
+    # Check if EML is of type 510
+    if not eml_file_id or not re.match("510[a-dqrs]", eml_file_id):
+        raise InvalidEmlException(
+            f"Tried to load EML with id {eml_file_id}, expected 510[a-dqrs]"
+        )
+    return eml_file_id
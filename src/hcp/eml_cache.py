@@ -0,0 +1,201 @@
+import hashlib
+import marshal
+import os
+import zlib
+from dataclasses import astuple, dataclass
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, List, Optional, Tuple, Union
+
+from . import xml_parser
+from .eml_types import EmlMetadata, IdentifierRegistry, ReportingUnitInfo
+
+if TYPE_CHECKING:
+    from .eml import EML
+
+# Bump when the layout of the cached data changes
+CACHE_FORMAT_VERSION = 1
+CACHE_SUFFIX = ".emlcache"
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+@dataclass
+class EmlCache:
+    """On-disk cache of parsed EML files. Entries are keyed by the SHA-256 of the
+    .eml.xml contents together with the parser version, and are stored in a compact
+    binary format (zlib compressed `marshal` of plain Python values, which unlike
+    `pickle` cannot execute code when loaded).
+
+    When the total size of the cache exceeds `max_size` bytes, the least recently
+    used entries are evicted.
+    """
+
+    directory: Path
+    max_size: int = DEFAULT_MAX_SIZE
+
+    @staticmethod
+    def default() -> "EmlCache":
+        """Construct an `EmlCache` in the default location, which is `$HCP_CACHE_DIR`
+        if set, otherwise `hcp` in the user cache directory.
+
+        Returns:
+            `EmlCache` instance.
+        """
+        directory = os.environ.get("HCP_CACHE_DIR")
+        if directory is None:
+            cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+            directory = Path(cache_home) / "hcp"
+        return EmlCache(directory=Path(directory))
+
+    def key(self, file: Union[str, IO[bytes]]) -> Optional[str]:
+        """Compute the cache key for a given .eml.xml file.
+
+        Args:
+            file: Path to (or seekable binary stream of) the .eml.xml file.
+
+        Returns:
+            The cache key, or `None` if the file can not be hashed without consuming it.
+        """
+        digest = hashlib.sha256(
+            f"{xml_parser.PARSER_VERSION}:{CACHE_FORMAT_VERSION}:".encode()
+        )
+        if isinstance(file, str):
+            with open(file, "rb") as opened_file:
+                hashlib.file_digest(opened_file, lambda: digest)
+        else:
+            if not file.seekable():
+                return None
+            position = file.tell()
+            hashlib.file_digest(file, lambda: digest)
+            file.seek(position)
+
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional["EML"]:
+        """Fetch a parsed EML from the cache.
+
+        Args:
+            key: The cache key as computed by `EmlCache.key`.
+
+        Returns:
+            The cached `EML` if present and readable, `None` otherwise.
+        """
+        from .eml import EML
+
+        path = self._path(key)
+        try:
+            data = marshal.loads(zlib.decompress(path.read_bytes()))
+            identifiers = IdentifierRegistry()
+            main_unit_info = _decode_unit(data[1], identifiers)
+            eml = EML(
+                eml_file_id=data[0],
+                main_unit_info=main_unit_info,
+                reporting_units_info={
+                    unit.reporting_unit_id: unit
+                    for unit in (_decode_unit(unit, identifiers) for unit in data[2])
+                },
+                metadata=EmlMetadata(*data[3]),
+                identifiers=identifiers,
+            )
+            # Mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Corrupt or incompatible entry, remove it so it is written again
+            path.unlink(missing_ok=True)
+            return None
+
+        return eml
+
+    def put(self, key: str, eml: "EML") -> None:
+        """Store a parsed EML in the cache and evict the least recently used entries
+        if the cache grows too large. Failing to write to the cache is not an error.
+
+        Args:
+            key: The cache key as computed by `EmlCache.key`.
+            eml: The `EML` to store.
+        """
+        data = (
+            eml.eml_file_id,
+            _encode_unit(eml.main_unit_info),
+            [_encode_unit(unit) for unit in eml.reporting_units_info.values()],
+            astuple(eml.metadata),
+        )
+        path = self._path(key)
+        temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            temporary_path.write_bytes(zlib.compress(marshal.dumps(data)))
+            # Atomic, so concurrent runs never see a partially written entry
+            os.replace(temporary_path, path)
+            self._evict()
+        except OSError:
+            temporary_path.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        for path in self.directory.glob(f"*{CACHE_SUFFIX}"):
+            path.unlink(missing_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}{CACHE_SUFFIX}"
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.directory.glob(f"*{CACHE_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+
+EncodedParty = Tuple[int, Optional[str], int]
+EncodedCandidate = Tuple[int, Optional[str], int, int]
+
+
+def _encode_unit(unit: ReportingUnitInfo) -> tuple:
+    return (
+        unit.reporting_unit_id,
+        unit.reporting_unit_name,
+        unit.cast,
+        unit.total_counted,
+        dict(unit.rejected_votes),
+        dict(unit.uncounted_votes),
+        [
+            (party.id, party.name, votes)
+            for party, votes in unit.votes_per_party.items()
+        ],
+        [
+            (candidate.party.id, candidate.party.name, candidate.cand_id, votes)
+            for candidate, votes in unit.votes_per_candidate.items()
+        ],
+    )
+
+
+def _decode_unit(data: tuple, identifiers: IdentifierRegistry) -> ReportingUnitInfo:
+    encoded_parties: List[EncodedParty] = data[6]
+    encoded_candidates: List[EncodedCandidate] = data[7]
+
+    return ReportingUnitInfo(
+        reporting_unit_id=data[0],
+        reporting_unit_name=data[1],
+        cast=data[2],
+        total_counted=data[3],
+        rejected_votes=data[4],
+        uncounted_votes=data[5],
+        votes_per_party={
+            identifiers.party(id, name): votes for id, name, votes in encoded_parties
+        },
+        votes_per_candidate={
+            identifiers.candidate(identifiers.party(id, name), cand_id): votes
+            for id, name, cand_id, votes in encoded_candidates
+        },
+    )
@@ -1,6 +1,6 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 
 @dataclass
@@ -24,19 +24,45 @@ class EmlMetadata:
 
 @dataclass(frozen=True, order=True)
 class PartyIdentifier:
-    """Party identifier used for matching parties in dicts."""
+    """Party identifier used for matching parties in dicts. The hash is cached, as
+    identifiers are hashed for every dict lookup.
+    """
 
     id: int
     name: Optional[str]
 
+    def __hash__(self) -> int:
+        try:
+            return self.__dict__["_hash"]
+        except KeyError:
+            value = self.__dict__["_hash"] = hash((self.id, self.name))
+            return value
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The hash of a string differs between processes, so do not pickle it
+        return {"id": self.id, "name": self.name}
+
 
 @dataclass(frozen=True, order=True)
 class CandidateIdentifier:
-    """Candidate identifier used for matching candidates in dicts."""
+    """Candidate identifier used for matching candidates in dicts. The hash is cached,
+    as identifiers are hashed for every dict lookup.
+    """
 
     party: PartyIdentifier
     cand_id: int
 
+    def __hash__(self) -> int:
+        try:
+            return self.__dict__["_hash"]
+        except KeyError:
+            value = self.__dict__["_hash"] = hash((self.party, self.cand_id))
+            return value
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The hash of a string differs between processes, so do not pickle it
+        return {"party": self.party, "cand_id": self.cand_id}
+
 
 @dataclass
 class ReportingUnitInfo:
@@ -55,6 +81,107 @@ class ReportingUnitInfo:
     votes_per_candidate: Dict[CandidateIdentifier, int]
 
 
+@dataclass
+class MainUnitComplement:
+    """Container for the totals of a main unit (usually the municipality) without one
+    of its reporting units. The checks which compare a reporting unit with the rest of
+    the municipality share this, see `protocol_checks.get_main_unit_complement`.
+    """
+
+    total_counted: int
+    votes_per_party: Dict[PartyIdentifier, int]
+
+
+@dataclass
+class IdentifierRegistry:
+    """Registry which interns the party and candidate identifiers of an EML, so that
+    every reporting unit shares the same identifier instances (which makes dict lookups
+    an identity check) and every identifier has an integer ordinal. Identifiers are
+    numbered in order of first appearance, which is the order of the main unit.
+    """
+
+    parties: List[PartyIdentifier] = field(default_factory=list)
+    candidates: List[CandidateIdentifier] = field(default_factory=list)
+    party_ordinals: Dict[PartyIdentifier, int] = field(default_factory=dict)
+    candidate_ordinals: Dict[CandidateIdentifier, int] = field(default_factory=dict)
+    _party_keys: Dict[Tuple[int, Optional[str]], PartyIdentifier] = field(
+        default_factory=dict, repr=False
+    )
+    _candidate_keys: Dict[Tuple[int, int], CandidateIdentifier] = field(
+        default_factory=dict, repr=False
+    )
+
+    def party(self, id: int, name: Optional[str]) -> PartyIdentifier:
+        """Fetch the interned party identifier, registering it if it is new.
+
+        Args:
+            id: Id of the party.
+            name: Registered name of the party.
+
+        Returns:
+            The interned `PartyIdentifier`.
+        """
+        party = self._party_keys.get((id, name))
+        if party is None:
+            party = self._register_party(PartyIdentifier(id=id, name=name))
+        return party
+
+    def candidate(self, party: PartyIdentifier, cand_id: int) -> CandidateIdentifier:
+        """Fetch the interned candidate identifier, registering it if it is new.
+
+        Args:
+            party: Interned identifier of the party of the candidate.
+            cand_id: Id of the candidate.
+
+        Returns:
+            The interned `CandidateIdentifier`.
+        """
+        candidate = self._candidate_keys.get((self.party_ordinals[party], cand_id))
+        if candidate is None:
+            candidate = self._register_candidate(
+                CandidateIdentifier(party=party, cand_id=cand_id)
+            )
+        return candidate
+
+    def intern_unit(self, reporting_unit: ReportingUnitInfo) -> ReportingUnitInfo:
+        """Replace the identifiers of a reporting unit constructed elsewhere (e.g. in a
+        worker process or from the cache) by the interned ones.
+
+        Args:
+            reporting_unit: The reporting unit, which is modified in place.
+
+        Returns:
+            The same reporting unit.
+        """
+        reporting_unit.votes_per_party = {
+            self.party(party.id, party.name): votes
+            for party, votes in reporting_unit.votes_per_party.items()
+        }
+        reporting_unit.votes_per_candidate = {
+            self.candidate(
+                self.party(candidate.party.id, candidate.party.name), candidate.cand_id
+            ): votes
+            for candidate, votes in reporting_unit.votes_per_candidate.items()
+        }
+        return reporting_unit
+
+    def _register_party(self, party: PartyIdentifier) -> PartyIdentifier:
+        self._party_keys[(party.id, party.name)] = party
+        self.party_ordinals[party] = len(self.parties)
+        self.parties.append(party)
+        return party
+
+    def _register_candidate(
+        self, candidate: CandidateIdentifier
+    ) -> CandidateIdentifier:
+        self._candidate_keys[
+            (self.party_ordinals[candidate.party], candidate.cand_id)
+        ] = candidate
+        self.candidate_ordinals[candidate] = len(self.candidates)
+        self.candidates.append(candidate)
+        return candidate
+
+
 @dataclass
 class VoteDifferenceAmount:
     """Simple wrapper for int value."""
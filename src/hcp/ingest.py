@@ -0,0 +1,71 @@
+"""Reading the election results from the .zip file as output by OSV-2020U.
+
+The .zip file contains the proces verbaal (.odt) and a nested .zip file with the count
+(.eml.xml). Both are read directly from the (nested) `ZipFile.open` handles instead of
+being extracted, so no temporary files are written and concurrent runs in the same
+working directory do not interfere with each other.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Iterator, Optional, Union
+from zipfile import ZipFile, ZipInfo
+
+from .odt import ODT
+
+
+class InvalidZipException(Exception):
+    pass
+
+
+@dataclass
+class ElectionResultZip:
+    """Contents of an opened OSV-2020U .zip file."""
+
+    eml_file: IO[bytes]
+    eml_file_name: str
+    odt: Optional[ODT]
+
+
+@contextmanager
+def open_election_result_zip(
+    zip_path: Union[str, Path, IO[bytes]],
+) -> Iterator[ElectionResultZip]:
+    """Open the .eml.xml and .odt file in a .zip file as output by OSV-2020U. The
+    .eml.xml file is streamed from the nested .zip file and is only readable within
+    the context.
+
+    Args:
+        zip_path: Path to (or seekable binary stream of) the .zip file.
+
+    Raises:
+        InvalidZipException: when the .zip file does not contain the expected files.
+
+    Returns:
+        Context manager yielding an `ElectionResultZip`. The `odt` is `None` if the
+            .odt file could not be read, like `ODT.from_path`.
+    """
+    with ZipFile(zip_path, "r") as outer_zipfile:
+        odt_zipinfo = _find_member(outer_zipfile, ".odt")
+        inner_zipinfo = _find_member(outer_zipfile, ".zip")
+
+        with outer_zipfile.open(odt_zipinfo) as odt_file:
+            odt = ODT.from_file(odt_file, odt_zipinfo.filename)
+
+        with (
+            outer_zipfile.open(inner_zipinfo) as inner_file,
+            ZipFile(inner_file, "r") as inner_zipfile,
+        ):
+            eml_zipinfo = _find_member(inner_zipfile, ".eml.xml")
+            with inner_zipfile.open(eml_zipinfo) as eml_file:
+                yield ElectionResultZip(
+                    eml_file=eml_file, eml_file_name=eml_zipinfo.filename, odt=odt
+                )
+
+
+def _find_member(zip_file: ZipFile, suffix: str) -> ZipInfo:
+    try:
+        return next(f for f in zip_file.filelist if f.filename.endswith(suffix))
+    except StopIteration:
+        raise InvalidZipException(f"Zip file contains no {suffix} file") from None
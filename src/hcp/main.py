@@ -1,51 +1,127 @@
-from typing import Optional
+from io import BytesIO
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from . import csv_write
+from .csv_write import CsvDestination
 from .eml import EML
-from .neighbourhood import NeighbourhoodData
+from .eml_cache import EmlCache
+from .eml_types import CheckResult
 from .odt import ODT
 
+if TYPE_CHECKING:
+    from .nearest_reporting_units import ZipCentroidData
+    from .neighbourhood import NeighbourhoodData, NeighbourhoodRegistry
+
 
 def create_csv_files(
-    path_to_xml: str,
-    dest_a: str,
-    dest_b: str,
-    dest_c: str,
+    path_to_xml: Union[str, IO[bytes]],
+    dest_a: CsvDestination,
+    dest_b: CsvDestination,
+    dest_c: CsvDestination,
     path_to_odt: Optional[str] = None,
     path_to_neighbourhood_data: Optional[str] = None,
+    streaming: bool = False,
+    workers: Optional[int] = None,
+    cache: Optional[EmlCache] = None,
+    path_to_zip_centroids: Optional[str] = None,
+    nearest_reporting_units: Optional[int] = None,
+    neighbourhood_registry: Optional["NeighbourhoodRegistry"] = None,
+    dest_parquet: Optional[Union[str, BinaryIO]] = None,
+    odt: Optional[ODT] = None,
+    neighbourhood_data: Optional[Union["NeighbourhoodData", "ZipCentroidData"]] = None,
+    vectorised: bool = False,
 ) -> None:
     """Main entry point for running HCP on a given .eml.xml file. We can optionally specify
     the following data:
         - path_to_odt: if a path to the corresponding ODT (proces verbaal) is specified
         then HCP additionally checks if a given reporting unit has already recounted
-        and thus is exempt from certain mandatory recounts.
+        and thus is exempt from certain mandatory recounts. An already read ODT, for
+        example from a .zip file (see `ingest.open_election_result_zip`), can be
+        given as odt instead.
         - path_to_neighbourhood_data: if a path to neighbourhood data is specified
         then we run some checks at a neighbourhood level in addition to the municipality
         level.
+        - streaming: if set, the .eml.xml is parsed incrementally which keeps memory
+        usage roughly constant for very large (510c/510d) counts.
+        - workers: if larger than 1, the reporting units in the .eml.xml are parsed in
+        parallel by this amount of worker processes.
+        - cache: if specified, the parsed .eml.xml is stored in (or fetched from) this
+        on-disk cache so repeated runs on the same file do not parse it again.
+        - path_to_zip_centroids: if a path to zip code centroids is specified then
+        the neighbourhood level checks compare each reporting unit with the reporting
+        units nearest to it, instead of with those in the same neighbourhood.
+        - neighbourhood_registry: if no path to neighbourhood data is specified, the
+        neighbourhood data matching the date of the election is taken from this
+        registry.
+        - neighbourhood_data: already loaded neighbourhood data (or zip code
+        centroids), used instead of the paths and the registry. Useful when running
+        HCP on many .eml.xml files, see `batch`.
+        - dest_a, dest_b, dest_c: instead of paths, writable binary streams can be
+        given, so the output does not have to be written to disk (see also
+        `create_csv_buffers`).
+        - dest_parquet: if specified, all check results are additionally written to
+        this .parquet file as typed columns, for further processing.
+        - vectorised: if set, the checks which do not depend on a reference group are
+        run for all reporting units at once (see `vectorised_checks`), which is faster
+        for large counts. The output is the same.
 
     Args:
-        path_to_xml: Path to the .eml.xml file to run HCP on.
-        dest_a: Path to write output file a (inexplicable differences) to.
-        dest_b: Path to write output file b (warnings and remarkable results) to.
-        dest_c: Path to write output file c (percentage deviation per reporting unit per affiliation) to.
+        path_to_xml: Path to (or binary stream of) the .eml.xml file to run HCP on.
+        dest_a: Path or binary stream to write output file a (inexplicable differences) to.
+        dest_b: Path or binary stream to write output file b (warnings and remarkable results) to.
+        dest_c: Path or binary stream to write output file c (percentage deviation per reporting unit per affiliation) to.
         path_to_odt: Path to the ODT (proces verbaal) corresponding to the provided .eml.xml.
         path_to_neighbourhood_data: Path to either .csv or .parquet file containing neighbourhood data.
+        streaming: Whether to parse the .eml.xml incrementally instead of loading the full DOM-tree.
+        workers: Amount of worker processes to parse the .eml.xml with.
+        cache: Cache for parsed .eml.xml files.
+        path_to_zip_centroids: Path to a .csv file containing zip code centroids.
+        nearest_reporting_units: Size of the reference group of each reporting unit
+            when zip code centroids are used, by default
+            `DEFAULT_NEAREST_REPORTING_UNITS`.
+        neighbourhood_registry: Registry of neighbourhood datasets per year.
+        dest_parquet: Path or binary stream to write all check results to as a .parquet file.
+        odt: The ODT (proces verbaal), used when no path_to_odt is specified.
+        neighbourhood_data: Loaded neighbourhood data or zip code centroids.
+        vectorised: Whether to run the checks for all reporting units at once.
+
+    Raises:
+        InvalidZipCentroidsException: when path_to_zip_centroids is specified but the
+            zip code centroids could not be read from it.
     """
     # Parse the eml from the path
-    eml = EML.from_xml(path_to_xml)
+    eml = EML.from_xml(path_to_xml, streaming=streaming, workers=workers, cache=cache)
 
-    # Load in neighbourhood data
-    neighbourhood_data = NeighbourhoodData.from_path(path_to_neighbourhood_data)
+    # Load in neighbourhood data, or the zip code centroids to use instead
+    if neighbourhood_data is None:
+        neighbourhood_data = load_neighbourhood_data(
+            eml.metadata.election_date,
+            path_to_neighbourhood_data,
+            path_to_zip_centroids,
+            nearest_reporting_units,
+            neighbourhood_registry,
+        )
 
-    # Run protocol
-    check_results = eml.run_protocol(neighbourhood_data=neighbourhood_data)
     eml_metadata = eml.metadata
 
     # If odt_path is specified we try to read the file and extract the relevant
     # parts, as a precaution we will not fail if anything goes wrong here, but
     # simply return 'None' for the odt object and then the empty list for the
     # already recounted variable
-    odt = ODT.from_path(path_to_odt)
+    if path_to_odt is not None:
+        odt = ODT.from_path(path_to_odt)
+    recounted_ids: Set[str] = set()
     if odt:
         recounted_polling_stations = odt.get_already_recounted_polling_stations()
         for polling_station in recounted_polling_stations:
@@ -63,13 +139,116 @@ def create_csv_files(
             )
 
             if (
-                full_id in check_results.keys()
+                full_id in eml.reporting_units_info
                 and polling_station_name_eml == polling_station_name_odt
             ):
-                check_results[full_id].already_recounted = True
+                recounted_ids.add(full_id)
+
+    # Run protocol, writing the result of every reporting unit to the output files
+    # as soon as it is computed
+    all_check_results: List[Tuple[str, CheckResult]] = []
+
+    def check_results() -> Iterator[Tuple[str, CheckResult]]:
+        for id, check_result in eml.iter_protocol(neighbourhood_data, vectorised):
+            check_result.already_recounted = id in recounted_ids
+            if dest_parquet is not None:
+                all_check_results.append((id, check_result))
+            yield id, check_result
 
-    csv_write.write_csv_a(check_results, eml_metadata, odt is not None, dest_a)
-    csv_write.write_csv_b(
-        check_results, eml_metadata, neighbourhood_data is not None, dest_b
+    csv_write.write_csv_files(
+        check_results(),
+        eml_metadata,
+        odt is not None,
+        neighbourhood_data is not None,
+        dest_a,
+        dest_b,
+        dest_c,
+        parties=eml.main_unit_info.votes_per_party,
     )
-    csv_write.write_csv_c(check_results, eml_metadata, dest_c)
+
+    if dest_parquet is not None:
+        # Only imported when used, as it requires polars
+        from .parquet_write import write_parquet
+
+        write_parquet(all_check_results, eml_metadata, dest_parquet)
+
+
+def create_csv_buffers(
+    path_to_xml: Union[str, IO[bytes]], **kwargs: Any
+) -> Tuple[BytesIO, BytesIO, BytesIO]:
+    """Run HCP on a given .eml.xml file like `create_csv_files`, but return output
+    files a, b and c as in-memory buffers instead of writing them to disk.
+
+    Args:
+        path_to_xml: Path to (or binary stream of) the .eml.xml file to run HCP on.
+        **kwargs: Optional arguments of `create_csv_files`, such as `path_to_odt`.
+
+    Returns:
+        The UTF-8 encoded contents of output files a, b and c, positioned at the start.
+    """
+    buffers = BytesIO(), BytesIO(), BytesIO()
+    create_csv_files(path_to_xml, *buffers, **kwargs)
+    for buffer in buffers:
+        buffer.seek(0)
+    return buffers
+
+
+def load_neighbourhood_data(
+    election_date: Optional[str] = None,
+    path_to_neighbourhood_data: Optional[str] = None,
+    path_to_zip_centroids: Optional[str] = None,
+    nearest_reporting_units: Optional[int] = None,
+    neighbourhood_registry: Optional["NeighbourhoodRegistry"] = None,
+) -> Optional[Union["NeighbourhoodData", "ZipCentroidData"]]:
+    """Load the neighbourhood data (or zip code centroids) as `create_csv_files` does,
+    for example to load it once for many .eml.xml files (see `batch`). Zip code
+    centroids take precedence over neighbourhood data, which takes precedence over
+    the registry.
+
+    Args:
+        election_date: The date of the election, used to pick the neighbourhood data
+            from the registry.
+        path_to_neighbourhood_data: Path to either .csv or .parquet file containing neighbourhood data.
+        path_to_zip_centroids: Path to a .csv file containing zip code centroids.
+        nearest_reporting_units: Size of the reference group of each reporting unit
+            when zip code centroids are used.
+        neighbourhood_registry: Registry of neighbourhood datasets per year.
+
+    Raises:
+        InvalidZipCentroidsException: when path_to_zip_centroids is specified but the
+            zip code centroids could not be read from it.
+
+    Returns:
+        The loaded neighbourhood data or zip code centroids, `None` if nothing is
+            specified or the neighbourhood data could not be read.
+    """
+    # The neighbourhood modules are only imported when they are used, as reading
+    # .csv and .parquet neighbourhood data requires polars
+    if path_to_zip_centroids is not None:
+        from .nearest_reporting_units import (
+            DEFAULT_NEAREST_REPORTING_UNITS,
+            InvalidZipCentroidsException,
+            ZipCentroidData,
+        )
+
+        zip_centroid_data = ZipCentroidData.from_path(
+            path_to_zip_centroids,
+            k=nearest_reporting_units or DEFAULT_NEAREST_REPORTING_UNITS,
+        )
+        # Falling back to the neighbourhood data would silently use other
+        # reference groups than the ones asked for
+        if zip_centroid_data is None:
+            raise InvalidZipCentroidsException(
+                f"Could not read zip code centroids from {path_to_zip_centroids}"
+            )
+        return zip_centroid_data
+
+    if path_to_neighbourhood_data is not None:
+        from .neighbourhood import NeighbourhoodData
+
+        return NeighbourhoodData.from_path(path_to_neighbourhood_data)
+
+    if neighbourhood_registry is not None:
+        return neighbourhood_registry.for_election_date(election_date)
+
+    return None
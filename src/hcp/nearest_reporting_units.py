@@ -0,0 +1,253 @@
+"""Reference groups of the nearest reporting units, as an alternative to neighbourhoods.
+
+Instead of grouping reporting units by the neighbourhood of their zip code, every
+reporting unit gets a reference group of its own: the unit itself and the reporting
+units closest to it, based on the centroids of their zip codes. The reference groups
+are returned as `ReportingNeighbourhoods`, so the checks use them exactly like
+neighbourhood reference groups.
+"""
+
+import csv
+from dataclasses import dataclass
+from heapq import heappush, heapreplace
+from typing import Dict, List, Mapping, Optional, Sequence, Set, Tuple, TypeVar
+
+from .eml_types import ReportingUnitInfo
+from .neighbourhood import ReportingNeighbourhoods, _name_is_non_neighbourhood
+
+CENTROID_COLUMNS = ["zip_code", "x", "y"]
+DEFAULT_NEAREST_REPORTING_UNITS = 10
+
+Point = Tuple[float, ...]
+K = TypeVar("K")
+
+
+class InvalidZipCentroidsException(Exception):
+    pass
+
+
+class KDTree:
+    """Static k-d tree for finding the nearest points to a given point.
+
+    The tree is stored implicitly: every subtree is a contiguous range of `order`,
+    sorted on the axis of its depth, with its root in the middle of the range.
+    """
+
+    def __init__(self, points: Sequence[Point]) -> None:
+        self.points = list(points)
+        self._dimensions = len(self.points[0]) if self.points else 0
+        self._order = list(range(len(self.points)))
+        self._build(0, len(self.points), 0)
+
+    def _build(self, start: int, end: int, depth: int) -> None:
+        if end - start <= 1:
+            return
+        axis = depth % self._dimensions
+        self._order[start:end] = sorted(
+            self._order[start:end], key=lambda index: self.points[index][axis]
+        )
+        middle = (start + end) // 2
+        self._build(start, middle, depth + 1)
+        self._build(middle + 1, end, depth + 1)
+
+    def query(self, point: Point, k: int) -> List[int]:
+        """Find the `k` points closest to the given point.
+
+        Args:
+            point: The point to search around.
+            k: The amount of points to find.
+
+        Returns:
+            The indices of the closest points, ordered by their (euclidean) distance
+                to the given point. Points at the same distance are ordered by index.
+        """
+        # Max-heap of the best candidates so far as (-distance, -index)
+        best: List[Tuple[float, int]] = []
+        if k > 0:
+            self._search(point, k, 0, len(self._order), 0, best)
+        return [-negative_index for _, negative_index in sorted(best, reverse=True)]
+
+    def _search(
+        self,
+        point: Point,
+        k: int,
+        start: int,
+        end: int,
+        depth: int,
+        best: List[Tuple[float, int]],
+    ) -> None:
+        if start >= end:
+            return
+
+        middle = (start + end) // 2
+        index = self._order[middle]
+        node = self.points[index]
+        candidate = (
+            -sum((a - b) * (a - b) for a, b in zip(point, node)),
+            -index,
+        )
+        if len(best) < k:
+            heappush(best, candidate)
+        elif candidate > best[0]:
+            heapreplace(best, candidate)
+
+        axis = depth % self._dimensions
+        difference = point[axis] - node[axis]
+        if difference < 0:
+            near, far = (start, middle), (middle + 1, end)
+        else:
+            near, far = (middle + 1, end), (start, middle)
+
+        self._search(point, k, near[0], near[1], depth + 1, best)
+        # The other side can only contain closer points if the splitting plane is
+        # closer than the worst candidate so far
+        if len(best) < k or difference * difference <= -best[0][0]:
+            self._search(point, k, far[0], far[1], depth + 1, best)
+
+
+@dataclass
+class ZipCentroidData:
+    """Centroids of zip codes, used to construct reference groups of the `k` nearest
+    reporting units instead of neighbourhoods. Can be used in place of
+    `NeighbourhoodData` in `EML.run_protocol`.
+
+    The coordinates are expected in a projected coordinate system in which euclidean
+    distances make sense, such as the Dutch RD New (EPSG:28992) in metres.
+    """
+
+    centroids: Dict[str, Point]
+    k: int = DEFAULT_NEAREST_REPORTING_UNITS
+
+    def fetch_reporting_neighbourhoods(
+        self,
+        reporting_unit_zips: Dict[str, Optional[str]],
+        reporting_unit_info: Dict[str, ReportingUnitInfo],
+        authority_id: Optional[str] = None,
+    ) -> ReportingNeighbourhoods:
+        """Constructs a `ReportingNeighbourhoods` instance in which the 'neighbourhood'
+        of every reporting unit consists of the unit itself and the `k - 1` reporting
+        units nearest to it. Reporting units without a known zip code, and reporting
+        units which are not tied to a location (see `NeighbourhoodData`), do not get
+        a reference group and are not part of the reference groups of others.
+
+        Args:
+            reporting_unit_zips: Mapping from reporting unit id to the associated zip code.
+            reporting_unit_info: Mapping from reporting unit id to the `ReportingUnitInfo`.
+            authority_id: Unused, for compatibility with `NeighbourhoodData`.
+
+        Returns:
+            Instance of `ReportingNeighbourhoods`.
+        """
+        located_ids: List[str] = []
+        points: List[Point] = []
+        for reporting_unit_id, zip_code in reporting_unit_zips.items():
+            centroid = self.centroids.get(zip_code) if zip_code else None
+            if centroid is None or _name_is_non_neighbourhood(
+                reporting_unit_info[reporting_unit_id].reporting_unit_name
+            ):
+                continue
+            located_ids.append(reporting_unit_id)
+            points.append(centroid)
+
+        reporting_unit_id_to_neighbourhood_id: Dict[str, Optional[str]] = dict.fromkeys(
+            reporting_unit_zips
+        )
+        neighbourhood_id_to_reporting_unit_ids: Dict[str, Set[str]] = {}
+        neighbourhood_id_to_reference_group: Dict[str, ReportingUnitInfo] = {}
+        if not located_ids:
+            return ReportingNeighbourhoods(
+                reporting_unit_id_to_neighbourhood_id,
+                neighbourhood_id_to_reporting_unit_ids,
+                neighbourhood_id_to_reference_group,
+            )
+
+        # The votes of every reporting unit as rows of integers in a fixed key order,
+        # so a reference group is summed column by column
+        first_unit = reporting_unit_info[located_ids[0]]
+        parties = list(first_unit.votes_per_party)
+        candidates = list(first_unit.votes_per_candidate)
+        party_rows = []
+        candidate_rows = []
+        for reporting_unit_id in located_ids:
+            reporting_unit = reporting_unit_info[reporting_unit_id]
+            party_rows.append(_vote_row(reporting_unit.votes_per_party, parties))
+            candidate_rows.append(
+                _vote_row(reporting_unit.votes_per_candidate, candidates)
+            )
+
+        tree = KDTree(points)
+        for position, reporting_unit_id in enumerate(located_ids):
+            # The reporting unit itself is always part of its reference group, also
+            # when other reporting units share its zip code
+            nearest = [position] + [
+                other
+                for other in tree.query(points[position], self.k)
+                if other != position
+            ][: self.k - 1]
+
+            group_id = f"nearest:{reporting_unit_id}"
+            reporting_unit_id_to_neighbourhood_id[reporting_unit_id] = group_id
+            neighbourhood_id_to_reporting_unit_ids[group_id] = set(
+                located_ids[other] for other in nearest
+            )
+            neighbourhood_id_to_reference_group[group_id] = ReportingUnitInfo(
+                reporting_unit_id=group_id,
+                reporting_unit_name=f"Reference group for {group_id}",
+                cast=0,
+                total_counted=0,
+                rejected_votes={},
+                uncounted_votes={},
+                votes_per_party=dict(
+                    zip(parties, map(sum, zip(*(party_rows[i] for i in nearest))))
+                ),
+                votes_per_candidate=dict(
+                    zip(
+                        candidates,
+                        map(sum, zip(*(candidate_rows[i] for i in nearest))),
+                    )
+                ),
+            )
+
+        return ReportingNeighbourhoods(
+            reporting_unit_id_to_neighbourhood_id=reporting_unit_id_to_neighbourhood_id,
+            neighbourhood_id_to_reporting_unit_ids=neighbourhood_id_to_reporting_unit_ids,
+            neighbourhood_id_to_reference_group=neighbourhood_id_to_reference_group,
+        )
+
+    @staticmethod
+    def from_path(
+        str_path: Optional[str], k: int = DEFAULT_NEAREST_REPORTING_UNITS
+    ) -> Optional["ZipCentroidData"]:
+        """Construct an instance of `ZipCentroidData` from a .csv file with the columns
+        `zip_code`, `x` and `y`.
+
+        Args:
+            str_path: Path to the .csv file.
+            k: Size of the reference group of each reporting unit.
+
+        Returns:
+            `ZipCentroidData` instance if the file could be read, `None` otherwise.
+        """
+        if str_path is None:
+            return None
+
+        centroids: Dict[str, Point] = {}
+        try:
+            with open(str_path, newline="") as file:
+                reader = csv.reader(file)
+                if next(reader, None) != CENTROID_COLUMNS:
+                    return None
+                for zip_code, x, y in reader:
+                    centroids[zip_code] = (float(x), float(y))
+        except (OSError, ValueError):
+            return None
+
+        return ZipCentroidData(centroids=centroids, k=k)
+
+
+def _vote_row(votes: Mapping[K, int], keys: List[K]) -> List[int]:
+    # Reporting units usually have the same (interned) keys in the same order, in
+    # which case no lookups are needed
+    if list(votes) == keys:
+        return list(votes.values())
+    return list(map(votes.__getitem__, keys))
@@ -1,14 +1,43 @@
+import hashlib
 import re
+from abc import ABC, abstractmethod
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Optional, Set, TypeVar
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
-import polars as pl
+from .eml_types import CandidateIdentifier, PartyIdentifier, ReportingUnitInfo
+from .neighbourhood_index import (
+    INDEX_MAGIC,
+    INDEX_SUFFIX,
+    InvalidIndexException,
+    NeighbourhoodIndex,
+    write_index,
+)
 
-from .eml_types import ReportingUnitInfo
+if TYPE_CHECKING:
+    import polars as pl
 
 T = TypeVar("T")
+NEIGHBOURHOOD_COLUMNS = ["zip_code", "neighbourhood_code", "ambiguous"]
+MUNICIPALITY_COLUMN = "municipality_code"
+# Rows per row group of neighbourhood data written by `hcp build-neighbourhoods`. A
+# municipality has about 1500 zip codes, so it spans one or two row groups.
+ROW_GROUP_SIZE = 4096
+REGEX_NEIGHBOURHOOD_FILE = re.compile(
+    r"^zip_to_neighbourhood_(\d{4})\.(parquet|csv|idx)$", flags=re.ASCII
+)
 REGEX_NON_NEIGHBOURHOOD_NAME = re.compile(
     r"brief|station|mobiel|metro|cabin|tent|tijdelijk", flags=re.IGNORECASE
 )
@@ -20,8 +49,79 @@ def _name_is_non_neighbourhood(name: Optional[str]) -> bool:
     return bool(re.search(REGEX_NON_NEIGHBOURHOOD_NAME, name))
 
 
-def _add_dict(a: Dict[T, int], b: Dict[T, int]) -> Dict[T, int]:
-    return {key_a: a[key_a] + b[key_a] for key_a in a.keys()}
+def _municipality_code(authority_id: Optional[str]) -> Optional[str]:
+    # The authority id of a municipality is its CBS code (e.g. `0363`), which is also
+    # part of its neighbourhood codes (e.g. `WK0363AF`)
+    if authority_id is None or not authority_id.isdigit() or len(authority_id) > 4:
+        return None
+    return authority_id.zfill(4)
+
+
+@dataclass
+class _VoteSum(Generic[T]):
+    # Array-backed running sum of vote dicts. The keys of the first non-empty dict
+    # which is added determine the keys of the sum, after which the totals are
+    # updated in place.
+    keys: List[T] = field(default_factory=list)
+    totals: List[int] = field(default_factory=list)
+
+    def add(self, votes: Mapping[T, int]) -> None:
+        if not self.keys:
+            self.keys = list(votes)
+            self.totals = list(votes.values())
+            return
+
+        totals = self.totals
+        for index, vote in enumerate(map(votes.__getitem__, self.keys)):
+            totals[index] += vote
+
+    def to_dict(self) -> Dict[T, int]:
+        return dict(zip(self.keys, self.totals))
+
+
+def _build_reference_groups(
+    reporting_unit_id_to_neighbourhood_id: Dict[str, Optional[str]],
+    reporting_unit_info: Dict[str, ReportingUnitInfo],
+) -> Dict[str, ReportingUnitInfo]:
+    # Single pass over the reporting units, adding the votes of each unit to the
+    # sums of its neighbourhood
+    sums: Dict[str, Tuple[_VoteSum[PartyIdentifier], _VoteSum[CandidateIdentifier]]]
+    sums = {}
+    for reporting_unit_id, reporting_unit in reporting_unit_info.items():
+        neighbourhood_id = reporting_unit_id_to_neighbourhood_id.get(reporting_unit_id)
+        if not neighbourhood_id:
+            continue
+
+        if neighbourhood_id not in sums:
+            sums[neighbourhood_id] = (_VoteSum(), _VoteSum())
+        party_sum, candidate_sum = sums[neighbourhood_id]
+        party_sum.add(reporting_unit.votes_per_party)
+        candidate_sum.add(reporting_unit.votes_per_candidate)
+
+    return {
+        neighbourhood_id: ReportingUnitInfo(
+            reporting_unit_id=neighbourhood_id,
+            reporting_unit_name=f"Reference group for {neighbourhood_id}",
+            cast=0,
+            total_counted=0,
+            rejected_votes={},
+            uncounted_votes={},
+            votes_per_party=party_sum.to_dict(),
+            votes_per_candidate=candidate_sum.to_dict(),
+        )
+        for neighbourhood_id, (party_sum, candidate_sum) in sums.items()
+    }
+
+
+@dataclass
+class ZipNeighbourhood:
+    """Neighbourhood of a zip code as specified in the neighbourhood data. A zip code
+    is ambiguous if it spans several neighbourhoods, in which case the neighbourhood
+    with the most addresses was selected.
+    """
+
+    neighbourhood_code: str
+    ambiguous: bool
 
 
 @dataclass
@@ -36,6 +136,12 @@ class ReportingNeighbourhoods:
     of all reporting unit vote counts which are in the same
     neighbourhood as the specified reporting unit.
 
+    The neighbourhood codes in the neighbourhood data are CBS district (wijk) codes.
+    The data contains no buurt codes below them and no grouping above them, so the
+    hierarchy of reference groups has two levels instead of buurt -> wijk -> gemeente:
+    a neighbourhood which contains too few reporting units falls back to the
+    municipality (see `get_sufficient_reference_group`).
+
     The following mappings are present:
         - reporting_unit_id_to_neighbourhood_id: used for lookup of neighbourhood
         corresponding to specified reporting unit id.
@@ -84,15 +190,44 @@ class ReportingNeighbourhoods:
             return 0
         return len(self.neighbourhood_id_to_reporting_unit_ids[neighbourhood_id])
 
+    def get_sufficient_reference_group(
+        self, reporting_unit_id: str, minimum_reporting_units: int
+    ) -> Optional[Tuple[ReportingUnitInfo, int]]:
+        """Get the reference group of the neighbourhood of the given reporting unit if
+        it has at least the given amount of reporting units.
 
-@dataclass
-class NeighbourhoodData:
-    """Class containing a **lazy** dataframe containing neighbourhood data.
-    This allows you to call the defined methods on this lazyframe, without
-    having to load in all the neighbourhood data to memory.
-    """
+        Args:
+            reporting_unit_id: The reporting unit id to query for.
+            minimum_reporting_units: The minimum amount of reporting units in the
+                reference group, including the reporting unit itself.
+
+        Returns:
+            The reference group and its amount of reporting units, or `None` if the
+                reporting unit has no neighbourhood or if its neighbourhood is too
+                small. In that case only the municipality can be used as reference,
+                as there is no buurt or intermediate level to fall back to.
+        """
+        neighbourhood_id = self.reporting_unit_id_to_neighbourhood_id[reporting_unit_id]
+        if not neighbourhood_id:
+            return None
+
+        size = len(
+            self.neighbourhood_id_to_reporting_unit_ids.get(neighbourhood_id, ())
+        )
+        if (
+            size < minimum_reporting_units
+            or neighbourhood_id not in self.neighbourhood_id_to_reference_group
+        ):
+            return None
+        return self.neighbourhood_id_to_reference_group[neighbourhood_id], size
 
-    data: pl.LazyFrame
+
+class NeighbourhoodData(ABC):
+    """Base class for neighbourhood data, mapping zip codes to neighbourhood codes.
+    Use `NeighbourhoodData.from_path` to construct the implementation matching a file:
+    `LazyFrameNeighbourhoodData` for .csv and .parquet files, or
+    `IndexedNeighbourhoodData` for index files built with `hcp build-neighbourhoods`.
+    """
 
     def fetch_neighbourhood_code(self, zip_code: str) -> Optional[str]:
         """Given a specified zip_code, return the corresponding neighbourhood
@@ -104,19 +239,39 @@ class NeighbourhoodData:
         Returns:
             The corresponding neighbourhood code (e.g. `WK0363AF`) if the zip code was found
         """
-        queried_result = (
-            self.data.filter(pl.col("zip_code") == zip_code)
-            .select("neighbourhood_code")
-            .collect()
-        )
-        if len(queried_result) != 1:
-            return None
-        return queried_result.item()
+        zip_neighbourhood = self.fetch_neighbourhood_codes([zip_code]).get(zip_code)
+        return zip_neighbourhood.neighbourhood_code if zip_neighbourhood else None
+
+    @abstractmethod
+    def fetch_neighbourhood_codes(
+        self, zip_codes: Iterable[str], municipality_code: Optional[str] = None
+    ) -> Dict[str, ZipNeighbourhood]:
+        """Look up the neighbourhoods of several zip codes at once, using a single query
+        on the neighbourhood data (which is filtered while it is scanned).
+
+        Args:
+            zip_codes: Zip codes to query the data for, without spaces (e.g. `1011AB`)
+            municipality_code: Optional code of the municipality in which the zip codes
+                are expected (e.g. `0363`). If the data has a municipality code column,
+                only the data of this municipality is read, plus the data of other
+                municipalities for zip codes which were not found in it.
+
+        Returns:
+            Mapping from zip code to the corresponding `ZipNeighbourhood`, for the zip
+                codes which occur exactly once in the neighbourhood data. When the
+                lookup is scoped to a municipality, a zip code which occurs once in
+                that municipality and also in other municipalities is intentionally
+                mapped to the neighbourhood in that municipality, as the reporting
+                units of an EML are in its municipality. Without scoping (and in an
+                index, which has no municipality codes) such a zip code is left out
+                like any other duplicate.
+        """
 
     def fetch_reporting_neighbourhoods(
         self,
         reporting_unit_zips: Dict[str, Optional[str]],
         reporting_unit_info: Dict[str, ReportingUnitInfo],
+        authority_id: Optional[str] = None,
     ) -> ReportingNeighbourhoods:
         """Constructs a `ReportingNeighbourhoods` instance for the given
         neighbourhood data. The reference groups are calculated by summing
@@ -127,15 +282,17 @@ class NeighbourhoodData:
         Args:
             reporting_unit_zips: Mapping from reporting unit id to the associated zip code.
             reporting_unit_info: Mapping from reporting unit id to the `ReportingUnitInfo`.
+            authority_id: Optional authority id of the EML (see `EmlMetadata`). If it is
+                a municipality, the zip codes are looked up in its data first.
 
         Returns:
             Instance of `ReportingNeighbourhoods`.
         """
         # Fetch the neighbourhood codes for all unique zips
         zips = set((zip for zip in reporting_unit_zips.values() if zip is not None))
-        zips_to_neighbourhoods = {
-            zip: self.fetch_neighbourhood_code(zip) for zip in zips
-        }
+        zips_to_neighbourhoods = self.fetch_neighbourhood_codes(
+            zips, _municipality_code(authority_id)
+        )
 
         # Construct mapping from reporting unit id to neighbourhood id
         reporting_unit_id_to_neighbourhood_id = {}
@@ -145,8 +302,9 @@ class NeighbourhoodData:
             ):
                 reporting_unit_id_to_neighbourhood_id[reporting_unit_id] = None
             else:
+                zip_neighbourhood = zips_to_neighbourhoods.get(zip)
                 reporting_unit_id_to_neighbourhood_id[reporting_unit_id] = (
-                    zips_to_neighbourhoods[zip]
+                    zip_neighbourhood.neighbourhood_code if zip_neighbourhood else None
                 )
 
         # Construct mapping from neighbourhood id to reporting unit id list
@@ -160,45 +318,14 @@ class NeighbourhoodData:
                     reporting_unit_id
                 )
 
-        # Given the mapping from neighbourhood ids to reporting unit ids, constuct reporting unit objects
-        neighbourhood_id_to_reference_group = {}
-        for (
-            neighbourhood_id,
-            reporting_unit_ids,
-        ) in neighbourhood_id_to_reporting_unit_ids.items():
-
-            # Construct the reference group vote counts by adding dicts of the reporting ids
-            # that belong to this neighbourhood
-            summed_votes_per_party = {}
-            summed_votes_per_candidate = {}
-            for reporting_unit_id, reporting_unit in reporting_unit_info.items():
-                if reporting_unit_id not in reporting_unit_ids:
-                    continue
-
-                if len(summed_votes_per_party) == 0:
-                    summed_votes_per_party = reporting_unit.votes_per_party
-                else:
-                    summed_votes_per_party = _add_dict(
-                        summed_votes_per_party, reporting_unit.votes_per_party
-                    )
-
-                if len(summed_votes_per_candidate) == 0:
-                    summed_votes_per_candidate = reporting_unit.votes_per_candidate
-                else:
-                    summed_votes_per_candidate = _add_dict(
-                        summed_votes_per_candidate, reporting_unit.votes_per_candidate
-                    )
-
-            neighbourhood_id_to_reference_group[neighbourhood_id] = ReportingUnitInfo(
-                reporting_unit_id=neighbourhood_id,
-                reporting_unit_name=f"Reference group for {neighbourhood_id}",
-                cast=0,
-                total_counted=0,
-                rejected_votes={},
-                uncounted_votes={},
-                votes_per_party=summed_votes_per_party,
-                votes_per_candidate=summed_votes_per_candidate,
-            )
+        # Sum up the votes of the reporting units in each neighbourhood
+        reference_groups = _build_reference_groups(
+            reporting_unit_id_to_neighbourhood_id, reporting_unit_info
+        )
+        neighbourhood_id_to_reference_group = {
+            neighbourhood_id: reference_groups[neighbourhood_id]
+            for neighbourhood_id in neighbourhood_id_to_reporting_unit_ids
+        }
 
         return ReportingNeighbourhoods(
             reporting_unit_id_to_neighbourhood_id=reporting_unit_id_to_neighbourhood_id,
@@ -216,8 +343,16 @@ class NeighbourhoodData:
         if str_path is None:
             return None
 
+        path = Path(str_path)
+        if path.suffix == INDEX_SUFFIX:
+            try:
+                return IndexedNeighbourhoodData(index=NeighbourhoodIndex.open(path))
+            except (OSError, InvalidIndexException):
+                return None
+
+        import polars as pl
+
         try:
-            path = Path(str_path)
             data = None
             if path.suffix == ".csv":
                 data = pl.scan_csv(path)
@@ -228,7 +363,257 @@ class NeighbourhoodData:
         except Exception:
             return None
 
-        if data.columns != ["zip_code", "neighbourhood_code", "ambiguous"]:
+        if data.columns not in (
+            NEIGHBOURHOOD_COLUMNS,
+            NEIGHBOURHOOD_COLUMNS + [MUNICIPALITY_COLUMN],
+        ):
             return None
 
-        return NeighbourhoodData(data=data)
+        return LazyFrameNeighbourhoodData(data=data)
+
+
+@dataclass
+class LazyFrameNeighbourhoodData(NeighbourhoodData):
+    """Class containing a **lazy** dataframe containing neighbourhood data.
+    This allows you to call the defined methods on this lazyframe, without
+    having to load in all the neighbourhood data to memory.
+    """
+
+    data: "pl.LazyFrame"
+
+    def fetch_neighbourhood_codes(
+        self, zip_codes: Iterable[str], municipality_code: Optional[str] = None
+    ) -> Dict[str, ZipNeighbourhood]:
+        import polars as pl
+
+        zip_codes = list(set(zip_codes))
+        if municipality_code is None or MUNICIPALITY_COLUMN not in self.data.columns:
+            return self._query(zip_codes)
+
+        # The data is sorted by municipality, so the statistics of the row groups
+        # allow skipping all data of the other municipalities
+        zip_neighbourhoods = self._query(
+            zip_codes, pl.col(MUNICIPALITY_COLUMN) == municipality_code
+        )
+        missing_zip_codes = [
+            zip_code for zip_code in zip_codes if zip_code not in zip_neighbourhoods
+        ]
+        if missing_zip_codes:
+            zip_neighbourhoods.update(self._query(missing_zip_codes))
+
+        return zip_neighbourhoods
+
+    def _query(
+        self, zip_codes: List[str], predicate: Optional["pl.Expr"] = None
+    ) -> Dict[str, ZipNeighbourhood]:
+        import polars as pl
+
+        data = self.data if predicate is None else self.data.filter(predicate)
+        queried_result = (
+            data.filter(pl.col("zip_code").is_in(zip_codes))
+            .select(NEIGHBOURHOOD_COLUMNS)
+            .collect()
+        )
+
+        zip_neighbourhoods: Dict[str, ZipNeighbourhood] = {}
+        duplicate_zips = set()
+        for zip_code, neighbourhood_code, ambiguous in queried_result.iter_rows():
+            if zip_code in zip_neighbourhoods:
+                duplicate_zips.add(zip_code)
+            zip_neighbourhoods[zip_code] = ZipNeighbourhood(
+                neighbourhood_code=neighbourhood_code, ambiguous=ambiguous != "no"
+            )
+
+        for zip_code in duplicate_zips:
+            del zip_neighbourhoods[zip_code]
+
+        return zip_neighbourhoods
+
+    def write_index(self, destination: str) -> int:
+        """Convert the neighbourhood data to an index file, which can be loaded with
+        `NeighbourhoodData.from_path` without reading the full dataset.
+
+        Args:
+            destination: Path of the index file to write, should end with `.idx`.
+
+        Returns:
+            The amount of zip codes in the index.
+        """
+        rows = self.data.select(NEIGHBOURHOOD_COLUMNS).collect().iter_rows()
+        return write_index(
+            (
+                (zip_code, neighbourhood_code, ambiguous != "no")
+                for zip_code, neighbourhood_code, ambiguous in rows
+            ),
+            destination,
+        )
+
+    def write_parquet(self, destination: str) -> int:
+        """Write the neighbourhood data to a .parquet file with a municipality code
+        column, sorted and grouped by municipality. Lookups scoped to a municipality
+        then only read the row groups of that municipality.
+
+        Args:
+            destination: Path of the .parquet file to write.
+
+        Returns:
+            The amount of zip codes in the file.
+        """
+        import polars as pl
+
+        data = (
+            self.data.select(NEIGHBOURHOOD_COLUMNS)
+            .with_columns(
+                pl.col("neighbourhood_code").str.slice(2, 4).alias(MUNICIPALITY_COLUMN)
+            )
+            .sort(MUNICIPALITY_COLUMN, "zip_code")
+            .collect()
+        )
+        data.write_parquet(destination, statistics=True, row_group_size=ROW_GROUP_SIZE)
+        return len(data)
+
+
+@dataclass
+class IndexedNeighbourhoodData(NeighbourhoodData):
+    """Neighbourhood data backed by a memory mapped `NeighbourhoodIndex`, which does
+    not need polars.
+    """
+
+    index: NeighbourhoodIndex
+
+    def fetch_neighbourhood_codes(
+        self, zip_codes: Iterable[str], municipality_code: Optional[str] = None
+    ) -> Dict[str, ZipNeighbourhood]:
+        # Lookups in the index only read the pages of the zip codes themselves, so
+        # scoping them to a municipality is not needed
+        zip_neighbourhoods: Dict[str, ZipNeighbourhood] = {}
+        for zip_code in set(zip_codes):
+            found = self.index.lookup(zip_code)
+            if found is not None:
+                zip_neighbourhoods[zip_code] = ZipNeighbourhood(
+                    neighbourhood_code=found[0], ambiguous=found[1]
+                )
+        return zip_neighbourhoods
+
+
+def cached_index(source: Path, directory: Path) -> Path:
+    """Get an index file for a .csv or .parquet neighbourhood file from a cache
+    directory, building it on first use. Falls back to the source itself if the index
+    can not be built.
+
+    Args:
+        source: Path to the .csv or .parquet neighbourhood file.
+        directory: Directory in which the index files are stored.
+
+    Returns:
+        Path to the index file, or `source` if no index is available.
+    """
+    try:
+        digest = hashlib.sha256(INDEX_MAGIC + source.read_bytes()).hexdigest()
+    except OSError:
+        return source
+    index_path = directory / f"{source.stem}-{digest[:16]}{INDEX_SUFFIX}"
+    if index_path.exists():
+        return index_path
+
+    data = NeighbourhoodData.from_path(str(source))
+    if not isinstance(data, LazyFrameNeighbourhoodData):
+        return source
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        data.write_index(str(index_path))
+    except OSError:
+        return source
+
+    return index_path
+
+
+@dataclass
+class NeighbourhoodRegistry:
+    """The available neighbourhood datasets per year, from which the dataset for an
+    election is selected. Datasets are loaded on first use and kept open, so several
+    EMLs of the same election do not load the same dataset again.
+    """
+
+    paths: Dict[int, Path]
+    # If specified, the datasets are loaded as (cached) index files in this directory
+    index_directory: Optional[Path] = None
+    _loaded: Dict[int, Optional[NeighbourhoodData]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+
+    @staticmethod
+    def from_directory(
+        directory: Path, index_directory: Optional[Path] = None
+    ) -> "NeighbourhoodRegistry":
+        """Construct a `NeighbourhoodRegistry` of the datasets in a directory, which are
+        named `zip_to_neighbourhood_<year>` (with a .parquet, .csv or .idx suffix).
+
+        Args:
+            directory: Directory containing the datasets.
+            index_directory: Optional directory in which the .parquet and .csv
+                datasets are converted to index files (see `cached_index`).
+
+        Returns:
+            `NeighbourhoodRegistry` instance, which is empty if the directory does not
+                exist or contains no datasets.
+        """
+        paths: Dict[int, Path] = {}
+        if directory.is_dir():
+            for path in sorted(directory.iterdir()):
+                match = REGEX_NEIGHBOURHOOD_FILE.match(path.name)
+                if match and int(match[1]) not in paths:
+                    paths[int(match[1])] = path
+        return NeighbourhoodRegistry(paths=paths, index_directory=index_directory)
+
+    def select_year(self, election_date: Optional[str]) -> Optional[int]:
+        """Select the dataset year for an election: the most recent dataset which is
+        not newer than the election. Elections before the oldest dataset use the
+        oldest dataset, and elections without a (valid) date the most recent one.
+
+        Args:
+            election_date: Date of the election as in `EmlMetadata` (e.g. `2023-11-22`).
+
+        Returns:
+            The selected year, or `None` if there are no datasets.
+        """
+        if not self.paths:
+            return None
+
+        years = sorted(self.paths)
+        match = re.match(r"^(\d{4})-", election_date or "")
+        if match is None:
+            return years[-1]
+        election_year = int(match[1])
+        return max((year for year in years if year <= election_year), default=years[0])
+
+    def for_election_date(
+        self, election_date: Optional[str]
+    ) -> Optional[NeighbourhoodData]:
+        """Get the neighbourhood data for an election, see `select_year`.
+
+        Args:
+            election_date: Date of the election as in `EmlMetadata` (e.g. `2023-11-22`).
+
+        Returns:
+            `NeighbourhoodData` instance, or `None` if there are no datasets or the
+                selected dataset could not be loaded.
+        """
+        year = self.select_year(election_date)
+        if year is None:
+            return None
+        return self._load(year)
+
+    def preload(self) -> None:
+        """Load all datasets, e.g. before processing several EMLs. Index files are
+        memory mapped, so they are shared with worker processes."""
+        for year in self.paths:
+            self._load(year)
+
+    def _load(self, year: int) -> Optional[NeighbourhoodData]:
+        if year not in self._loaded:
+            path = self.paths[year]
+            if self.index_directory is not None and path.suffix != INDEX_SUFFIX:
+                path = cached_index(path, self.index_directory)
+            self._loaded[year] = NeighbourhoodData.from_path(str(path))
+        return self._loaded[year]
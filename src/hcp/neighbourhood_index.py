@@ -0,0 +1,185 @@
+"""Compact, memory-mappable index from zip code to neighbourhood code.
+
+The index is a single binary file which can be searched directly on a memory map, so
+looking up the neighbourhoods of a few hundred zip codes does not require loading (or
+even importing polars for) the full neighbourhood dataset. Indexes are built from the
+CBS neighbourhood data with `hcp build-neighbourhoods`.
+
+Layout (all integers unsigned 32 bit little endian):
+    - header: magic, amount of zip codes, amount of neighbourhood codes, code width
+    - zip keys: sorted, see `zip_key`
+    - values: per zip key the index of its neighbourhood code, shifted left by one,
+      with the lowest bit set if the zip code is ambiguous
+    - code table: the neighbourhood codes, each padded with null bytes to code width
+"""
+
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence, Tuple, Union
+
+INDEX_MAGIC = b"HCPNBH\x00\x01"
+INDEX_SUFFIX = ".idx"
+_HEADER = struct.Struct("<8sIII")
+_ZIP_REGEX = re.compile(r"^(\d{4})([A-Z])([A-Z])$", flags=re.ASCII)
+
+
+class InvalidIndexException(Exception):
+    pass
+
+
+def zip_key(zip_code: str) -> Optional[int]:
+    """Pack a zip code into an integer which sorts the same as the zip code itself.
+
+    Args:
+        zip_code: Zip code without spaces (e.g. `1011AB`).
+
+    Returns:
+        The key of the zip code, or `None` if it is not a valid Dutch zip code.
+    """
+    match = _ZIP_REGEX.match(zip_code)
+    if match is None:
+        return None
+    digits, first_letter, second_letter = match.groups()
+    return int(digits) * 676 + (ord(first_letter) - 65) * 26 + ord(second_letter) - 65
+
+
+def write_index(
+    rows: Iterable[Tuple[str, str, bool]], destination: Union[str, Path]
+) -> int:
+    """Write a neighbourhood index file.
+
+    Args:
+        rows: Tuples of zip code, neighbourhood code and whether the zip code is
+            ambiguous. Zip codes which occur more than once are left out, as they
+            can not be resolved to a single neighbourhood.
+        destination: Path of the index file to write.
+
+    Returns:
+        The amount of zip codes in the index.
+    """
+    entries: Dict[int, Tuple[str, bool]] = {}
+    duplicate_keys = set()
+    for zip_code, neighbourhood_code, ambiguous in rows:
+        key = zip_key(zip_code)
+        if key is None:
+            continue
+        if key in entries:
+            duplicate_keys.add(key)
+        entries[key] = (neighbourhood_code, ambiguous)
+    for key in duplicate_keys:
+        del entries[key]
+
+    codes = sorted(set(code for code, _ in entries.values()))
+    code_indices = {code: index for index, code in enumerate(codes)}
+    encoded_codes = [code.encode() for code in codes]
+    code_width = max((len(code) for code in encoded_codes), default=0)
+
+    keys = array("I", sorted(entries))
+    values = array("I")
+    for key in keys:
+        code, ambiguous = entries[key]
+        values.append(code_indices[code] << 1 | ambiguous)
+    if sys.byteorder == "big":
+        keys.byteswap()
+        values.byteswap()
+
+    destination = Path(destination)
+    temporary_path = destination.with_suffix(f".{os.getpid()}.tmp")
+    with open(temporary_path, "wb") as file:
+        file.write(_HEADER.pack(INDEX_MAGIC, len(keys), len(codes), code_width))
+        file.write(keys.tobytes())
+        file.write(values.tobytes())
+        file.write(b"".join(code.ljust(code_width, b"\x00") for code in encoded_codes))
+    # Atomic, so concurrent runs never read a partially written index
+    os.replace(temporary_path, destination)
+
+    return len(keys)
+
+
+class NeighbourhoodIndex:
+    """Read-only view on a neighbourhood index file, which is searched with a binary
+    search directly on the memory mapped file."""
+
+    def __init__(self, buffer: Union[bytes, mmap.mmap]) -> None:
+        if len(buffer) < _HEADER.size:
+            raise InvalidIndexException("Neighbourhood index is too small")
+        magic, zip_amount, code_amount, code_width = _HEADER.unpack_from(buffer)
+        if magic != INDEX_MAGIC:
+            raise InvalidIndexException("Not a neighbourhood index")
+
+        keys_offset = _HEADER.size
+        values_offset = keys_offset + 4 * zip_amount
+        codes_offset = values_offset + 4 * zip_amount
+        if len(buffer) != codes_offset + code_amount * code_width:
+            raise InvalidIndexException("Neighbourhood index is truncated")
+
+        self._buffer = buffer
+        self._keys = _uint32_view(buffer, keys_offset, zip_amount)
+        self._values = _uint32_view(buffer, values_offset, zip_amount)
+        self._codes = memoryview(buffer)[codes_offset:]
+        self._code_width = code_width
+
+    @staticmethod
+    def open(path: Union[str, Path]) -> "NeighbourhoodIndex":
+        """Memory map a neighbourhood index file.
+
+        Args:
+            path: Path to the index file.
+
+        Raises:
+            InvalidIndexException: when the file is not a valid index.
+
+        Returns:
+            `NeighbourhoodIndex` instance.
+        """
+        with open(path, "rb") as file:
+            try:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as error:
+                # Empty files can not be mapped
+                raise InvalidIndexException(str(error)) from error
+        return NeighbourhoodIndex(buffer)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def lookup(self, zip_code: str) -> Optional[Tuple[str, bool]]:
+        """Look up the neighbourhood of a zip code.
+
+        Args:
+            zip_code: Zip code without spaces (e.g. `1011AB`).
+
+        Returns:
+            Tuple of the neighbourhood code and whether the zip code is ambiguous, or
+                `None` if the zip code is not in the index.
+        """
+        key = zip_key(zip_code)
+        if key is None:
+            return None
+        position = bisect_left(self._keys, key)
+        if position == len(self._keys) or self._keys[position] != key:
+            return None
+
+        value = self._values[position]
+        start = (value >> 1) * self._code_width
+        code = bytes(self._codes[start : start + self._code_width]).rstrip(b"\x00")
+        return code.decode(), bool(value & 1)
+
+
+def _uint32_view(
+    buffer: Union[bytes, mmap.mmap], offset: int, amount: int
+) -> Sequence[int]:
+    data = memoryview(buffer)[offset : offset + 4 * amount]
+    if sys.byteorder == "little":
+        return data.cast("I")
+    # The index is little endian, so a copy is needed on big endian machines
+    values = array("I")
+    values.frombytes(data)
+    values.byteswap()
+    return values
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from enum import Enum, auto
-from typing import List, Optional
+from typing import IO, List, Optional, Union
 from xml.etree.ElementTree import Element as XmlElement
 from zipfile import ZipFile
 
@@ -48,14 +48,34 @@ class ODT:
         if not odt_path:
             return None
 
+        return ODT._from_source(odt_path, odt_path)
+
+    @staticmethod
+    def from_file(odt_file: IO[bytes], file_name: str) -> Optional["ODT"]:
+        """Constructs an `ODT` instance from a binary stream, such as a member of a
+        .zip file opened with `ZipFile.open`, without writing it to disk.
+
+        Args:
+            odt_file: Seekable binary stream of the .odt file.
+            file_name: Name of the .odt file, which determines the type of PV.
+
+        Returns:
+            ODT class instance with all needed fields set for running methods.
+        """
+        return ODT._from_source(odt_file, file_name)
+
+    @staticmethod
+    def _from_source(
+        odt_source: Union[str, IO[bytes]], file_name: str
+    ) -> Optional["ODT"]:
         try:
-            if "Model_Na31-1.odt" in odt_path:
+            if "Model_Na31-1.odt" in file_name:
                 return ODT(
-                    type=ODT_TYPE.na31_1, odt_xml=_extract_odt_xml_root(odt_path)
+                    type=ODT_TYPE.na31_1, odt_xml=_extract_odt_xml_root(odt_source)
                 )
-            elif "Model_Na31-2.odt" in odt_path:
+            elif "Model_Na31-2.odt" in file_name:
                 return ODT(
-                    type=ODT_TYPE.na31_2, odt_xml=_extract_odt_xml_root(odt_path)
+                    type=ODT_TYPE.na31_2, odt_xml=_extract_odt_xml_root(odt_source)
                 )
         except Exception:
             return None
@@ -0,0 +1,159 @@
+"""Machine-readable output of all check results as a single .parquet file.
+
+Every row is a reporting unit and every `CheckResult` field is a typed column, so the
+results of many municipalities can be aggregated without parsing the formatted
+values of the .csv files. The party difference percentages and the potentially
+switched candidates are stored as lists of structs.
+"""
+
+from typing import Any, Dict, Iterable, List, Tuple
+
+import polars as pl
+
+from .eml_types import (
+    CheckResult,
+    EmlMetadata,
+    SwitchedCandidate,
+    VoteDifferenceAmount,
+    VoteDifferencePercentage,
+)
+
+PARTY_DIFFERENCE_SCHEMA = pl.Struct(
+    {
+        "party_id": pl.Int64,
+        "party_name": pl.Utf8,
+        "percentage": pl.Float64,
+    }
+)
+SWITCHED_CANDIDATE_SCHEMA = pl.Struct(
+    {
+        "party_id": pl.Int64,
+        "party_name": pl.Utf8,
+        "candidate_with_fewer": pl.Int64,
+        "candidate_with_fewer_received": pl.Int64,
+        "candidate_with_fewer_expected": pl.Int64,
+        "candidate_with_more": pl.Int64,
+        "candidate_with_more_received": pl.Int64,
+        "candidate_with_more_expected": pl.Int64,
+    }
+)
+CHECK_RESULT_SCHEMA = {
+    "election_id": pl.Utf8,
+    "contest_identifier": pl.Utf8,
+    "authority_id": pl.Utf8,
+    "authority_name": pl.Utf8,
+    "reporting_unit_id": pl.Utf8,
+    "reporting_unit_name": pl.Utf8,
+    "zero_votes": pl.Boolean,
+    "inexplicable_difference": pl.Int64,
+    "explanation_sum_difference": pl.Int64,
+    "high_invalid_vote_percentage": pl.Float64,
+    "high_blank_vote_percentage": pl.Float64,
+    "high_vote_difference_amount": pl.Int64,
+    "high_vote_difference_percentage": pl.Float64,
+    "parties_with_high_difference_percentage": pl.List(pl.Utf8),
+    "party_difference_percentages": pl.List(PARTY_DIFFERENCE_SCHEMA),
+    "potentially_switched_candidates": pl.List(SWITCHED_CANDIDATE_SCHEMA),
+    "already_recounted": pl.Boolean,
+}
+
+
+def check_results_to_frame(
+    check_results: Iterable[Tuple[str, CheckResult]], eml_metadata: EmlMetadata
+) -> pl.DataFrame:
+    """Convert check results to a `pl.DataFrame` with a row per reporting unit, see
+    `CHECK_RESULT_SCHEMA` for the columns.
+
+    Args:
+        check_results: Pairs of reporting unit id and `CheckResult`.
+        eml_metadata: Metadata of the EML the results are computed for.
+
+    Returns:
+        The check results as a `pl.DataFrame`.
+    """
+    columns: Dict[str, List[Any]] = {name: [] for name in CHECK_RESULT_SCHEMA}
+    for id, results in check_results:
+        high_vote_difference = results.high_vote_difference
+        row = {
+            "election_id": eml_metadata.election_id,
+            "contest_identifier": eml_metadata.contest_identifier,
+            "authority_id": eml_metadata.authority_id,
+            "authority_name": eml_metadata.authority_name,
+            "reporting_unit_id": id,
+            "reporting_unit_name": eml_metadata.reporting_unit_names.get(id),
+            "zero_votes": results.zero_votes,
+            "inexplicable_difference": results.inexplicable_difference,
+            "explanation_sum_difference": results.explanation_sum_difference,
+            "high_invalid_vote_percentage": results.high_invalid_vote_percentage,
+            "high_blank_vote_percentage": results.high_blank_vote_percentage,
+            "high_vote_difference_amount": (
+                high_vote_difference.value
+                if isinstance(high_vote_difference, VoteDifferenceAmount)
+                else None
+            ),
+            "high_vote_difference_percentage": (
+                high_vote_difference.value
+                if isinstance(high_vote_difference, VoteDifferencePercentage)
+                else None
+            ),
+            "parties_with_high_difference_percentage": list(
+                results.parties_with_high_difference_percentage
+            ),
+            # Ordered like the party columns of output file c
+            "party_difference_percentages": [
+                {
+                    "party_id": party.id,
+                    "party_name": party.name,
+                    "percentage": float(percentage),
+                }
+                for party, percentage in sorted(
+                    results.party_difference_percentages.items()
+                )
+            ],
+            "potentially_switched_candidates": [
+                _switched_candidate_row(switched_candidate)
+                for switched_candidate in results.potentially_switched_candidates
+            ],
+            "already_recounted": results.already_recounted,
+        }
+        for name, value in row.items():
+            columns[name].append(value)
+
+    return pl.DataFrame(
+        [
+            pl.Series(name, values, dtype=CHECK_RESULT_SCHEMA[name])
+            for name, values in columns.items()
+        ]
+    )
+
+
+def write_parquet(
+    check_results: Iterable[Tuple[str, CheckResult]],
+    eml_metadata: EmlMetadata,
+    parquet_destination,
+) -> None:
+    """Write all check results to a single .parquet file, see `check_results_to_frame`.
+
+    Args:
+        check_results: Pairs of reporting unit id and `CheckResult`.
+        eml_metadata: Metadata of the EML the results are computed for.
+        parquet_destination: Path to write the .parquet file to.
+    """
+    check_results_to_frame(check_results, eml_metadata).write_parquet(
+        parquet_destination
+    )
+
+
+def _switched_candidate_row(switched_candidate: SwitchedCandidate) -> Dict[str, Any]:
+    # Both candidates are always on the same list
+    party = switched_candidate.candidate_with_more.party
+    return {
+        "party_id": party.id,
+        "party_name": party.name,
+        "candidate_with_fewer": switched_candidate.candidate_with_fewer.cand_id,
+        "candidate_with_fewer_received": switched_candidate.candidate_with_fewer_received,
+        "candidate_with_fewer_expected": switched_candidate.candidate_with_fewer_expected,
+        "candidate_with_more": switched_candidate.candidate_with_more.cand_id,
+        "candidate_with_more_received": switched_candidate.candidate_with_more_received,
+        "candidate_with_more_expected": switched_candidate.candidate_with_more_expected,
+    }
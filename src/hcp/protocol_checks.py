@@ -1,8 +1,8 @@
-from itertools import product as cartesian_product
-from typing import Dict, List, Literal, Optional, TypeVar
+from typing import TYPE_CHECKING, Dict, List, Literal, Optional
 
 from .eml_types import (
     CandidateIdentifier,
+    MainUnitComplement,
     PartyIdentifier,
     ReportingUnitInfo,
     SwitchedCandidate,
@@ -11,10 +11,9 @@ from .eml_types import (
     VoteDifferenceAmount,
     VoteDifferencePercentage,
 )
-from .neighbourhood import ReportingNeighbourhoods
 
-T = TypeVar("T")
-N = TypeVar("N", int, float)
+if TYPE_CHECKING:
+    from .neighbourhood import ReportingNeighbourhoods
 
 
 def check_zero_votes(reporting_unit: ReportingUnitInfo) -> bool:
@@ -143,8 +142,36 @@ def check_too_many_differences(
     return None
 
 
-def get_party_difference_percentages(
+def get_main_unit_complement(
     main_unit: ReportingUnitInfo, reporting_unit: ReportingUnitInfo
+) -> MainUnitComplement:
+    """Gets the totals of the main unit without the given reporting unit, which the
+    party difference and switched candidate checks compare the reporting unit with.
+    Computing this once per reporting unit and passing it to both checks saves them
+    from each deriving it again.
+
+    Args:
+        main_unit: The main unit, usually the municipality total.
+        reporting_unit: The reporting unit to leave out.
+
+    Returns:
+        The total counted votes and the votes per party of the main unit without the
+            reporting unit.
+    """
+    main_votes_per_party = main_unit.votes_per_party
+    return MainUnitComplement(
+        total_counted=main_unit.total_counted - reporting_unit.total_counted,
+        votes_per_party={
+            party: main_votes_per_party[party] - votes
+            for party, votes in reporting_unit.votes_per_party.items()
+        },
+    )
+
+
+def get_party_difference_percentages(
+    main_unit: ReportingUnitInfo,
+    reporting_unit: ReportingUnitInfo,
+    complement: Optional[MainUnitComplement] = None,
 ) -> Dict[PartyIdentifier, float]:
     """Gets the party difference percentages for a given reporting unit. This is calculated
     as the difference in percentage **points**. This means that if a party has 30% of the votes
@@ -156,19 +183,27 @@ def get_party_difference_percentages(
     Args:
         main_unit: The main unit to check against. This is usually the municipality total.
         reporting_unit: The reporting unit to check.
+        complement: The main unit without the reporting unit, if this has already been
+            computed with `get_main_unit_complement`.
 
     Returns:
         A dictionary mapping party identifiers to the percentage point difference.
     """
-    global_total = main_unit.total_counted - reporting_unit.total_counted
-    global_party = _subtract_part_dictionary(
-        main_unit.votes_per_party, reporting_unit.votes_per_party
-    )
-    global_percentages = _get_percentages(global_party, global_total)
-    local_percentages = _get_percentages(
-        reporting_unit.votes_per_party, reporting_unit.total_counted
-    )
-    difference = _subtract_part_dictionary(local_percentages, global_percentages)
+    if complement is None:
+        complement = get_main_unit_complement(main_unit, reporting_unit)
+    local_total = reporting_unit.total_counted
+    global_total = complement.total_counted
+    global_votes_per_party = complement.votes_per_party
+
+    # Percentages are derived per party in a single pass, an integer 0 is used when
+    # dividing by zero
+    difference: Dict[PartyIdentifier, float] = {}
+    for party, local_votes in reporting_unit.votes_per_party.items():
+        local_percentage = local_votes / local_total * 100 if local_total else 0
+        global_percentage = (
+            global_votes_per_party[party] / global_total * 100 if global_total else 0
+        )
+        difference[party] = local_percentage - global_percentage
 
     return difference
 
@@ -177,6 +212,7 @@ def check_parties_with_large_percentage_difference(
     main_unit: ReportingUnitInfo,
     reporting_unit: ReportingUnitInfo,
     threshold_pct: float,
+    differences: Optional[Dict[PartyIdentifier, float]] = None,
 ) -> List[str]:
     """Checks which parties have a percentage point difference compared to the main
     unit which exceeds the threshold value. Note that the vote count of the reporting
@@ -187,12 +223,34 @@ def check_parties_with_large_percentage_difference(
         main_unit: The main unit to check against. This is usually the municipality total.
         reporting_unit: The reporting unit to check.
         threshold_pct: The threshold percentage to check against.
+        differences: The party difference percentages of the reporting unit, if these
+            have already been computed with `get_party_difference_percentages`.
 
     Returns:
         A list of names of the parties which exceed this threshold, along with the given percentage.
             For example: `"VVD (51.0%)"`
     """
-    differences = get_party_difference_percentages(main_unit, reporting_unit)
+    if differences is None:
+        differences = get_party_difference_percentages(main_unit, reporting_unit)
+    return format_party_differences(differences, threshold_pct)
+
+
+def format_party_differences(
+    differences: Dict[PartyIdentifier, float], threshold_pct: float
+) -> List[str]:
+    """Formats the parties whose percentage point difference exceeds the threshold, as
+    reported by `check_parties_with_large_percentage_difference`. Shared with the
+    vectorised checks (see `vectorised_checks`), so both give the same output.
+
+    Args:
+        differences: The party difference percentages of a reporting unit, see
+            `get_party_difference_percentages`.
+        threshold_pct: The threshold percentage to check against.
+
+    Returns:
+        A sorted list of names of the parties which exceed this threshold, along with
+            the given percentage. For example: `"VVD (51.0%)"`
+    """
     return sorted(
         [
             (
@@ -211,8 +269,9 @@ def check_potentially_switched_candidates(
     main_unit: ReportingUnitInfo,
     polling_station: ReportingUnitInfo,
     reporting_unit_amount: int,
-    reporting_neighbourhoods: Optional[ReportingNeighbourhoods],
+    reporting_neighbourhoods: Optional["ReportingNeighbourhoods"],
     config: SwitchedCandidateConfig,
+    complement: Optional[MainUnitComplement] = None,
 ) -> List[SwitchedCandidate]:
     """Checks if there are potential switched candidates in the given reporting unit.
     Usually called from within an instance of EML, but can also be called without.
@@ -235,7 +294,9 @@ def check_potentially_switched_candidates(
         both candidates got either more received or expected votes than
         `config.minimum_votes` we consider this pair of candidates as a potential switch.
         - Additionally, the reference group (municipality or neighbourhood) should contain
-        at least the amount of reporting units as specified in the config.
+        at least the amount of reporting units as specified in the config. If the
+        neighbourhood of the polling station is too small, only the municipality is
+        checked.
 
     Args:
         polling_station_id: The id of the polling station to check. Needed for potential neighbourhood lookup.
@@ -246,12 +307,16 @@ def check_potentially_switched_candidates(
         reporting_neighbourhoods: A `ReportingNeighbourhoods` instance if we also want to check at neighbourhood level.
             Can be constructed from `NeighbourhoodData`.
         config: Config parameters like the deviation factor and the minimum amount of reporting units required for the check.
+        complement: The main unit without the polling station, if this has already been
+            computed with `get_main_unit_complement`.
 
     Returns:
         A list of potentially switched pairs of candidates. Can be empty if none are found.
     """
-    neighbourhood_reference_group = (
-        (reporting_neighbourhoods.get_reference_group(polling_station_id))
+    neighbourhood_reference = (
+        reporting_neighbourhoods.get_sufficient_reference_group(
+            polling_station_id, config.minimum_reporting_units_neighbourhood
+        )
         if reporting_neighbourhoods
         else None
     )
@@ -263,20 +328,19 @@ def check_potentially_switched_candidates(
         minimum_reporting_units=config.minimum_reporting_units_municipality,
         minimum_deviation_factor=config.minimum_deviation_factor,
         minimum_votes=config.minimum_votes,
+        complement=complement,
     )
 
     potentially_switched_neighbourhood_candidates = (
         _get_potentially_switched_candidates(
-            neighbourhood_reference_group,
+            neighbourhood_reference[0],
             polling_station,
-            amount_of_reporting_units=reporting_neighbourhoods.get_reference_size(
-                polling_station_id
-            ),
+            amount_of_reporting_units=neighbourhood_reference[1],
             minimum_reporting_units=config.minimum_reporting_units_neighbourhood,
             minimum_deviation_factor=config.minimum_deviation_factor,
             minimum_votes=config.minimum_votes,
         )
-        if neighbourhood_reference_group and reporting_neighbourhoods
+        if neighbourhood_reference
         else None
     )
 
@@ -312,23 +376,6 @@ def _percentage(part: int, total: int) -> Optional[float]:
         return None
 
 
-def _get_percentages(dictionary: Dict[T, int], total: int) -> Dict[T, float]:
-    return_dict = {}
-    for key in dictionary.keys():
-        try:
-            return_dict[key] = dictionary[key] / total * 100
-        except ZeroDivisionError:
-            return_dict[key] = 0
-
-    return return_dict
-
-
-def _subtract_part_dictionary(
-    total: Dict[T, N], part_dictionary: Dict[T, N]
-) -> Dict[T, N]:
-    return {key: total[key] - part_dictionary[key] for key in part_dictionary.keys()}
-
-
 def _get_potentially_switched_candidates(
     main_unit: ReportingUnitInfo,
     reporting_unit: ReportingUnitInfo,
@@ -336,16 +383,20 @@ def _get_potentially_switched_candidates(
     minimum_reporting_units: int,
     minimum_deviation_factor: int,
     minimum_votes: int,
+    complement: Optional[MainUnitComplement] = None,
 ) -> List[SwitchedCandidate]:
     # Not enough reporting units to do a good check
     if amount_of_reporting_units < minimum_reporting_units:
         return []
 
     received_votes = reporting_unit.votes_per_candidate
-    expected_votes = _get_expected_candidate_votes(main_unit, reporting_unit)
+    expected_votes = _get_expected_candidate_votes(
+        main_unit, reporting_unit, complement
+    )
 
     cands_with_more_votes: List[CandidateIdentifier] = []
-    cands_with_less_votes: List[CandidateIdentifier] = []
+    # Candidates can only be switched within a party, so these are grouped per party
+    cands_with_less_votes: Dict[PartyIdentifier, List[CandidateIdentifier]] = {}
 
     for cand_id in received_votes.keys():
         if received_votes[cand_id] >= minimum_votes and (
@@ -361,14 +412,14 @@ def _get_potentially_switched_candidates(
             and received_votes[cand_id] / expected_votes[cand_id]
             <= 1 / minimum_deviation_factor
         ):
-            cands_with_less_votes.append(cand_id)
+            cands_with_less_votes.setdefault(cand_id.party, []).append(cand_id)
 
     result: List[SwitchedCandidate] = []
 
-    for cand_with_more, cand_with_less in cartesian_product(
-        cands_with_more_votes, cands_with_less_votes
-    ):
-        if cand_with_more.party == cand_with_less.party:
+    # Same order as pairing every candidate with more votes with every candidate with
+    # less votes of the same party
+    for cand_with_more in cands_with_more_votes:
+        for cand_with_less in cands_with_less_votes.get(cand_with_more.party, []):
             result.append(
                 SwitchedCandidate(
                     candidate_with_fewer=cand_with_less,
@@ -384,32 +435,29 @@ def _get_potentially_switched_candidates(
 
 
 def _get_expected_candidate_votes(
-    main_unit: ReportingUnitInfo, reporting_unit: ReportingUnitInfo
+    main_unit: ReportingUnitInfo,
+    reporting_unit: ReportingUnitInfo,
+    complement: Optional[MainUnitComplement] = None,
 ) -> Dict[CandidateIdentifier, float]:
-    party_votes_without_current = _subtract_part_dictionary(
-        main_unit.votes_per_party, reporting_unit.votes_per_party
-    )
-    cand_votes_without_current = _subtract_part_dictionary(
-        main_unit.votes_per_candidate, reporting_unit.votes_per_candidate
-    )
-    cand_ratios = _get_candidate_ratios(
-        party_votes_without_current, cand_votes_without_current
-    )
-
-    return {
-        cand_id: ratio * reporting_unit.votes_per_party[cand_id.party]
-        for cand_id, ratio in cand_ratios.items()
-    }
-
+    # The share of each candidate within its party in the main unit without the
+    # current reporting unit, applied to the party votes in the reporting unit
+    if complement is None:
+        complement = get_main_unit_complement(main_unit, reporting_unit)
+    party_votes_without_current = complement.votes_per_party
+    main_votes_per_candidate = main_unit.votes_per_candidate
+    votes_per_party = reporting_unit.votes_per_party
+
+    expected_votes: Dict[CandidateIdentifier, float] = {}
+    for cand_id, votes in reporting_unit.votes_per_candidate.items():
+        cand_votes_without_current = main_votes_per_candidate[cand_id] - votes
+        ratio = (
+            cand_votes_without_current / party_votes_without_current[cand_id.party]
+            if cand_votes_without_current > 0
+            else 0
+        )
+        expected_votes[cand_id] = ratio * votes_per_party[cand_id.party]
 
-def _get_candidate_ratios(
-    party_votes: Dict[PartyIdentifier, int],
-    candidate_votes: Dict[CandidateIdentifier, int],
-) -> Dict[CandidateIdentifier, float]:
-    return {
-        cand_id: votes / party_votes[cand_id.party] if votes > 0 else 0
-        for cand_id, votes in candidate_votes.items()
-    }
+    return expected_votes
 
 
 def _get_switched_candidate_combination(
@@ -0,0 +1,210 @@
+"""Long-running local HTTP service which runs HCP on uploaded .zip files.
+
+Starting HCP for every upload spends most of its time on starting the interpreter,
+importing modules and loading the neighbourhood data. The service does this once and
+keeps the neighbourhood data, the cache of parsed .eml.xml files and all modules
+loaded between requests, so the time per request is spent on parsing and checking.
+
+Endpoints:
+    - `POST /run`: the body is a .zip file as output by OSV-2020U. Responds with a .zip
+      file containing `a.csv`, `b.csv` and `c.csv`.
+    - `GET /health`: responds with `ok` once the service is ready.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import IO, TYPE_CHECKING, Optional, Union
+from zipfile import ZIP_DEFLATED, BadZipFile, ZipFile
+
+from defusedxml import DefusedXmlException
+from defusedxml.ElementTree import ParseError
+
+from .eml_cache import EmlCache
+from .eml_types import InvalidEmlException
+from .ingest import InvalidZipException, open_election_result_zip
+from .main import create_csv_buffers
+
+if TYPE_CHECKING:
+    from .nearest_reporting_units import ZipCentroidData
+    from .neighbourhood import NeighbourhoodData, NeighbourhoodRegistry
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+MAX_UPLOAD_SIZE = 512 * 1024 * 1024
+# Response header with the time spent on running HCP (including waiting for other
+# requests to finish), excluding the transfer
+DURATION_HEADER = "X-HCP-Seconds"
+
+
+@dataclass
+class HcpService:
+    """The state which is kept between requests, see `create_csv_files` for the
+    neighbourhood options."""
+
+    cache: Optional[EmlCache] = None
+    neighbourhood_data: Optional[Union["NeighbourhoodData", "ZipCentroidData"]] = None
+    neighbourhood_registry: Optional["NeighbourhoodRegistry"] = None
+    # Running HCP is CPU bound, so concurrent runs in threads only contend for the GIL
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def warm_up(self) -> None:
+        """Load everything which is needed to handle a request, so the first request
+        is as fast as the ones after it."""
+        if self.neighbourhood_registry is not None:
+            self.neighbourhood_registry.preload()
+
+    def run(self, zip_file: IO[bytes]) -> bytes:
+        """Run HCP on a .zip file as output by OSV-2020U.
+
+        Args:
+            zip_file: Seekable binary stream of the .zip file.
+
+        Raises:
+            InvalidZipException: when the .zip file does not contain the expected files.
+            InvalidEmlException: when the .eml.xml file is of incorrect type.
+            ParseError: when the .eml.xml file is not valid XML.
+            DefusedXmlException: when the .eml.xml file contains forbidden XML
+                constructs, such as entity declarations.
+
+        Returns:
+            A .zip file containing output files `a.csv`, `b.csv` and `c.csv`.
+        """
+        with self._lock, open_election_result_zip(zip_file) as election_result_zip:
+            buffers = create_csv_buffers(
+                election_result_zip.eml_file,
+                odt=election_result_zip.odt,
+                cache=self.cache,
+                neighbourhood_data=self.neighbourhood_data,
+                neighbourhood_registry=self.neighbourhood_registry,
+            )
+
+        output = BytesIO()
+        with ZipFile(output, "w", compression=ZIP_DEFLATED) as output_zipfile:
+            for name, buffer in zip(["a.csv", "b.csv", "c.csv"], buffers):
+                output_zipfile.writestr(name, buffer.getvalue())
+        return output.getvalue()
+
+
+def make_server(
+    service: HcpService,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    max_upload_size: int = MAX_UPLOAD_SIZE,
+) -> "HcpServer":
+    """Construct the HTTP server of a service. Requests are handled in threads, so a
+    slow upload does not block other requests.
+
+    Args:
+        service: The service handling the requests.
+        host: The address to listen on, by default only local connections.
+        port: The port to listen on, 0 for any free port.
+        max_upload_size: The maximum size of an uploaded .zip file in bytes, larger
+            uploads are rejected without reading them.
+
+    Returns:
+        The server, which is started with `serve_forever`.
+    """
+    return HcpServer((host, port), service, max_upload_size)
+
+
+class HcpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        server_address,
+        service: HcpService,
+        max_upload_size: int = MAX_UPLOAD_SIZE,
+    ) -> None:
+        super().__init__(server_address, _RequestHandler)
+        self.service = service
+        self.max_upload_size = max_upload_size
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server: HcpServer
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self._respond(HTTPStatus.OK, b"ok", "text/plain")
+        else:
+            self._respond(HTTPStatus.NOT_FOUND, b"Not found", "text/plain")
+
+    def do_POST(self) -> None:
+        if self.path != "/run":
+            self._respond(HTTPStatus.NOT_FOUND, b"Not found", "text/plain")
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self._respond(
+                HTTPStatus.LENGTH_REQUIRED, b"Content-Length required", "text/plain"
+            )
+            return
+        if length < 0:
+            self._respond(
+                HTTPStatus.BAD_REQUEST, b"Invalid Content-Length", "text/plain"
+            )
+            return
+        if length > self.server.max_upload_size:
+            self._respond(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE, b"Upload too large", "text/plain"
+            )
+            return
+        upload = BytesIO(self.rfile.read(length))
+
+        start = time.perf_counter()
+        try:
+            output = self.server.service.run(upload)
+        except (BadZipFile, InvalidZipException, InvalidEmlException) as error:
+            self._respond(HTTPStatus.BAD_REQUEST, str(error).encode(), "text/plain")
+            return
+        except ParseError as error:
+            self._respond(
+                HTTPStatus.BAD_REQUEST,
+                f"Invalid XML: {error}".encode(),
+                "text/plain",
+            )
+            return
+        except DefusedXmlException as error:
+            self._respond(
+                HTTPStatus.BAD_REQUEST,
+                f"Forbidden XML: {error}".encode(),
+                "text/plain",
+            )
+            return
+        except Exception as error:
+            self.log_error("Could not run HCP: %r", error)
+            self._respond(
+                HTTPStatus.INTERNAL_SERVER_ERROR, b"Could not run HCP", "text/plain"
+            )
+            return
+
+        self._respond(
+            HTTPStatus.OK,
+            output,
+            "application/zip",
+            {DURATION_HEADER: f"{time.perf_counter() - start:.4f}"},
+        )
+
+    def _respond(
+        self,
+        status: HTTPStatus,
+        body: bytes,
+        content_type: str,
+        headers: Optional[dict] = None,
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
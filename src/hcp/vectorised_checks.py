@@ -0,0 +1,291 @@
+"""Vectorised implementation of the per reporting unit checks of `protocol_checks`.
+
+Instead of calling every check for every reporting unit separately, the vote counts of
+all reporting units are taken from the columns of a `VoteMatrix` and every check is
+computed for all units at once with polars. The results are identical to those of the
+scalar checks in `protocol_checks`, including their floating point operations.
+"""
+
+from typing import Dict, List, Optional
+
+import polars as pl
+
+from . import protocol_checks
+from .eml_types import (
+    CheckResult,
+    PartyIdentifier,
+    ReportingUnitInfo,
+    VoteDifference,
+    VoteDifferenceAmount,
+    VoteDifferencePercentage,
+)
+from .vote_matrix import MISSING, VoteColumns, VoteMatrix
+
+# Reason codes which are accessed without a default by the scalar checks
+MANDATORY_REJECTED_CODES = ["ongeldig", "blanco"]
+MANDATORY_UNCOUNTED_CODES = ["geen verklaring", "toegelaten kiezers"]
+
+# Explanations for more votes than admitted voters, see
+# `protocol_checks.check_explanation_sum_difference`
+MORE_VOTES_EXPLANATIONS = [
+    "te veel uitgereikte stembiljetten",
+    "te veel briefstembiljetten",
+    "geen verklaring",
+    "andere verklaring",
+]
+# Explanations for fewer votes than admitted voters
+FEWER_VOTES_EXPLANATIONS = [
+    "meegenomen stembiljetten",
+    "te weinig uitgereikte stembiljetten",
+    "geen briefstembiljetten",
+    "kwijtgeraakte stembiljetten",
+    "geen verklaring",
+    "andere verklaring",
+]
+
+
+def run_checks(
+    vote_matrix: VoteMatrix,
+    reporting_units: List[ReportingUnitInfo],
+    invalid_vote_threshold_pct: float,
+    blank_vote_threshold_pct: float,
+    diff_vote_threshold_pct: float,
+    diff_vote_threshold: int,
+    party_difference_threshold_pct: float,
+) -> List[CheckResult]:
+    """Run all checks which only depend on the reporting unit itself and the main unit
+    for all reporting units at once.
+
+    Args:
+        vote_matrix: `VoteMatrix` with the main unit as the first row, followed by a row
+            for each reporting unit.
+        reporting_units: The reporting units, in the order of the rows of `vote_matrix`.
+            Only used for the order of the parties in the party differences.
+        invalid_vote_threshold_pct: Threshold of `check_too_many_rejected_votes` for
+            invalid votes.
+        blank_vote_threshold_pct: Threshold of `check_too_many_rejected_votes` for
+            blank votes.
+        diff_vote_threshold_pct: Percentage threshold of `check_too_many_differences`.
+        diff_vote_threshold: Absolute threshold of `check_too_many_differences`.
+        party_difference_threshold_pct: Threshold of
+            `check_parties_with_large_percentage_difference`.
+
+    Raises:
+        KeyError: If a reporting unit lacks a mandatory reason code, or has votes for a
+            party which the main unit does not have.
+
+    Returns:
+        A `CheckResult` for each reporting unit. The potentially switched candidates
+            are not computed by this function and are left empty.
+    """
+    if len(vote_matrix) != len(reporting_units) + 1:
+        raise ValueError("Vote matrix does not match the reporting units")
+
+    unit_checks = _get_unit_checks(
+        vote_matrix,
+        invalid_vote_threshold_pct,
+        blank_vote_threshold_pct,
+        diff_vote_threshold_pct,
+        diff_vote_threshold,
+    )
+    party_differences = _get_party_difference_rows(vote_matrix)
+    party_index = vote_matrix.votes_per_party.index
+
+    results = []
+    for reporting_unit, checks, differences_row in zip(
+        reporting_units, unit_checks.iter_rows(named=True), party_differences
+    ):
+        # Both percentages are an integer 0 in the scalar check when there are no votes
+        differences: Dict[PartyIdentifier, float] = {}
+        for party in reporting_unit.votes_per_party:
+            difference = differences_row[party_index[party]]
+            differences[party] = 0 if difference is None else difference
+
+        results.append(
+            CheckResult(
+                zero_votes=checks["zero_votes"],
+                inexplicable_difference=checks["inexplicable_difference"],
+                explanation_sum_difference=checks["explanation_sum_difference"],
+                high_invalid_vote_percentage=checks["high_invalid_vote_percentage"],
+                high_blank_vote_percentage=checks["high_blank_vote_percentage"],
+                high_vote_difference=_get_vote_difference(
+                    checks["high_vote_difference_amount"],
+                    checks["high_vote_difference_percentage"],
+                ),
+                parties_with_high_difference_percentage=protocol_checks.format_party_differences(
+                    differences, party_difference_threshold_pct
+                ),
+                party_difference_percentages=differences,
+                potentially_switched_candidates=[],
+                already_recounted=False,
+            )
+        )
+
+    return results
+
+
+# Implementation details
+
+
+def _get_unit_checks(
+    vote_matrix: VoteMatrix,
+    invalid_vote_threshold_pct: float,
+    blank_vote_threshold_pct: float,
+    diff_vote_threshold_pct: float,
+    diff_vote_threshold: int,
+) -> pl.DataFrame:
+    rejected = _get_code_columns(
+        vote_matrix.rejected_votes, MANDATORY_REJECTED_CODES, []
+    )
+    uncounted = _get_code_columns(
+        vote_matrix.uncounted_votes,
+        MANDATORY_UNCOUNTED_CODES,
+        MORE_VOTES_EXPLANATIONS + FEWER_VOTES_EXPLANATIONS,
+    )
+    units = pl.DataFrame(
+        {
+            "total_counted": _unit_rows(vote_matrix.total_counted),
+            **{f"rejected:{code}": column for code, column in rejected.items()},
+            **{f"uncounted:{code}": column for code, column in uncounted.items()},
+        }
+    )
+
+    total_votes = (
+        pl.col("total_counted")
+        + pl.col("rejected:ongeldig")
+        + pl.col("rejected:blanco")
+    )
+    vote_difference = total_votes - pl.col("uncounted:toegelaten kiezers")
+    more_votes_explained = pl.sum_horizontal(
+        pl.col(f"uncounted:{code}") for code in MORE_VOTES_EXPLANATIONS
+    )
+    fewer_votes_explained = pl.sum_horizontal(
+        pl.col(f"uncounted:{code}") for code in FEWER_VOTES_EXPLANATIONS
+    )
+    differences = vote_difference.abs()
+    differences_percentage = _percentage(differences, total_votes)
+
+    return units.select(
+        zero_votes=total_votes == 0,
+        inexplicable_difference=pl.col("uncounted:geen verklaring"),
+        explanation_sum_difference=pl.when(vote_difference > 0)
+        .then((vote_difference - more_votes_explained).abs())
+        .when(vote_difference < 0)
+        .then((vote_difference + fewer_votes_explained).abs())
+        .otherwise(0),
+        high_invalid_vote_percentage=_above_threshold(
+            _percentage(pl.col("rejected:ongeldig"), total_votes),
+            invalid_vote_threshold_pct,
+        ),
+        high_blank_vote_percentage=_above_threshold(
+            _percentage(pl.col("rejected:blanco"), total_votes),
+            blank_vote_threshold_pct,
+        ),
+        high_vote_difference_amount=pl.when(differences >= diff_vote_threshold).then(
+            differences
+        ),
+        high_vote_difference_percentage=pl.when(differences < diff_vote_threshold).then(
+            _above_threshold(differences_percentage, diff_vote_threshold_pct)
+        ),
+    )
+
+
+def _get_party_difference_rows(vote_matrix: VoteMatrix) -> List[tuple]:
+    votes_per_party = vote_matrix.votes_per_party
+    main_total = vote_matrix.total_counted[0]
+
+    columns = {}
+    for position, (party, column) in enumerate(
+        zip(votes_per_party.keys, votes_per_party.columns)
+    ):
+        unit_votes = _unit_rows(column)
+        main_votes = column[0]
+        if main_votes == MISSING:
+            if (unit_votes != MISSING).any():
+                raise KeyError(party)
+            main_votes = 0
+        columns[str(position)] = unit_votes
+        columns[f"main:{position}"] = pl.repeat(
+            main_votes, len(unit_votes), dtype=pl.Int64, eager=True
+        )
+
+    if not columns:
+        return [()] * (len(vote_matrix) - 1)
+
+    units = pl.DataFrame(
+        {"total_counted": _unit_rows(vote_matrix.total_counted), **columns}
+    )
+
+    local_total = pl.col("total_counted")
+    global_total = main_total - local_total
+    both_zero = (local_total == 0) & (global_total == 0)
+
+    def difference(position: int) -> pl.Expr:
+        local_votes = pl.col(str(position))
+        global_votes = pl.col(f"main:{position}") - local_votes
+        local_percentage = _percentage(local_votes, local_total).fill_null(0.0)
+        global_percentage = _percentage(global_votes, global_total).fill_null(0.0)
+        return (
+            pl.when(both_zero)
+            .then(None)
+            .otherwise(local_percentage - global_percentage)
+            .alias(str(position))
+        )
+
+    return units.select(
+        difference(position) for position in range(len(votes_per_party.keys))
+    ).rows()
+
+
+def _get_code_columns(
+    columns: VoteColumns[str], mandatory: List[str], optional: List[str]
+) -> Dict[str, pl.Series]:
+    code_columns = {}
+    for code in mandatory:
+        position = columns.index.get(code)
+        if position is None:
+            raise KeyError(code)
+        rows = _unit_rows(columns.columns[position])
+        if (rows == MISSING).any():
+            raise KeyError(code)
+        code_columns[code] = rows
+
+    # Missing optional reason codes count as zero
+    for code in optional:
+        if code in code_columns:
+            continue
+        position = columns.index.get(code)
+        if position is None:
+            code_columns[code] = pl.repeat(
+                0, columns.rows - 1, dtype=pl.Int64, eager=True
+            )
+        else:
+            rows = _unit_rows(columns.columns[position])
+            code_columns[code] = rows.set(rows == MISSING, 0)
+
+    return code_columns
+
+
+def _unit_rows(values) -> pl.Series:
+    # The first row of the vote matrix is the main unit
+    return pl.Series(values[1:], dtype=pl.Int64)
+
+
+def _percentage(part: pl.Expr, total: pl.Expr) -> pl.Expr:
+    # Null on division by zero, like `protocol_checks._percentage`
+    return pl.when(total != 0).then(part / total * 100)
+
+
+def _above_threshold(percentage: pl.Expr, threshold_pct: float) -> pl.Expr:
+    # Mirrors `percentage if percentage and percentage >= threshold_pct else None`
+    return pl.when((percentage != 0) & (percentage >= threshold_pct)).then(percentage)
+
+
+def _get_vote_difference(
+    amount: Optional[int], percentage: Optional[float]
+) -> Optional[VoteDifference]:
+    if amount is not None:
+        return VoteDifferenceAmount(value=amount)
+    if percentage is not None:
+        return VoteDifferencePercentage(value=percentage)
+    return None
@@ -0,0 +1,218 @@
+from array import array
+from collections.abc import ItemsView, Mapping
+from dataclasses import dataclass, field
+from typing import Dict, Generic, Iterator, List, Optional, TypeVar
+
+from .eml_types import (
+    CandidateIdentifier,
+    IdentifierRegistry,
+    PartyIdentifier,
+    ReportingUnitInfo,
+)
+
+K = TypeVar("K")
+
+# Vote counts are never negative, so this marks a key which is absent for a unit
+MISSING = -1
+# Typecode of the arrays holding the counts (signed 64 bit)
+TYPECODE = "q"
+
+
+@dataclass
+class VoteColumns(Generic[K]):
+    """Dense column-oriented storage of a `Dict[K, int]` per reporting unit. There is
+    one shared index of keys, and per key a column (`array`) with the value of that key
+    for every row (reporting unit). Keys which are absent for a unit are stored as
+    `MISSING`.
+    """
+
+    keys: List[K] = field(default_factory=list)
+    index: Dict[K, int] = field(default_factory=dict)
+    columns: List[array] = field(default_factory=list)
+    rows: int = 0
+
+    @staticmethod
+    def from_keys(keys: List[K]) -> "VoteColumns[K]":
+        """Construct empty columns for a given list of keys, so that the position of
+        each key is known upfront.
+
+        Args:
+            keys: The (unique) keys.
+
+        Returns:
+            `VoteColumns` without rows.
+        """
+        return VoteColumns(
+            keys=list(keys),
+            index={key: position for position, key in enumerate(keys)},
+            columns=[array(TYPECODE) for _ in keys],
+        )
+
+    def append(self, values: Dict[K, int]) -> int:
+        """Append a row to the columns.
+
+        Args:
+            values: Mapping from key to value for the new row.
+
+        Returns:
+            The index of the new row.
+        """
+        for column in self.columns:
+            column.append(MISSING)
+
+        for key, value in values.items():
+            position = self.index.get(key)
+            if position is None:
+                position = self._add_key(key)
+            self.columns[position][self.rows] = value
+
+        self.rows += 1
+        return self.rows - 1
+
+    def view(self, row: int) -> "ColumnsView[K]":
+        """Read-only `Mapping` view of a single row.
+
+        Args:
+            row: The index of the row.
+
+        Returns:
+            A `ColumnsView` which behaves like the dict the row was constructed from.
+        """
+        return ColumnsView(self, row)
+
+    def _add_key(self, key: K) -> int:
+        self.index[key] = len(self.keys)
+        self.keys.append(key)
+        self.columns.append(array(TYPECODE, [MISSING]) * (self.rows + 1))
+        return self.index[key]
+
+
+class ColumnsView(Mapping, Generic[K]):
+    """Mapping of a single row of `VoteColumns`, used in place of the
+    `Dict[K, int]` fields of a `ReportingUnitInfo`.
+    """
+
+    __slots__ = ("_columns", "_row")
+
+    def __init__(self, columns: VoteColumns[K], row: int) -> None:
+        self._columns = columns
+        self._row = row
+
+    def __getitem__(self, key: K) -> int:
+        columns = self._columns
+        value = columns.columns[columns.index[key]][self._row]
+        if value == MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self) -> Iterator[K]:
+        row = self._row
+        for key, column in zip(self._columns.keys, self._columns.columns):
+            if column[row] != MISSING:
+                yield key
+
+    def __len__(self) -> int:
+        row = self._row
+        return sum(1 for column in self._columns.columns if column[row] != MISSING)
+
+    def items(self) -> "ColumnsItemsView[K]":
+        return ColumnsItemsView(self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+
+class ColumnsItemsView(ItemsView):
+    """Items view which reads the keys and values of a row in a single pass."""
+
+    _mapping: ColumnsView
+
+    def __iter__(self):
+        columns = self._mapping._columns
+        row = self._mapping._row
+        for key, column in zip(columns.keys, columns.columns):
+            value = column[row]
+            if value != MISSING:
+                yield (key, value)
+
+
+@dataclass
+class VoteMatrix:
+    """Column-oriented backing store for the vote counts of all reporting units of an
+    EML. Instead of every `ReportingUnitInfo` holding its own dicts, the parties,
+    candidates and reason codes are indexed once and the counts are stored in dense
+    integer columns (units x parties, units x candidates, units x reason codes).
+
+    `ReportingUnitInfo` instances returned by `append` and `unit` are lightweight
+    views on a row of the matrix, so they can be used as before by the checks.
+    """
+
+    unit_ids: List[Optional[str]] = field(default_factory=list)
+    unit_names: List[Optional[str]] = field(default_factory=list)
+    cast: array = field(default_factory=lambda: array(TYPECODE))
+    total_counted: array = field(default_factory=lambda: array(TYPECODE))
+    rejected_votes: VoteColumns[str] = field(default_factory=VoteColumns)
+    uncounted_votes: VoteColumns[str] = field(default_factory=VoteColumns)
+    votes_per_party: VoteColumns[PartyIdentifier] = field(default_factory=VoteColumns)
+    votes_per_candidate: VoteColumns[CandidateIdentifier] = field(
+        default_factory=VoteColumns
+    )
+
+    @staticmethod
+    def from_identifiers(identifiers: IdentifierRegistry) -> "VoteMatrix":
+        """Construct an empty `VoteMatrix` whose party and candidate columns are
+        ordered by the ordinals of an `IdentifierRegistry`.
+
+        Args:
+            identifiers: Registry of the interned identifiers of the EML.
+
+        Returns:
+            `VoteMatrix` without rows.
+        """
+        return VoteMatrix(
+            votes_per_party=VoteColumns.from_keys(identifiers.parties),
+            votes_per_candidate=VoteColumns.from_keys(identifiers.candidates),
+        )
+
+    def __len__(self) -> int:
+        return len(self.unit_ids)
+
+    def append(self, reporting_unit: ReportingUnitInfo) -> ReportingUnitInfo:
+        """Add a reporting unit as a new row of the matrix.
+
+        Args:
+            reporting_unit: The reporting unit to add. It can be discarded afterwards.
+
+        Returns:
+            A `ReportingUnitInfo` which is a view on the new row.
+        """
+        self.unit_ids.append(reporting_unit.reporting_unit_id)
+        self.unit_names.append(reporting_unit.reporting_unit_name)
+        self.cast.append(reporting_unit.cast)
+        self.total_counted.append(reporting_unit.total_counted)
+        self.rejected_votes.append(reporting_unit.rejected_votes)
+        self.uncounted_votes.append(reporting_unit.uncounted_votes)
+        self.votes_per_party.append(reporting_unit.votes_per_party)
+        self.votes_per_candidate.append(reporting_unit.votes_per_candidate)
+
+        return self.unit(len(self) - 1)
+
+    def unit(self, row: int) -> ReportingUnitInfo:
+        """Construct a `ReportingUnitInfo` view on a given row.
+
+        Args:
+            row: The index of the row.
+
+        Returns:
+            `ReportingUnitInfo` whose vote count mappings read from the matrix.
+        """
+        return ReportingUnitInfo(
+            reporting_unit_id=self.unit_ids[row],
+            reporting_unit_name=self.unit_names[row],
+            cast=self.cast[row],
+            total_counted=self.total_counted[row],
+            rejected_votes=self.rejected_votes.view(row),  # type: ignore[arg-type]
+            uncounted_votes=self.uncounted_votes.view(row),  # type: ignore[arg-type]
+            votes_per_party=self.votes_per_party.view(row),  # type: ignore[arg-type]
+            votes_per_candidate=self.votes_per_candidate.view(row),  # type: ignore[arg-type]
+        )
@@ -1,5 +1,7 @@
+import mmap
 import re
-from typing import IO, Dict, List, Optional, Tuple, Union
+from dataclasses import dataclass
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
 from xml.etree.ElementTree import Element as XmlElement
 
 from defusedxml import ElementTree as ET
@@ -7,6 +9,7 @@ from defusedxml import ElementTree as ET
 from .eml_types import (
     CandidateIdentifier,
     EmlMetadata,
+    IdentifierRegistry,
     InvalidEmlException,
     PartyIdentifier,
     ReportingUnitInfo,
@@ -19,8 +22,57 @@ NAMESPACE = {
     "xal": "urn:oasis:names:tc:ciq:xsdschema:xAL:2.0",
     "xnl": "urn:oasis:names:tc:ciq:xsdschema:xNL:2.0",
 }
+# Version of the parsing logic, bump when the parsed result of a given file changes
+# so that parsed EMLs cached by a previous version are no longer used
+PARSER_VERSION = 1
 ZIP_REGEX = re.compile(r"\(postcode: (\d{4} \w{2})\)")
 
+# Fully qualified tags of the elements which are matched directly instead of
+# through (namespaced) XPath queries
+CONTEST_TAG = f"{{{NAMESPACE['eml']}}}Contest"
+TOTAL_VOTES_TAG = f"{{{NAMESPACE['eml']}}}TotalVotes"
+REPORTING_UNIT_VOTES_TAG = f"{{{NAMESPACE['eml']}}}ReportingUnitVotes"
+SELECTION_TAG = f"{{{NAMESPACE['eml']}}}Selection"
+AFFILIATION_IDENTIFIER_TAG = f"{{{NAMESPACE['eml']}}}AffiliationIdentifier"
+REGISTERED_NAME_TAG = f"{{{NAMESPACE['eml']}}}RegisteredName"
+CANDIDATE_TAG = f"{{{NAMESPACE['eml']}}}Candidate"
+CANDIDATE_IDENTIFIER_TAG = f"{{{NAMESPACE['eml']}}}CandidateIdentifier"
+VALID_VOTES_TAG = f"{{{NAMESPACE['eml']}}}ValidVotes"
+# Depth of the `Contest` element: EML/Count/Election/Contests/Contest
+_CONTEST_DEPTH = 5
+
+# Byte patterns used for splitting an EML file into ranges of reporting units,
+# these allow for an optional namespace prefix on the element names
+_ROOT_START_TAG = re.compile(
+    rb"<((?:[\w.-]+:)?EML)\b" rb"(?:[^>\"']|\"[^\"]*\"|'[^']*')*>"
+)
+_REPORTING_UNIT_VOTES_START = re.compile(rb"<(?:[\w.-]+:)?ReportingUnitVotes[\s/>]")
+_REPORTING_UNIT_VOTES_END = re.compile(rb"</(?:[\w.-]+:)?ReportingUnitVotes\s*>")
+
+
+@dataclass
+class ReportingUnitRanges:
+    """Result of splitting an EML file into byte ranges of `ReportingUnitVotes`
+    elements, which can be parsed independently of each other.
+
+    - skeleton: the EML file with all `ReportingUnitVotes` elements left out,
+    containing the metadata and the main unit.
+    - head: everything up to and including the start tag of the root element, used
+    to give each range the same namespace declarations as the original file.
+    - tail: the end tag of the root element.
+    - ranges: `(start, end)` byte offsets, each containing one or more complete
+    `ReportingUnitVotes` elements, in document order.
+    - unit_count: the amount of `ReportingUnitVotes` start tags in the ranges. If
+    parsing the ranges results in another amount of reporting units, the ranges
+    were not split correctly (see `parse_reporting_unit_range`).
+    """
+
+    skeleton: bytes
+    head: bytes
+    tail: bytes
+    ranges: List[Tuple[int, int]]
+    unit_count: int = 0
+
 
 def parse_xml(file_name: Union[str, IO[bytes]]) -> XmlElement:
     """Fetch the root node of an EML XML DOM-tree given a filepath.
@@ -40,6 +92,118 @@ def parse_xml(file_name: Union[str, IO[bytes]]) -> XmlElement:
     return tree_root
 
 
+def iterparse_eml(
+    file_name: Union[str, IO[bytes]],
+) -> Tuple[XmlElement, Iterator[XmlElement]]:
+    """Incrementally parse an EML file. Instead of building the full DOM-tree, the
+    returned iterator yields the `TotalVotes` and `ReportingUnitVotes` elements one
+    at a time as soon as they have been parsed completely. Once the consumer asks for
+    the next element, the previous one is cleared and detached from the tree so
+    memory usage does not grow with the amount of reporting units.
+
+    The returned root only contains the EML header (metadata) after the iterator is
+    exhausted, since all vote elements have been removed from it.
+
+    Args:
+        file_name: Path to (or binary stream of) the EML file to parse.
+
+    Returns:
+        Tuple of the root node and an iterator over the vote count nodes.
+    """
+    events = ET.iterparse(file_name, events=("start", "end"))
+    _, tree_root = next(events)
+
+    return tree_root, _iter_vote_elements(events, tree_root)
+
+
+def split_reporting_units(file_name: str, amount: int) -> ReportingUnitRanges:
+    """Split an EML file into (at most) `amount` byte ranges of consecutive
+    `ReportingUnitVotes` elements without parsing the XML, such that the ranges can
+    be parsed in parallel with `parse_reporting_unit_range`.
+
+    Args:
+        file_name: Path to the EML file to split.
+        amount: The amount of ranges to split the reporting units into.
+
+    Raises:
+        InvalidEmlException: when the root element could not be found.
+
+    Returns:
+        `ReportingUnitRanges` instance describing the ranges.
+    """
+    with (
+        open(file_name, "rb") as file,
+        mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data,
+    ):
+        root_start_tag = _ROOT_START_TAG.search(data)
+        if root_start_tag is None:
+            raise InvalidEmlException(f"{file_name} has no EML root element")
+        head = data[: root_start_tag.end()]
+        tail = b"</" + root_start_tag.group(1) + b">"
+
+        starts = [
+            match.start()
+            for match in _REPORTING_UNIT_VOTES_START.finditer(
+                data, root_start_tag.end()
+            )
+        ]
+        if not starts:
+            return ReportingUnitRanges(
+                skeleton=data[:], head=head, tail=tail, ranges=[]
+            )
+
+        last_end = _REPORTING_UNIT_VOTES_END.search(data, starts[-1])
+        if last_end is None:
+            raise InvalidEmlException(f"{file_name} has an unclosed reporting unit")
+
+        # Reporting units are consecutive elements of the contest, so everything
+        # outside of the first and last one makes up the rest of the document
+        skeleton = data[: starts[0]] + data[last_end.end() :]
+
+    amount = max(1, min(amount, len(starts)))
+    boundaries = [starts[len(starts) * i // amount] for i in range(amount)]
+    ranges = list(zip(boundaries, boundaries[1:] + [last_end.end()]))
+
+    return ReportingUnitRanges(
+        skeleton=skeleton, head=head, tail=tail, ranges=ranges, unit_count=len(starts)
+    )
+
+
+def parse_reporting_unit_range(
+    file_name: str, start: int, end: int, head: bytes, tail: bytes
+) -> List[ReportingUnitInfo]:
+    """Parse a byte range of `ReportingUnitVotes` elements as produced by
+    `split_reporting_units`. This function is meant to be run in a worker process.
+
+    The range is parsed with only the namespace declarations of the root element. If
+    the file declares namespaces on other elements, the range may not be parsed (raising
+    `ParseError`) or reporting units may be left out, which the caller should check
+    against `ReportingUnitRanges.unit_count`.
+
+    Args:
+        file_name: Path to the EML file.
+        start: Start offset of the range.
+        end: End offset of the range.
+        head: Start of the EML file up to and including the root start tag.
+        tail: End tag of the root element.
+
+    Returns:
+        List of `ReportingUnitInfo` instances in document order.
+    """
+    with open(file_name, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+
+    root = ET.fromstring(head + data + tail)
+    # Shared identifiers are only pickled once when sending the results back
+    registry = IdentifierRegistry()
+    return [
+        get_reporting_unit_info(reporting_unit, registry)
+        for reporting_unit in root
+        if reporting_unit.tag == REPORTING_UNIT_VOTES_TAG
+    ]
+
+
 def get_eml_type(root: XmlElement) -> Optional[str]:
     """Fetches the EML ID.
 
@@ -56,11 +220,16 @@ def get_eml_type(root: XmlElement) -> Optional[str]:
     return None
 
 
-def get_metadata(root: XmlElement) -> EmlMetadata:
+def get_metadata(
+    root: XmlElement,
+    reporting_unit_identifiers: Optional[List[Tuple[str, Optional[str]]]] = None,
+) -> EmlMetadata:
     """Given the root of the EML DOM-tree, construct an instance of `EmlMetadata`.
 
     Args:
         root: The root node to query.
+        reporting_unit_identifiers: Optional list of `(id, name)` pairs of all reporting
+            units in the EML. If not specified these are looked up in the DOM-tree.
 
     Returns:
         `EmlMetadata` instance containing all EML metadata.
@@ -108,10 +277,12 @@ def get_metadata(root: XmlElement) -> EmlMetadata:
         "Id",
     )
 
-    reporting_units = root.findall(".//eml:ReportingUnitIdentifier", NAMESPACE)
-    reporting_unit_names = {
-        _get_mandatory_attrib(elem, "Id"): _get_text(elem) for elem in reporting_units
-    }
+    if reporting_unit_identifiers is None:
+        reporting_unit_identifiers = [
+            (_get_mandatory_attrib(elem, "Id"), _get_text(elem))
+            for elem in root.findall(".//eml:ReportingUnitIdentifier", NAMESPACE)
+        ]
+    reporting_unit_names = dict(reporting_unit_identifiers)
     reporting_unit_zips = {
         reporting_unit_id: _extract_zip_from_name(reporting_unit_name)
         for (reporting_unit_id, reporting_unit_name) in reporting_unit_names.items()
@@ -126,7 +297,7 @@ def get_metadata(root: XmlElement) -> EmlMetadata:
         election_domain=election_domain,
         election_date=election_date,
         contest_identifier=contest_identifier,
-        reporting_unit_amount=len(reporting_units),
+        reporting_unit_amount=len(reporting_unit_identifiers),
         reporting_unit_names=reporting_unit_names,
         reporting_unit_zips=reporting_unit_zips,
     )
@@ -172,11 +343,16 @@ def get_main_unit(xml: XmlElement) -> XmlElement:
     return main_unit
 
 
-def get_reporting_unit_info(reporting_unit: XmlElement) -> ReportingUnitInfo:
+def get_reporting_unit_info(
+    reporting_unit: XmlElement, registry: Optional[IdentifierRegistry] = None
+) -> ReportingUnitInfo:
     """Given a reporting unit EML node, construct a `ReportingUnitInfo` instance.
 
     Args:
         reporting_unit: The reporting unit node to turn into a `ReportingUnitInfo` instance.
+        registry: Registry used to intern the party and candidate identifiers, so that
+            they are shared between reporting units. A new registry is used if not
+            specified.
 
     Returns:
         The `ReportingUnitInfo` instance.
@@ -205,7 +381,9 @@ def get_reporting_unit_info(reporting_unit: XmlElement) -> ReportingUnitInfo:
     uncounted_votes = _get_vote_metadata_dict(reporting_unit, "./eml:UncountedVotes")
 
     # Fetch amount of votes per party
-    (votes_per_party, votes_per_candidate) = _get_party_and_candvotes(reporting_unit)
+    votes_per_party, votes_per_candidate = _get_party_and_candvotes(
+        reporting_unit, registry if registry is not None else IdentifierRegistry()
+    )
 
     return ReportingUnitInfo(
         reporting_unit_id=reporting_unit_id,
@@ -219,6 +397,30 @@ def get_reporting_unit_info(reporting_unit: XmlElement) -> ReportingUnitInfo:
     )
 
 
+def _iter_vote_elements(
+    events: Iterator[Tuple[str, XmlElement]], tree_root: XmlElement
+) -> Iterator[XmlElement]:
+    # Stack of currently open elements, used to determine the parent of an element
+    open_elements = [tree_root]
+
+    for event, elem in events:
+        if event == "start":
+            open_elements.append(elem)
+            continue
+
+        open_elements.pop()
+        if (
+            elem.tag in (TOTAL_VOTES_TAG, REPORTING_UNIT_VOTES_TAG)
+            and len(open_elements) == _CONTEST_DEPTH
+            and open_elements[-1].tag == CONTEST_TAG
+        ):
+            yield elem
+
+            # The consumer is done with this element, so we can free its memory
+            elem.clear()
+            open_elements[-1].remove(elem)
+
+
 def _get_text(xml_element: Optional[XmlElement]) -> Optional[str]:
     return xml_element.text if xml_element is not None else None
 
@@ -284,18 +486,32 @@ def _get_vote_metadata_dict(reporting_unit: XmlElement, path: str) -> Dict[str,
 
 
 def _get_party_and_candvotes(
-    reporting_unit: XmlElement,
+    reporting_unit: XmlElement, registry: IdentifierRegistry
 ) -> Tuple[Dict[PartyIdentifier, int], Dict[CandidateIdentifier, int]]:
     party_votes_dict: Dict[PartyIdentifier, int] = {}
     cand_votes_dict: Dict[CandidateIdentifier, int] = {}
 
     current_party_identifier = None
 
-    for count in reporting_unit.findall("./eml:Selection", NAMESPACE):
-        party_identifier_elem = count.find("./eml:AffiliationIdentifier", NAMESPACE)
-        candidate_identifier_elem = count.find(
-            "./eml:Candidate/eml:CandidateIdentifier", NAMESPACE
-        )
+    for count in reporting_unit:
+        if count.tag != SELECTION_TAG:
+            continue
+
+        # Walk the children of the selection element once, picking out the first
+        # occurrence of each element we are interested in
+        party_identifier_elem = None
+        candidate_identifier_elem = None
+        votes_elem = None
+        for child in count:
+            tag = child.tag
+            if tag == VALID_VOTES_TAG:
+                if votes_elem is None:
+                    votes_elem = child
+            elif tag == AFFILIATION_IDENTIFIER_TAG:
+                if party_identifier_elem is None:
+                    party_identifier_elem = child
+            elif tag == CANDIDATE_TAG and candidate_identifier_elem is None:
+                candidate_identifier_elem = _find_child(child, CANDIDATE_IDENTIFIER_TAG)
 
         # Selection element contains either a party identifier or candidate identifier
         if party_identifier_elem is not None:
@@ -305,19 +521,18 @@ def _get_party_and_candvotes(
 
             party_id = int(party_id)
             party_name = _get_text(
-                party_identifier_elem.find("./eml:RegisteredName", NAMESPACE)
+                _find_child(party_identifier_elem, REGISTERED_NAME_TAG)
             )
 
             # Set the current party identifier for upcoming candidate selection elements
-            current_party_identifier = PartyIdentifier(id=party_id, name=party_name)
-            party_votes_elem = count.find("eml:ValidVotes", NAMESPACE)
-            if party_votes_elem is None or party_votes_elem.text is None:
+            current_party_identifier = registry.party(party_id, party_name)
+            if votes_elem is None or votes_elem.text is None:
                 raise InvalidEmlException
-            party_votes = int(party_votes_elem.text)
+            party_votes = int(votes_elem.text)
 
             party_votes_dict[current_party_identifier] = party_votes
 
-        elif party_identifier_elem is None and candidate_identifier_elem is not None:
+        elif candidate_identifier_elem is not None:
             if current_party_identifier is None:
                 raise InvalidEmlException
 
@@ -325,14 +540,13 @@ def _get_party_and_candvotes(
             if candidate_id is None:
                 raise InvalidEmlException
             candidate_id = int(candidate_id)
-            candidate_identifier = CandidateIdentifier(
-                party=current_party_identifier, cand_id=candidate_id
+            candidate_identifier = registry.candidate(
+                current_party_identifier, candidate_id
             )
 
-            candidate_votes_elem = count.find("eml:ValidVotes", NAMESPACE)
-            if candidate_votes_elem is None or candidate_votes_elem.text is None:
+            if votes_elem is None or votes_elem.text is None:
                 raise InvalidEmlException
-            candidate_votes = int(candidate_votes_elem.text)
+            candidate_votes = int(votes_elem.text)
 
             cand_votes_dict[candidate_identifier] = candidate_votes
 
@@ -340,3 +554,10 @@ def _get_party_and_candvotes(
             raise InvalidEmlException
 
     return (party_votes_dict, cand_votes_dict)
+
+
+def _find_child(xml_element: XmlElement, tag: str) -> Optional[XmlElement]:
+    for child in xml_element:
+        if child.tag == tag:
+            return child
+    return None
@@ -0,0 +1,68 @@
+import io
+from pathlib import Path
+from typing import Callable, Optional
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import pytest
+
+DORDRECHT_EML_PATH = "./test/data/FAKE_TEST_DATA_TK2023_DORDRECHT/Fake_test_data_Telling_TK2023_gemeente_Dordrecht.eml.xml"
+STEENWIJKERLAND_EML_PATH = (
+    "./test/data/e2e/Fake_test_data_Telling_EP2024_gemeente_Steenwijkerland.eml.xml"
+)
+EMPTY_PARTY_NAME_EML_PATH = "./test/data/emls/empty_party_name.eml.xml"
+ODT_PATH = "./test/data/FAKE_TEST_DATA_TK2023_DORDRECHT/Model_Na31-1.odt"
+
+
+@pytest.fixture(
+    params=[DORDRECHT_EML_PATH, STEENWIJKERLAND_EML_PATH, EMPTY_PARTY_NAME_EML_PATH],
+    ids=["dordrecht", "steenwijkerland", "empty_party_name"],
+)
+def eml_path(request: pytest.FixtureRequest) -> str:
+    return request.param
+
+
+@pytest.fixture
+def dordrecht_eml_path() -> str:
+    return DORDRECHT_EML_PATH
+
+
+@pytest.fixture
+def steenwijkerland_eml_path() -> str:
+    return STEENWIJKERLAND_EML_PATH
+
+
+@pytest.fixture
+def odt_path() -> str:
+    return ODT_PATH
+
+
+def _osv_zip(
+    eml_path: Optional[str] = DORDRECHT_EML_PATH,
+    eml: Optional[bytes] = None,
+    odt: bool = True,
+) -> bytes:
+    # Same layout as the output of OSV-2020U: the .odt next to a .zip with the count.
+    # The contents of the .eml.xml file can be replaced by eml, and without an
+    # eml_path the .zip with the count is empty
+    inner_zip = io.BytesIO()
+    with ZipFile(inner_zip, "w", compression=ZIP_DEFLATED) as inner_zipfile:
+        if eml_path is not None:
+            eml_name = f"tellingen/{Path(eml_path).name}"
+            if eml is None:
+                inner_zipfile.write(eml_path, eml_name)
+            else:
+                inner_zipfile.writestr(eml_name, eml)
+
+    outer_zip = io.BytesIO()
+    with ZipFile(outer_zip, "w", compression=ZIP_DEFLATED) as outer_zipfile:
+        outer_zipfile.writestr("tellingen.zip", inner_zip.getvalue())
+        if odt:
+            outer_zipfile.write(ODT_PATH, f"documenten/{Path(ODT_PATH).name}")
+    return outer_zip.getvalue()
+
+
+@pytest.fixture
+def osv_zip() -> Callable[..., bytes]:
+    """Builds the contents of a .zip file as output by OSV-2020U, by default of the
+    Dordrecht test data."""
+    return _osv_zip
@@ -4,6 +4,7 @@ import pytest
 
 from hcp import protocol_checks
 from hcp.eml_types import (
+    MainUnitComplement,
     PartyIdentifier,
     ReportingUnitInfo,
     VoteDifferenceAmount,
@@ -262,6 +263,24 @@ def test_check_parties_with_large_percentage_difference(
         == expected
     )
 
+    # Passing precomputed differences gives the same result
+    differences = protocol_checks.get_party_difference_percentages(
+        main_unit, reporting_unit
+    )
+    complement = protocol_checks.get_main_unit_complement(main_unit, reporting_unit)
+    assert (
+        protocol_checks.get_party_difference_percentages(
+            main_unit, reporting_unit, complement
+        )
+        == differences
+    )
+    assert (
+        protocol_checks.check_parties_with_large_percentage_difference(
+            main_unit, reporting_unit, threshold_pct, differences
+        )
+        == expected
+    )
+
 
 sum_difference_testcases = [
     (
@@ -345,3 +364,32 @@ def test_check_explanation_sum_difference(
         protocol_checks.check_explanation_sum_difference(reporting_unit)
         == expected_difference
     )
+
+
+def test_get_main_unit_complement() -> None:
+    party_a = PartyIdentifier(1, "A")
+    party_b = PartyIdentifier(2, "B")
+    main_unit = ReportingUnitInfo(
+        reporting_unit_id=None,
+        reporting_unit_name=None,
+        cast=0,
+        total_counted=30,
+        rejected_votes={},
+        uncounted_votes={},
+        votes_per_party={party_a: 20, party_b: 10},
+        votes_per_candidate={},
+    )
+    reporting_unit = ReportingUnitInfo(
+        reporting_unit_id="SB1",
+        reporting_unit_name=None,
+        cast=0,
+        total_counted=12,
+        rejected_votes={},
+        uncounted_votes={},
+        votes_per_party={party_a: 8, party_b: 4},
+        votes_per_candidate={},
+    )
+
+    assert protocol_checks.get_main_unit_complement(
+        main_unit, reporting_unit
+    ) == MainUnitComplement(total_counted=18, votes_per_party={party_a: 12, party_b: 6})
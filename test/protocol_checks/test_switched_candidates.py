@@ -30,7 +30,7 @@ def _create_candidate_votes(
 
 
 def _create_party_votes(
-    cand_votes: Dict[CandidateIdentifier, int]
+    cand_votes: Dict[CandidateIdentifier, int],
 ) -> Dict[PartyIdentifier, int]:
     result = defaultdict(int)
     for cand_id, votes in cand_votes.items():
@@ -187,3 +187,42 @@ def test_case_2():
             candidate_with_more_expected=10,
         )
     ]
+
+
+# Case 3: The neighbourhood of polling station 1 is too small, so it falls back to
+# the municipality, where the switch of case 1 is found
+case_3_config = SwitchedCandidateConfig(
+    minimum_reporting_units_municipality=4,
+    minimum_reporting_units_neighbourhood=2,
+    minimum_deviation_factor=2,
+    minimum_votes=5,
+)
+
+case_3_neighbourhoods = ReportingNeighbourhoods(
+    reporting_unit_id_to_neighbourhood_id={
+        "1": "WK000101",
+        "2": "WK000102",
+        "3": "WK000102",
+        "4": None,
+    },
+    neighbourhood_id_to_reporting_unit_ids={
+        "WK000101": set(["1"]),
+        "WK000102": set(["2", "3"]),
+    },
+    neighbourhood_id_to_reference_group={
+        "WK000101": _create_mu([case_1_ru[0]]),
+        "WK000102": _create_mu([case_1_ru[1], case_1_ru[2]]),
+    },
+)
+
+
+def test_case_3():
+    result = protocol_checks.check_potentially_switched_candidates(
+        polling_station_id="1",
+        main_unit=case_1_mu,
+        polling_station=case_1_ru[0],
+        reporting_unit_amount=len(case_1_ru),
+        reporting_neighbourhoods=case_3_neighbourhoods,
+        config=case_3_config,
+    )
+    assert result == case_1_expected
@@ -68,6 +68,15 @@ def test_get_expected_candidate_votes(
         == expected
     )
 
+    # Passing the precomputed main unit complement gives the same expected votes
+    complement = protocol_checks.get_main_unit_complement(main_unit, reporting_unit)
+    assert (
+        protocol_checks._get_expected_candidate_votes(
+            main_unit, reporting_unit, complement
+        )
+        == expected
+    )
+
 
 switched_reporting_unit = ReportingUnitInfo(
     reporting_unit_id=None,
@@ -136,6 +145,54 @@ def test_get_switched_candidate(
     )
 
 
+def test_get_switched_candidate_order() -> None:
+    parties = [PartyIdentifier(1, None), PartyIdentifier(2, "Partij")]
+    main_votes = {1: 50, 2: 50, 3: 50, 4: 50}
+    # Candidates 1 and 3 have more votes than expected, 2 and 4 fewer
+    received_votes = {1: 18, 2: 1, 3: 20, 4: 1}
+
+    def unit(votes: Dict[int, int]) -> ReportingUnitInfo:
+        return ReportingUnitInfo(
+            reporting_unit_id=None,
+            reporting_unit_name=None,
+            cast=0,
+            total_counted=0,
+            rejected_votes={},
+            uncounted_votes={},
+            votes_per_party={party: sum(votes.values()) for party in parties},
+            # Interleave the parties
+            votes_per_candidate={
+                CandidateIdentifier(party, cand_id): cand_votes
+                for cand_id, cand_votes in votes.items()
+                for party in parties
+            },
+        )
+
+    result = protocol_checks._get_potentially_switched_candidates(
+        unit(main_votes), unit(received_votes), 10, 1, 2, 5
+    )
+
+    # Ordered by candidate with more votes, then by candidate with fewer votes
+    assert [
+        (
+            switched.candidate_with_more.party.id,
+            switched.candidate_with_more.cand_id,
+            switched.candidate_with_fewer.party.id,
+            switched.candidate_with_fewer.cand_id,
+        )
+        for switched in result
+    ] == [
+        (1, 1, 1, 2),
+        (1, 1, 1, 4),
+        (2, 1, 2, 2),
+        (2, 1, 2, 4),
+        (1, 3, 1, 2),
+        (1, 3, 1, 4),
+        (2, 3, 2, 2),
+        (2, 3, 2, 4),
+    ]
+
+
 combine_switched_testcases = [
     (
         [
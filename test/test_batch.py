@@ -0,0 +1,116 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from hcp.batch import BatchConfig, find_zip_files, format_summary, run_batch
+from hcp.eml_cache import EmlCache
+from hcp.main import create_csv_files
+from hcp.nearest_reporting_units import InvalidZipCentroidsException
+from hcp.neighbourhood import NeighbourhoodRegistry
+
+
+@pytest.fixture
+def zip_directory(
+    tmp_path: Path, osv_zip, dordrecht_eml_path: str, steenwijkerland_eml_path: str
+) -> Path:
+    directory = tmp_path / "uploads"
+    directory.mkdir()
+    (directory / "dordrecht.zip").write_bytes(osv_zip(dordrecht_eml_path))
+    (directory / "steenwijkerland.zip").write_bytes(osv_zip(steenwijkerland_eml_path))
+    (directory / "broken.zip").write_bytes(b"not a zip file")
+    (directory / "notes.txt").write_text("not a zip file either")
+    return directory
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_run_batch(
+    tmp_path: Path,
+    zip_directory: Path,
+    dordrecht_eml_path: str,
+    steenwijkerland_eml_path: str,
+    odt_path: str,
+    processes: int,
+) -> None:
+    zip_paths = find_zip_files(zip_directory)
+    assert [path.name for path in zip_paths] == [
+        "broken.zip",
+        "dordrecht.zip",
+        "steenwijkerland.zip",
+    ]
+
+    registry = NeighbourhoodRegistry.from_directory(
+        Path("./data"), index_directory=tmp_path / "cache"
+    )
+    config = BatchConfig(
+        output_directory=tmp_path / "output",
+        neighbourhood_registry=registry,
+        cache=EmlCache(directory=tmp_path / "cache"),
+        parquet=True,
+    )
+    results = run_batch(zip_paths, config, processes=processes)
+
+    assert [result.zip_path for result in results] == zip_paths
+    assert results[0].error is not None
+    assert results[0].error.startswith("BadZipFile")
+    for result, eml_path in zip(
+        results[1:], [dordrecht_eml_path, steenwijkerland_eml_path]
+    ):
+        assert result.error is None
+        assert result.output_directory == tmp_path / "output" / result.zip_path.stem
+        assert (result.output_directory / "results.parquet").exists()
+
+        expected_directory = tmp_path / "expected" / result.zip_path.stem
+        expected_directory.mkdir(parents=True)
+        create_csv_files(
+            eml_path,
+            str(expected_directory / "a.csv"),
+            str(expected_directory / "b.csv"),
+            str(expected_directory / "c.csv"),
+            path_to_odt=odt_path,
+            neighbourhood_registry=registry,
+        )
+        for name in ["a.csv", "b.csv", "c.csv"]:
+            assert (result.output_directory / name).read_bytes() == (
+                expected_directory / name
+            ).read_bytes()
+
+    summary = format_summary(results, 1.5).splitlines()
+    assert summary[0].split() == ["file", "seconds", "result"]
+    assert summary[1].startswith("broken.zip")
+    assert "failed: BadZipFile" in summary[1]
+    assert summary[2].split()[0] == "dordrecht.zip"
+    assert summary[2].split()[-1] == "ok"
+    assert summary[-1] == "3 files, 1 failed, 1.50 seconds in total"
+
+
+def test_run_batch_explicit_neighbourhoods(tmp_path: Path, zip_directory: Path) -> None:
+    shutil.copy(
+        "./data/zip_to_neighbourhood_2024.parquet", tmp_path / "neighbourhoods.parquet"
+    )
+    zip_paths = find_zip_files(zip_directory)[1:]
+    results = run_batch(
+        zip_paths,
+        BatchConfig(
+            output_directory=tmp_path / "output",
+            path_to_neighbourhood_data=str(tmp_path / "neighbourhoods.parquet"),
+        ),
+    )
+    assert [result.error for result in results] == [None, None]
+    with open(results[1].output_directory / "b.csv") as file:
+        assert "(wijkdata gebruikt)" in file.read()
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_run_batch_invalid_zip_centroids(
+    tmp_path: Path, zip_directory: Path, processes: int
+) -> None:
+    with pytest.raises(InvalidZipCentroidsException):
+        run_batch(
+            find_zip_files(zip_directory),
+            BatchConfig(
+                output_directory=tmp_path / "output",
+                path_to_zip_centroids="./test/data/zip_centroids/invalid.csv",
+            ),
+            processes=processes,
+        )
@@ -0,0 +1,163 @@
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from hcp import csv_write
+from hcp.eml import EML
+from hcp.eml_types import CheckResult, PartyIdentifier
+from hcp.neighbourhood import NeighbourhoodData
+
+
+@pytest.mark.parametrize(
+    "odt_used, neighbourhoods_used", [(False, False), (True, True)]
+)
+def test_write_csv_files_equals_separate_files(
+    tmp_path: Path, eml_path: str, odt_used: bool, neighbourhoods_used: bool
+) -> None:
+    eml = EML.from_xml(eml_path)
+    neighbourhood_data = (
+        NeighbourhoodData.from_path("./data/zip_to_neighbourhood_2024.parquet")
+        if neighbourhoods_used
+        else None
+    )
+    check_results = eml.run_protocol(neighbourhood_data)
+    # Already recounted reporting units are left out of file a
+    first_id = next(iter(check_results))
+    check_results[first_id].already_recounted = odt_used
+
+    csv_write.write_csv_a(check_results, eml.metadata, odt_used, tmp_path / "a.csv")
+    csv_write.write_csv_b(
+        check_results, eml.metadata, neighbourhoods_used, tmp_path / "b.csv"
+    )
+    csv_write.write_csv_c(check_results, eml.metadata, tmp_path / "c.csv")
+
+    csv_write.write_csv_files(
+        iter(check_results.items()),
+        eml.metadata,
+        odt_used,
+        neighbourhoods_used,
+        tmp_path / "streamed_a.csv",
+        tmp_path / "streamed_b.csv",
+        tmp_path / "streamed_c.csv",
+    )
+
+    for name in ["a.csv", "b.csv", "c.csv"]:
+        assert (tmp_path / f"streamed_{name}").read_bytes() == (
+            tmp_path / name
+        ).read_bytes()
+
+
+def test_write_csv_files_to_streams(dordrecht_eml_path: str, tmp_path: Path) -> None:
+    eml = EML.from_xml(dordrecht_eml_path)
+    check_results = eml.run_protocol()
+    streams = [BytesIO(), BytesIO(), BytesIO()]
+    paths = [tmp_path / "a.csv", tmp_path / "b.csv", tmp_path / "c.csv"]
+
+    csv_write.write_csv_files(check_results.items(), eml.metadata, True, False, *paths)
+    csv_write.write_csv_files(
+        check_results.items(), eml.metadata, True, False, *streams
+    )
+
+    for path, stream in zip(paths, streams):
+        # The streams of the caller are not closed
+        assert not stream.closed
+        assert stream.getvalue() == path.read_bytes()
+
+
+@pytest.mark.parametrize(
+    "percentage, expected",
+    [
+        (12.34, "+12.3%"),
+        (-12.36, "-12.4%"),
+        (100.0, "+100.0%"),
+        (0.04, "0.0%"),
+        (0.0, "0.0%"),
+        (-0.04, "-0.0%"),
+        (0.05, "+0.1%"),
+        (0.25, "+0.2%"),
+        (0, "0%"),
+    ],
+)
+def test_format_percentage_deviation(percentage: float, expected: str) -> None:
+    assert csv_write._format_percentage_deviation(percentage) == expected
+
+
+def test_write_csv_c_main_unit_parties(tmp_path: Path, eml_path: str) -> None:
+    eml = EML.from_xml(eml_path)
+    check_results = eml.run_protocol()
+
+    csv_write.write_csv_c(check_results, eml.metadata, tmp_path / "c.csv")
+    csv_write.write_csv_c(
+        check_results,
+        eml.metadata,
+        tmp_path / "main_unit_c.csv",
+        parties=eml.main_unit_info.votes_per_party,
+    )
+
+    assert (tmp_path / "main_unit_c.csv").read_bytes() == (
+        tmp_path / "c.csv"
+    ).read_bytes()
+
+
+def test_write_csv_c_missing_party(
+    steenwijkerland_eml_path: str, tmp_path: Path
+) -> None:
+    eml = EML.from_xml(steenwijkerland_eml_path)
+    party_a = PartyIdentifier(id=1, name="A")
+    party_b = PartyIdentifier(id=2, name="B")
+
+    def check_result(party_difference_percentages) -> CheckResult:
+        return CheckResult(
+            zero_votes=False,
+            inexplicable_difference=0,
+            explanation_sum_difference=0,
+            high_invalid_vote_percentage=None,
+            high_blank_vote_percentage=None,
+            high_vote_difference=None,
+            parties_with_high_difference_percentage=[],
+            party_difference_percentages=party_difference_percentages,
+            potentially_switched_candidates=[],
+            already_recounted=False,
+        )
+
+    check_results = {
+        "1708::SB1": check_result({party_a: 1.0}),
+        "1708::SB2": check_result({party_b: -2.0, party_a: 3.0}),
+    }
+    csv_write.write_csv_c(
+        check_results, eml.metadata, tmp_path / "c.csv", parties=[party_b, party_a]
+    )
+
+    rows = (tmp_path / "c.csv").read_text().splitlines()[-3:]
+    assert [row.split(";")[7:] for row in rows] == [
+        ["A", "B"],
+        ["+1.0%", ""],
+        ["+3.0%", "-2.0%"],
+    ]
+
+
+@pytest.mark.parametrize(
+    "parties, expected_party_columns",
+    [(None, []), ([PartyIdentifier(id=2, name="B")], ["B"])],
+)
+def test_write_csv_c_without_reporting_units(
+    steenwijkerland_eml_path: str, tmp_path: Path, parties, expected_party_columns
+) -> None:
+    eml = EML.from_xml(steenwijkerland_eml_path)
+
+    csv_write.write_csv_c({}, eml.metadata, tmp_path / "c.csv", parties=parties)
+    csv_write.write_csv_files(
+        iter([]),
+        eml.metadata,
+        False,
+        False,
+        tmp_path / "streamed_a.csv",
+        tmp_path / "streamed_b.csv",
+        tmp_path / "streamed_c.csv",
+        parties=parties,
+    )
+
+    for name in ["c.csv", "streamed_c.csv"]:
+        last_row = (tmp_path / name).read_text().splitlines()[-1].split(";")
+        assert last_row == csv_write.HEADER_COLS + expected_party_columns
@@ -1,6 +1,7 @@
 import os
+from pathlib import Path
 
-from hcp.main import create_csv_files
+from hcp.main import create_csv_buffers, create_csv_files
 
 
 def test_create_csv_files_a_b():
@@ -116,3 +117,16 @@ def test_create_csv_files_a_b_2():
 
     for temp_file in [temp_out_a, temp_out_b, temp_out_c]:
         os.remove(temp_file)
+
+
+def test_create_csv_buffers(tmp_path: Path):
+    """The in-memory output is identical to the output files."""
+    path_to_eml = "./test/data/FAKE_TEST_DATA_TK2023_DORDRECHT/Fake_test_data_Telling_TK2023_gemeente_Dordrecht.eml.xml"
+    path_to_odt = "./test/data/FAKE_TEST_DATA_TK2023_DORDRECHT/Model_Na31-1.odt"
+
+    paths = [tmp_path / "a.csv", tmp_path / "b.csv", tmp_path / "c.csv"]
+    create_csv_files(path_to_eml, *paths, path_to_odt=path_to_odt)
+    buffers = create_csv_buffers(path_to_eml, path_to_odt=path_to_odt)
+
+    for path, buffer in zip(paths, buffers):
+        assert buffer.read() == path.read_bytes()
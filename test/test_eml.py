@@ -1,9 +1,14 @@
+import pickle
+
 import pytest
+from defusedxml import ElementTree as ET
 
+from hcp import xml_parser
 from hcp.eml import EML
 from hcp.eml_types import (
     CandidateIdentifier,
     EmlMetadata,
+    IdentifierRegistry,
     InvalidEmlException,
     PartyIdentifier,
     ReportingUnitInfo,
@@ -238,12 +243,178 @@ expected_emls = [
 ]
 
 
+@pytest.mark.parametrize("streaming", [False, True])
 @pytest.mark.parametrize("eml_path, expected_eml", zip(test_eml_paths, expected_emls))
-def test_eml_parsing(eml_path: str, expected_eml: EML) -> None:
-    parsed_eml = EML.from_xml(eml_path)
+def test_eml_parsing(eml_path: str, expected_eml: EML, streaming: bool) -> None:
+    parsed_eml = EML.from_xml(eml_path, streaming=streaming)
     assert parsed_eml == expected_eml
 
 
-def test_invalid_eml_id():
+def test_eml_streaming_equals_dom(eml_path: str) -> None:
+    assert EML.from_xml(eml_path, streaming=True) == EML.from_xml(eml_path)
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_eml_parallel_equals_dom(workers: int) -> None:
+    eml_path = (
+        "./test/data/e2e/Fake_test_data_Telling_EP2024_gemeente_Steenwijkerland.eml.xml"
+    )
+    assert EML.from_xml(eml_path, workers=workers) == EML.from_xml(eml_path)
+
+
+def test_split_reporting_units() -> None:
+    eml_path = (
+        "./test/data/e2e/Fake_test_data_Telling_EP2024_gemeente_Steenwijkerland.eml.xml"
+    )
+    unit_ranges = xml_parser.split_reporting_units(eml_path, 3)
+    assert len(unit_ranges.ranges) == 3
+    assert b"ReportingUnitVotes" not in unit_ranges.skeleton
+
+    reporting_unit_ids = [
+        info.reporting_unit_id
+        for start, end in unit_ranges.ranges
+        for info in xml_parser.parse_reporting_unit_range(
+            eml_path, start, end, unit_ranges.head, unit_ranges.tail
+        )
+    ]
+    assert reporting_unit_ids == [f"1708::SB{i}" for i in range(1, 5)]
+    assert unit_ranges.unit_count == 4
+
+
+@pytest.mark.parametrize(
+    "replacements",
+    [
+        # Prefix declared on an intermediate element, which the ranges do not have
+        [
+            ("<Contests>", '<Contests xmlns:c="urn:oasis:names:tc:evs:schema:eml">'),
+            ("<ReportingUnitVotes>", "<c:ReportingUnitVotes>"),
+            ("</ReportingUnitVotes>", "</c:ReportingUnitVotes>"),
+        ],
+        # Start tag in a comment, which is not a reporting unit
+        [("<Contests>", "<Contests><!-- <ReportingUnitVotes> -->")],
+    ],
+)
+def test_eml_parallel_falls_back_to_streaming(tmp_path, replacements) -> None:
+    eml_path = (
+        "./test/data/e2e/Fake_test_data_Telling_EP2024_gemeente_Steenwijkerland.eml.xml"
+    )
+    with open(eml_path, encoding="utf-8") as eml_file:
+        eml_text = eml_file.read()
+    for old, new in replacements:
+        assert old in eml_text
+        eml_text = eml_text.replace(old, new)
+    path = tmp_path / "namespaces.eml.xml"
+    path.write_text(eml_text, encoding="utf-8")
+
+    assert EML.from_xml(str(path), workers=2) == EML.from_xml(eml_path)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_invalid_eml_id(streaming: bool):
+    with pytest.raises(InvalidEmlException):
+        EML.from_xml("./test/data/emls/invalid_eml_id.eml.xml", streaming=streaming)
+
+
+def _reporting_unit(selections: str) -> str:
+    return (
+        '<ReportingUnitVotes xmlns="urn:oasis:names:tc:evs:schema:eml">'
+        f"{selections}"
+        "<Cast>10</Cast><TotalCounted>10</TotalCounted>"
+        "</ReportingUnitVotes>"
+    )
+
+
+PARTY_SELECTION = (
+    '<Selection><AffiliationIdentifier Id="1"><RegisteredName>A</RegisteredName>'
+    "</AffiliationIdentifier><ValidVotes>10</ValidVotes></Selection>"
+)
+CANDIDATE_SELECTION = (
+    '<Selection><Candidate><CandidateIdentifier Id="1"></CandidateIdentifier>'
+    "</Candidate><ValidVotes>10</ValidVotes></Selection>"
+)
+
+invalid_selections = [
+    # Neither a party nor a candidate
+    "<Selection><ValidVotes>10</ValidVotes></Selection>",
+    # Candidate without a preceding party
+    CANDIDATE_SELECTION,
+    # Party without id
+    "<Selection><AffiliationIdentifier></AffiliationIdentifier><ValidVotes>10</ValidVotes></Selection>",
+    # Party without votes
+    '<Selection><AffiliationIdentifier Id="1"></AffiliationIdentifier></Selection>',
+    # Candidate without id
+    PARTY_SELECTION
+    + "<Selection><Candidate><CandidateIdentifier></CandidateIdentifier></Candidate><ValidVotes>1</ValidVotes></Selection>",
+    # Candidate without votes
+    PARTY_SELECTION
+    + '<Selection><Candidate><CandidateIdentifier Id="1"></CandidateIdentifier></Candidate></Selection>',
+]
+
+
+@pytest.mark.parametrize("selections", invalid_selections)
+def test_invalid_selections(selections: str) -> None:
     with pytest.raises(InvalidEmlException):
-        EML.from_xml("./test/data/emls/invalid_eml_id.eml.xml")
+        xml_parser.get_reporting_unit_info(ET.fromstring(_reporting_unit(selections)))
+
+
+def test_selections() -> None:
+    info = xml_parser.get_reporting_unit_info(
+        ET.fromstring(_reporting_unit(PARTY_SELECTION + CANDIDATE_SELECTION))
+    )
+    assert info.votes_per_party == {PartyIdentifier(1, "A"): 10}
+    assert info.votes_per_candidate == {
+        CandidateIdentifier(PartyIdentifier(1, "A"), 1): 10
+    }
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_interned_identifiers(workers) -> None:
+    eml = EML.from_xml(
+        "./test/data/e2e/Fake_test_data_Telling_EP2024_gemeente_Steenwijkerland.eml.xml",
+        workers=workers,
+    )
+    main_parties = list(eml.main_unit_info.votes_per_party)
+    main_candidates = list(eml.main_unit_info.votes_per_candidate)
+    assert eml.identifiers.parties == main_parties
+    assert eml.identifiers.candidates == main_candidates
+    assert eml.identifiers.party_ordinals[main_parties[1]] == 1
+
+    for info in eml.reporting_units_info.values():
+        for party, main_party in zip(info.votes_per_party, main_parties):
+            assert party is main_party
+        for candidate, main_candidate in zip(info.votes_per_candidate, main_candidates):
+            assert candidate is main_candidate
+            assert (
+                candidate.party
+                is eml.identifiers.parties[
+                    eml.identifiers.party_ordinals[candidate.party]
+                ]
+            )
+
+
+def test_identifier_registry() -> None:
+    registry = IdentifierRegistry()
+    party = registry.party(1, "Partij")
+    assert registry.party(1, "Partij") is party
+    assert registry.party(1, None) is not party
+    candidate = registry.candidate(party, 3)
+    assert registry.candidate(party, 3) is candidate
+    assert candidate == CandidateIdentifier(PartyIdentifier(1, "Partij"), 3)
+    assert hash(candidate) == hash(CandidateIdentifier(PartyIdentifier(1, "Partij"), 3))
+    assert registry.candidate_ordinals[candidate] == 0
+
+    # The cached hash is not pickled, as string hashes differ between processes
+    assert "_hash" in candidate.__dict__
+    unpickled = pickle.loads(pickle.dumps(candidate))
+    assert "_hash" not in unpickled.__dict__
+    assert unpickled == candidate
+
+
+@pytest.mark.parametrize("vectorised", [False, True])
+def test_iter_protocol(vectorised: bool) -> None:
+    eml = EML.from_xml(
+        "./test/data/e2e/Fake_test_data_Telling_EP2024_gemeente_Steenwijkerland.eml.xml"
+    )
+    results = eml.iter_protocol(vectorised=vectorised)
+    assert not isinstance(results, dict)
+    assert list(results) == list(eml.run_protocol(vectorised=vectorised).items())
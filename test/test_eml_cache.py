@@ -0,0 +1,93 @@
+import os
+from pathlib import Path
+
+from hcp import xml_parser
+from hcp.eml import EML
+from hcp.eml_cache import CACHE_SUFFIX, EmlCache
+
+
+def test_cache_roundtrip(eml_path: str, tmp_path: Path) -> None:
+    cache = EmlCache(directory=tmp_path)
+    key = cache.key(eml_path)
+    assert key is not None
+    assert cache.get(key) is None
+
+    parsed_eml = EML.from_xml(eml_path, cache=cache)
+    assert len(list(tmp_path.glob(f"*{CACHE_SUFFIX}"))) == 1
+    assert cache.get(key) == parsed_eml
+    assert EML.from_xml(eml_path, cache=cache) == parsed_eml
+
+
+def test_cache_hit_skips_parsing(
+    dordrecht_eml_path: str, tmp_path: Path, monkeypatch
+) -> None:
+    cache = EmlCache(directory=tmp_path)
+    parsed_eml = EML.from_xml(dordrecht_eml_path, cache=cache)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Parsed while cached")
+
+    monkeypatch.setattr(xml_parser, "parse_xml", fail)
+    assert EML.from_xml(dordrecht_eml_path, cache=cache) == parsed_eml
+
+
+def test_cache_key(
+    dordrecht_eml_path: str, steenwijkerland_eml_path: str, tmp_path: Path, monkeypatch
+) -> None:
+    cache = EmlCache(directory=tmp_path)
+    key = cache.key(dordrecht_eml_path)
+    with open(dordrecht_eml_path, "rb") as eml_file:
+        assert cache.key(eml_file) == key
+        # The stream is left at its original position
+        assert eml_file.tell() == 0
+
+    assert cache.key(steenwijkerland_eml_path) != key
+
+    # A new parser version invalidates the cache
+    monkeypatch.setattr(xml_parser, "PARSER_VERSION", xml_parser.PARSER_VERSION + 1)
+    assert cache.key(dordrecht_eml_path) != key
+
+
+def test_cache_eviction(
+    tmp_path: Path, dordrecht_eml_path: str, steenwijkerland_eml_path: str
+) -> None:
+    cache = EmlCache(directory=tmp_path)
+    for eml_path in [dordrecht_eml_path, steenwijkerland_eml_path]:
+        EML.from_xml(eml_path, cache=cache)
+    key_0, key_1 = (
+        cache.key(eml_path)
+        for eml_path in [dordrecht_eml_path, steenwijkerland_eml_path]
+    )
+    assert key_0 is not None and key_1 is not None
+    entry_0 = tmp_path / f"{key_0}{CACHE_SUFFIX}"
+    entry_1 = tmp_path / f"{key_1}{CACHE_SUFFIX}"
+
+    # Make the first entry the oldest, and then use it so it is the most recently used
+    os.utime(entry_0, (1000, 1000))
+    os.utime(entry_1, (2000, 2000))
+    assert cache.get(key_0) is not None
+
+    # Only room for the first entry, so the least recently used one is evicted
+    cache.max_size = entry_0.stat().st_size
+    cache._evict()
+    assert entry_0.exists()
+    assert not entry_1.exists()
+
+
+def test_cache_corrupt_entry(dordrecht_eml_path: str, tmp_path: Path) -> None:
+    cache = EmlCache(directory=tmp_path)
+    key = cache.key(dordrecht_eml_path)
+    assert key is not None
+    (tmp_path / f"{key}{CACHE_SUFFIX}").write_bytes(b"not a cache entry")
+    assert cache.get(key) is None
+    assert not (tmp_path / f"{key}{CACHE_SUFFIX}").exists()
+
+
+def test_cache_clear(
+    tmp_path: Path, dordrecht_eml_path: str, steenwijkerland_eml_path: str
+) -> None:
+    cache = EmlCache(directory=tmp_path)
+    for eml_path in [dordrecht_eml_path, steenwijkerland_eml_path]:
+        EML.from_xml(eml_path, cache=cache)
+    cache.clear()
+    assert list(tmp_path.glob(f"*{CACHE_SUFFIX}")) == []
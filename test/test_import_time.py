@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from hcp.neighbourhood_index import write_index
+
+# Generous upper bound on the cumulative import time of `hcp.main`, which is about
+# 0.1 seconds without polars and 0.3 seconds with it
+MAX_IMPORT_TIME_US = 2_000_000
+
+
+def _import_times(statement: str) -> Dict[str, int]:
+    # Cumulative import time in microseconds per imported module, as reported by
+    # `python -X importtime`
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+    )
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        import_times[module.strip()] = int(cumulative)
+    return import_times
+
+
+@pytest.mark.parametrize("module", ["hcp", "hcp.main", "hcp.eml", "hcp.cli"])
+def test_import_without_polars(module: str) -> None:
+    import_times = _import_times(f"import {module}")
+    assert module in import_times
+    assert "polars" not in import_times
+    assert "hcp.vectorised_checks" not in import_times
+
+
+def test_import_time() -> None:
+    import_times = _import_times("import hcp.main")
+    assert "hcp.neighbourhood" not in import_times
+    assert import_times["hcp.main"] < MAX_IMPORT_TIME_US
+
+
+def test_cli_imports_subcommands_when_used() -> None:
+    import_times = _import_times("import hcp.cli")
+    for module in [
+        "hcp.batch",
+        "hcp.serve",
+        "hcp.ingest",
+        "hcp.neighbourhood",
+        "hcp.nearest_reporting_units",
+    ]:
+        assert module not in import_times
+
+
+def test_neighbourhood_data_imports_polars() -> None:
+    import_times = _import_times(
+        "from hcp.neighbourhood import NeighbourhoodData; "
+        "NeighbourhoodData.from_path('./test/data/neighbourhood_files/valid.csv')"
+    )
+    assert "polars" in import_times
+
+
+def test_indexed_neighbourhood_data_without_polars(tmp_path: Path) -> None:
+    index_path = tmp_path / "neighbourhoods.idx"
+    write_index([("1234AB", "WK123", False)], index_path)
+    import_times = _import_times(
+        "from hcp.neighbourhood import NeighbourhoodData; "
+        f"data = NeighbourhoodData.from_path({str(index_path)!r}); "
+        "assert data.fetch_neighbourhood_code('1234AB') == 'WK123'"
+    )
+    assert "polars" not in import_times
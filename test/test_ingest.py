@@ -0,0 +1,93 @@
+from pathlib import Path
+
+import pytest
+
+from hcp.eml import EML
+from hcp.eml_cache import EmlCache
+from hcp.ingest import InvalidZipException, open_election_result_zip
+from hcp.main import create_csv_files
+from hcp.odt import ODT
+
+
+def test_open_election_result_zip(
+    tmp_path: Path, osv_zip, dordrecht_eml_path: str, odt_path: str
+) -> None:
+    zip_path = tmp_path / "osv.zip"
+    zip_path.write_bytes(osv_zip())
+
+    with open_election_result_zip(zip_path) as election_result_zip:
+        assert (
+            election_result_zip.eml_file_name
+            == f"tellingen/{Path(dordrecht_eml_path).name}"
+        )
+        eml = EML.from_xml(election_result_zip.eml_file)
+
+    assert eml == EML.from_xml(dordrecht_eml_path)
+    odt = ODT.from_path(odt_path)
+    assert odt is not None
+    assert election_result_zip.odt is not None
+    assert election_result_zip.odt.type == odt.type
+    assert sorted(
+        election_result_zip.odt.get_already_recounted_polling_stations(),
+        key=lambda polling_station: polling_station.id,
+    ) == sorted(
+        odt.get_already_recounted_polling_stations(),
+        key=lambda polling_station: polling_station.id,
+    )
+
+
+@pytest.mark.parametrize("eml, odt", [(False, True), (True, False)])
+def test_open_election_result_zip_missing_files(
+    tmp_path: Path, osv_zip, dordrecht_eml_path: str, eml: bool, odt: bool
+) -> None:
+    zip_path = tmp_path / "osv.zip"
+    zip_path.write_bytes(osv_zip(eml_path=dordrecht_eml_path if eml else None, odt=odt))
+
+    with pytest.raises(InvalidZipException):
+        with open_election_result_zip(zip_path):
+            pass
+
+
+@pytest.mark.parametrize(
+    "streaming, workers", [(False, None), (True, None), (False, 2)]
+)
+def test_eml_from_zip_stream_with_cache(
+    tmp_path: Path, osv_zip, dordrecht_eml_path: str, streaming: bool, workers: int
+) -> None:
+    zip_path = tmp_path / "osv.zip"
+    zip_path.write_bytes(osv_zip())
+    cache = EmlCache(directory=tmp_path / "cache")
+    expected = EML.from_xml(dordrecht_eml_path)
+
+    for _ in range(2):
+        with open_election_result_zip(zip_path) as election_result_zip:
+            eml = EML.from_xml(
+                election_result_zip.eml_file,
+                streaming=streaming,
+                workers=workers,
+                cache=cache,
+            )
+        assert eml == expected
+    assert len(list(cache.directory.iterdir())) == 1
+
+
+def test_create_csv_files_from_zip(
+    tmp_path: Path, osv_zip, dordrecht_eml_path: str, odt_path: str
+) -> None:
+    zip_path = tmp_path / "osv.zip"
+    zip_path.write_bytes(osv_zip())
+    paths = [tmp_path / "a.csv", tmp_path / "b.csv", tmp_path / "c.csv"]
+    zip_paths = [tmp_path / "zip_a.csv", tmp_path / "zip_b.csv", tmp_path / "zip_c.csv"]
+
+    create_csv_files(
+        dordrecht_eml_path,
+        *paths,
+        path_to_odt=odt_path,
+    )
+    with open_election_result_zip(zip_path) as election_result_zip:
+        create_csv_files(
+            election_result_zip.eml_file, *zip_paths, odt=election_result_zip.odt
+        )
+
+    for path, zip_path in zip(paths, zip_paths):
+        assert zip_path.read_bytes() == path.read_bytes()
@@ -0,0 +1,154 @@
+import random
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pytest
+
+from hcp.eml_types import CandidateIdentifier, PartyIdentifier, ReportingUnitInfo
+from hcp.main import create_csv_files
+from hcp.nearest_reporting_units import (
+    InvalidZipCentroidsException,
+    KDTree,
+    ZipCentroidData,
+)
+
+
+def _brute_force(points: List[Tuple[float, float]], point, k: int) -> List[int]:
+    return sorted(
+        range(len(points)),
+        key=lambda index: (
+            (points[index][0] - point[0]) ** 2 + (points[index][1] - point[1]) ** 2,
+            index,
+        ),
+    )[:k]
+
+
+@pytest.mark.parametrize("k", [0, 1, 5, 50, 500])
+def test_kd_tree_equals_brute_force(k: int) -> None:
+    rng = random.Random(k)
+    points = [(rng.uniform(0, 1000), rng.uniform(0, 1000)) for _ in range(200)]
+    # Points on a grid give many points at the same distance
+    points += [(float(x * 100), float(y * 100)) for x in range(5) for y in range(5)]
+    points += points[:10]
+    tree = KDTree(points)
+
+    for point in points[::7] + [(500.0, 500.0), (-100.0, 2000.0)]:
+        assert tree.query(point, k) == _brute_force(points, point, k)
+
+
+def test_kd_tree_empty() -> None:
+    assert KDTree([]).query((0.0, 0.0), 3) == []
+
+
+read_test_cases = [
+    ("./test/data/zip_centroids/valid.csv", True),
+    ("./test/data/zip_centroids/invalid.csv", False),
+    ("./test/data/zip_centroids/THIS_FILE_DOES_NOT_EXIST.csv", False),
+    (None, False),
+]
+
+
+@pytest.mark.parametrize("path_to_read, should_load", read_test_cases)
+def test_read_zip_centroids(path_to_read: Optional[str], should_load: bool) -> None:
+    result = ZipCentroidData.from_path(path_to_read)
+    if should_load:
+        assert isinstance(result, ZipCentroidData)
+        assert result.centroids["1000AD"] == (300.5, 0.0)
+    else:
+        assert result is None
+
+
+def test_read_malformed_zip_centroids(tmp_path: Path) -> None:
+    path = tmp_path / "malformed.csv"
+    path.write_text("zip_code,x,y\n1000AA,0,zero\n")
+    assert ZipCentroidData.from_path(str(path)) is None
+
+
+def test_nearest_reference_groups() -> None:
+    data = ZipCentroidData.from_path("./test/data/zip_centroids/valid.csv", k=3)
+    assert data is not None
+
+    party = PartyIdentifier(id=1, name=None)
+    candidate = CandidateIdentifier(party, 1)
+    reporting_units = [
+        ("SB1", "1000AA", 1, None),
+        ("SB2", "1000AB", 2, None),
+        ("SB3", "1000AC", 4, None),
+        ("SB4", "1000AD", 8, None),
+        ("SB5", "1000AE", 16, None),
+        # Same location as SB1
+        ("SB6", "1000AA", 32, None),
+        ("SB7", None, 64, None),
+        ("SB8", "9999ZZ", 128, None),
+        ("SB9", "1000AA", 256, "Mobiel stembureau"),
+    ]
+    reporting_unit_zips = {id: zip for id, zip, _, _ in reporting_units}
+    reporting_unit_info = {
+        id: ReportingUnitInfo(
+            reporting_unit_id=id,
+            reporting_unit_name=name,
+            cast=0,
+            total_counted=votes,
+            rejected_votes={},
+            uncounted_votes={},
+            votes_per_party={party: votes},
+            votes_per_candidate={candidate: votes},
+        )
+        for id, _, votes, name in reporting_units
+    }
+
+    reporting_neighbourhoods = data.fetch_reporting_neighbourhoods(
+        reporting_unit_zips, reporting_unit_info
+    )
+
+    expected_groups = {
+        "SB1": ({"SB1", "SB6", "SB2"}, 35),
+        "SB2": ({"SB2", "SB1", "SB3"}, 7),
+        "SB3": ({"SB3", "SB2", "SB4"}, 14),
+        "SB4": ({"SB4", "SB3", "SB2"}, 14),
+        "SB5": ({"SB5", "SB4", "SB3"}, 28),
+        "SB6": ({"SB6", "SB1", "SB2"}, 35),
+    }
+    for reporting_unit_id in reporting_unit_info:
+        reference_group = reporting_neighbourhoods.get_reference_group(
+            reporting_unit_id
+        )
+        if reporting_unit_id not in expected_groups:
+            assert reference_group is None
+            assert reporting_neighbourhoods.get_reference_size(reporting_unit_id) == 0
+            continue
+
+        expected_ids, expected_votes = expected_groups[reporting_unit_id]
+        assert reference_group is not None
+        assert reference_group.votes_per_party == {party: expected_votes}
+        assert reference_group.votes_per_candidate == {candidate: expected_votes}
+        group_id = reporting_neighbourhoods.reporting_unit_id_to_neighbourhood_id[
+            reporting_unit_id
+        ]
+        assert group_id is not None
+        assert (
+            reporting_neighbourhoods.neighbourhood_id_to_reporting_unit_ids[group_id]
+            == expected_ids
+        )
+        assert reporting_neighbourhoods.get_sufficient_reference_group(
+            reporting_unit_id, 3
+        ) == (reference_group, 3)
+
+
+def test_nearest_reference_groups_without_locations() -> None:
+    data = ZipCentroidData(centroids={})
+    reporting_neighbourhoods = data.fetch_reporting_neighbourhoods({"SB1": None}, {})
+    assert reporting_neighbourhoods.get_reference_group("SB1") is None
+
+
+def test_create_csv_files_invalid_zip_centroids(tmp_path: Path) -> None:
+    # No silent fallback to the neighbourhood data
+    with pytest.raises(InvalidZipCentroidsException):
+        create_csv_files(
+            "./test/data/FAKE_TEST_DATA_TK2023_DORDRECHT/Fake_test_data_Telling_TK2023_gemeente_Dordrecht.eml.xml",
+            str(tmp_path / "a.csv"),
+            str(tmp_path / "b.csv"),
+            str(tmp_path / "c.csv"),
+            path_to_neighbourhood_data="./data/zip_to_neighbourhood_2024.parquet",
+            path_to_zip_centroids="./test/data/zip_centroids/invalid.csv",
+        )
@@ -1,10 +1,21 @@
 from itertools import repeat
-from typing import Dict, Optional
+from pathlib import Path
+from typing import Dict, List, Optional
 
 import pytest
 
 from hcp.eml_types import CandidateIdentifier, PartyIdentifier, ReportingUnitInfo
-from hcp.neighbourhood import NeighbourhoodData, ReportingNeighbourhoods
+from hcp.neighbourhood import (
+    IndexedNeighbourhoodData,
+    LazyFrameNeighbourhoodData,
+    NeighbourhoodData,
+    NeighbourhoodRegistry,
+    ReportingNeighbourhoods,
+    ZipNeighbourhood,
+    _build_reference_groups,
+    _municipality_code,
+    _VoteSum,
+)
 
 read_test_cases = [
     ("./test/data/neighbourhood_files/valid.parquet", True),
@@ -43,6 +54,129 @@ def test_fetch_neighbourhood_code(
     assert data is not None and data.fetch_neighbourhood_code(zip_code) == expected
 
 
+def test_fetch_neighbourhood_codes() -> None:
+    data = NeighbourhoodData.from_path("./data/zip_to_neighbourhood_2024.parquet")
+    assert data is not None
+    assert data.fetch_neighbourhood_codes(["1011AB", "1011VX", "0000XX"]) == {
+        "1011AB": ZipNeighbourhood(neighbourhood_code="WK0363AF", ambiguous=False),
+        "1011VX": ZipNeighbourhood(neighbourhood_code="WK0363AF", ambiguous=True),
+    }
+    assert data.fetch_neighbourhood_codes([]) == {}
+
+
+def test_fetch_neighbourhood_codes_duplicate_zip(tmp_path: Path) -> None:
+    path = tmp_path / "duplicate.csv"
+    path.write_text(
+        "zip_code,neighbourhood_code,ambiguous\n"
+        "1234AB,WK123,no\n"
+        "1234AB,WK124,no\n"
+        "1235AB,WK123,no\n"
+    )
+    data = NeighbourhoodData.from_path(str(path))
+    assert data is not None
+    assert data.fetch_neighbourhood_codes(["1234AB", "1235AB"]) == {
+        "1235AB": ZipNeighbourhood(neighbourhood_code="WK123", ambiguous=False)
+    }
+
+
+@pytest.mark.parametrize(
+    "authority_id, expected",
+    [("0363", "0363"), ("363", "0363"), ("1708", "1708"), ("alg", None), (None, None)],
+)
+def test_municipality_code(authority_id: Optional[str], expected: Optional[str]):
+    assert _municipality_code(authority_id) == expected
+
+
+scoped_fetch_test_cases = [
+    # Zip codes in the municipality itself
+    (["1011AB", "1011VX"], "0363"),
+    # Zip codes outside the municipality are looked up in the other municipalities
+    (["1011AB", "7941AB", "0000XX"], "1708"),
+    (["1011AB", "7941AB", "0000XX"], None),
+    ([], "0363"),
+]
+
+
+@pytest.mark.parametrize("zip_codes, municipality_code", scoped_fetch_test_cases)
+def test_fetch_neighbourhood_codes_scoped(
+    zip_codes: List[str], municipality_code: Optional[str]
+) -> None:
+    data = NeighbourhoodData.from_path("./data/zip_to_neighbourhood_2024.parquet")
+    legacy_data = NeighbourhoodData.from_path(
+        "./test/data/neighbourhood_files/valid.parquet"
+    )
+    assert data is not None and legacy_data is not None
+    expected = legacy_data.fetch_neighbourhood_codes(zip_codes)
+    assert data.fetch_neighbourhood_codes(zip_codes, municipality_code) == expected
+    assert (
+        legacy_data.fetch_neighbourhood_codes(zip_codes, municipality_code) == expected
+    )
+
+
+def test_fetch_neighbourhood_codes_scoped_duplicate_zip(tmp_path: Path) -> None:
+    # 1234AB occurs in municipalities 0123 and 0456, 1236AB twice in 0123
+    csv_path = tmp_path / "duplicate.csv"
+    csv_path.write_text(
+        "zip_code,neighbourhood_code,ambiguous\n"
+        "1234AB,WK012301,no\n"
+        "1234AB,WK045601,no\n"
+        "1235AB,WK012302,no\n"
+        "1236AB,WK012301,no\n"
+        "1236AB,WK012302,no\n"
+    )
+    csv_data = NeighbourhoodData.from_path(str(csv_path))
+    assert isinstance(csv_data, LazyFrameNeighbourhoodData)
+    parquet_path = tmp_path / "duplicate.parquet"
+    csv_data.write_parquet(str(parquet_path))
+    data = NeighbourhoodData.from_path(str(parquet_path))
+    assert data is not None
+    zip_codes = ["1234AB", "1235AB", "1236AB"]
+
+    # Scoped to a municipality, the zip code is resolved within that municipality
+    assert data.fetch_neighbourhood_codes(zip_codes, "0123") == {
+        "1234AB": ZipNeighbourhood(neighbourhood_code="WK012301", ambiguous=False),
+        "1235AB": ZipNeighbourhood(neighbourhood_code="WK012302", ambiguous=False),
+    }
+    assert data.fetch_neighbourhood_codes(zip_codes, "0456") == {
+        "1234AB": ZipNeighbourhood(neighbourhood_code="WK045601", ambiguous=False),
+        "1235AB": ZipNeighbourhood(neighbourhood_code="WK012302", ambiguous=False),
+    }
+
+    # Without scoping, and without municipality codes, it is left out as a duplicate
+    expected = {
+        "1235AB": ZipNeighbourhood(neighbourhood_code="WK012302", ambiguous=False)
+    }
+    assert data.fetch_neighbourhood_codes(zip_codes) == expected
+    assert csv_data.fetch_neighbourhood_codes(zip_codes, "0123") == expected
+    index_path = tmp_path / "duplicate.idx"
+    csv_data.write_index(str(index_path))
+    index_data = NeighbourhoodData.from_path(str(index_path))
+    assert index_data is not None
+    assert index_data.fetch_neighbourhood_codes(zip_codes, "0123") == expected
+
+
+def test_write_parquet(tmp_path: Path) -> None:
+    data = NeighbourhoodData.from_path("./test/data/neighbourhood_files/valid.csv")
+    assert isinstance(data, LazyFrameNeighbourhoodData)
+    path = tmp_path / "neighbourhoods.parquet"
+    assert data.write_parquet(str(path)) == 2
+
+    written_data = NeighbourhoodData.from_path(str(path))
+    assert isinstance(written_data, LazyFrameNeighbourhoodData)
+    assert written_data.data.columns == [
+        "zip_code",
+        "neighbourhood_code",
+        "ambiguous",
+        "municipality_code",
+    ]
+    assert written_data.data.select(
+        "municipality_code"
+    ).collect().to_series().to_list() == ["123", "123"]
+    assert written_data.fetch_neighbourhood_codes(["1234AB"], "0123") == {
+        "1234AB": ZipNeighbourhood(neighbourhood_code="WK123", ambiguous=False)
+    }
+
+
 reporting_neighbourhoods_test_cases = [
     (
         "./test/data/neighbourhood_files/valid.csv",
@@ -281,3 +415,108 @@ def test_reporting_neighbourhoods_size(
     expected: Optional[ReportingUnitInfo],
 ):
     assert reporting_neighbourhoods.get_reference_size(reporting_unit_id) == expected
+
+
+def test_build_reference_groups() -> None:
+    party = PartyIdentifier(id=1, name=None)
+    candidate = CandidateIdentifier(party, 1)
+    reporting_unit_info = {
+        id: ReportingUnitInfo(
+            reporting_unit_id=id,
+            reporting_unit_name=id,
+            cast=0,
+            total_counted=votes,
+            rejected_votes={},
+            uncounted_votes={},
+            votes_per_party={party: votes},
+            votes_per_candidate={candidate: votes},
+        )
+        for id, votes in [("a", 1), ("b", 2), ("c", 4), ("d", 8)]
+    }
+    reference_groups = _build_reference_groups(
+        {"a": "WK1", "b": "WK2", "c": "WK1", "d": None}, reporting_unit_info
+    )
+
+    assert {
+        neighbourhood_id: (
+            reference_group.votes_per_party,
+            reference_group.votes_per_candidate,
+        )
+        for neighbourhood_id, reference_group in reference_groups.items()
+    } == {
+        "WK1": ({party: 5}, {candidate: 5}),
+        "WK2": ({party: 2}, {candidate: 2}),
+    }
+    # The votes of the reporting units themselves are left untouched
+    assert reporting_unit_info["a"].votes_per_party == {party: 1}
+
+
+def test_vote_sum_adds_in_place() -> None:
+    vote_sum: _VoteSum[str] = _VoteSum()
+    vote_sum.add({"a": 1, "b": 2})
+    totals = vote_sum.totals
+    vote_sum.add({"b": 20, "a": 10})
+    vote_sum.add({"a": 100, "b": 200})
+
+    assert vote_sum.totals is totals
+    assert vote_sum.to_dict() == {"a": 111, "b": 222}
+
+
+def test_get_sufficient_reference_group(tmp_path: Path) -> None:
+    path = tmp_path / "neighbourhoods.csv"
+    path.write_text(
+        "zip_code,neighbourhood_code,ambiguous\n"
+        "1000AA,WK000101,no\n"
+        "1000AB,WK000102,no\n"
+    )
+    neighbourhood_data = NeighbourhoodData.from_path(str(path))
+    assert neighbourhood_data is not None
+
+    party = PartyIdentifier(id=1, name=None)
+    candidate = CandidateIdentifier(party, 1)
+    reporting_unit_zips = {"a": "1000AA", "b": "1000AB", "c": "1000AB", "d": None}
+    reporting_unit_info = {
+        id: ReportingUnitInfo(
+            reporting_unit_id=id,
+            reporting_unit_name=id,
+            cast=0,
+            total_counted=votes,
+            rejected_votes={},
+            uncounted_votes={},
+            votes_per_party={party: votes},
+            votes_per_candidate={candidate: votes},
+        )
+        for id, votes in [("a", 1), ("b", 2), ("c", 4), ("d", 8)]
+    }
+    reporting_neighbourhoods = neighbourhood_data.fetch_reporting_neighbourhoods(
+        reporting_unit_zips, reporting_unit_info
+    )
+
+    def sufficient(reporting_unit_id: str, minimum_reporting_units: int):
+        reference = reporting_neighbourhoods.get_sufficient_reference_group(
+            reporting_unit_id, minimum_reporting_units
+        )
+        if reference is None:
+            return None
+        reference_group, size = reference
+        return (
+            reference_group.reporting_unit_id,
+            size,
+            reference_group.votes_per_party[party],
+        )
+
+    assert sufficient("a", 1) == ("WK000101", 1, 1)
+    assert sufficient("b", 2) == ("WK000102", 2, 6)
+    # Neighbourhood too small, so only the municipality can be used
+    assert sufficient("a", 2) is None
+    assert sufficient("c", 3) is None
+    # No neighbourhood
+    assert sufficient("d", 1) is None
+
+
+def test_neighbourhood_data_is_abstract() -> None:
+    class IncompleteNeighbourhoodData(NeighbourhoodData):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteNeighbourhoodData()  # type: ignore[abstract]
@@ -0,0 +1,140 @@
+from pathlib import Path
+from typing import Optional, Tuple
+
+import polars as pl
+import pytest
+
+from hcp.neighbourhood import (
+    IndexedNeighbourhoodData,
+    LazyFrameNeighbourhoodData,
+    NeighbourhoodData,
+    cached_index,
+)
+from hcp.neighbourhood_index import NeighbourhoodIndex, write_index, zip_key
+
+
+@pytest.mark.parametrize(
+    "zip_code, expected",
+    [
+        ("0000AA", 0),
+        ("0000AB", 1),
+        ("0001AA", 676),
+        ("9999ZZ", 9999 * 676 + 675),
+        ("1234ab", None),
+        ("1234 AB", None),
+        ("123AB", None),
+        ("", None),
+    ],
+)
+def test_zip_key(zip_code: str, expected: Optional[int]) -> None:
+    assert zip_key(zip_code) == expected
+
+
+lookup_test_cases = [
+    ("1234AB", ("WK123", False)),
+    ("1235AB", ("WK12345", True)),
+    ("1236AB", None),
+    ("1234AC", None),
+    ("0000AA", None),
+    ("INVALID", None),
+]
+
+
+@pytest.mark.parametrize("zip_code, expected", lookup_test_cases)
+def test_index_lookup(
+    tmp_path: Path, zip_code: str, expected: Optional[Tuple[str, bool]]
+) -> None:
+    path = tmp_path / "neighbourhoods.idx"
+    zip_amount = write_index(
+        [
+            ("1235AB", "WK12345", True),
+            ("1234AB", "WK123", False),
+            # Duplicate zip codes can not be resolved and are left out
+            ("1236AB", "WK123", False),
+            ("1236AB", "WK124", False),
+            ("INVALID", "WK123", False),
+        ],
+        path,
+    )
+    assert zip_amount == 2
+
+    index = NeighbourhoodIndex.open(path)
+    assert len(index) == 2
+    assert index.lookup(zip_code) == expected
+
+
+def test_empty_index(tmp_path: Path) -> None:
+    path = tmp_path / "empty.idx"
+    assert write_index([], path) == 0
+    assert NeighbourhoodIndex.open(path).lookup("1234AB") is None
+
+
+@pytest.mark.parametrize("content", [b"", b"HCPNBH", b"not an index" * 10])
+def test_read_invalid_index(tmp_path: Path, content: bytes) -> None:
+    path = tmp_path / "invalid.idx"
+    path.write_bytes(content)
+    assert NeighbourhoodData.from_path(str(path)) is None
+
+
+def test_read_truncated_index(tmp_path: Path) -> None:
+    path = tmp_path / "truncated.idx"
+    write_index([("1234AB", "WK123", False)], path)
+    path.write_bytes(path.read_bytes()[:-1])
+    assert NeighbourhoodData.from_path(str(path)) is None
+
+
+@pytest.mark.parametrize(
+    "source_path",
+    [
+        "./test/data/neighbourhood_files/valid.csv",
+        "./data/zip_to_neighbourhood_2024.parquet",
+    ],
+)
+def test_indexed_equals_lazy_frame(tmp_path: Path, source_path: str) -> None:
+    source = NeighbourhoodData.from_path(source_path)
+    assert isinstance(source, LazyFrameNeighbourhoodData)
+    index_path = tmp_path / "neighbourhoods.idx"
+    source.write_index(str(index_path))
+    indexed = NeighbourhoodData.from_path(str(index_path))
+    assert isinstance(indexed, IndexedNeighbourhoodData)
+
+    zip_codes = (
+        source.data.select("zip_code").head(2000).collect().to_series().to_list()
+    )
+    zip_codes += ["1234AC", "0000XX", "INVALID"]
+    assert indexed.fetch_neighbourhood_codes(
+        zip_codes
+    ) == source.fetch_neighbourhood_codes(zip_codes)
+
+
+def test_indexed_full_dataset(tmp_path: Path) -> None:
+    source_path = "./data/zip_to_neighbourhood_2024.parquet"
+    index_path = tmp_path / "neighbourhoods.idx"
+    source = NeighbourhoodData.from_path(source_path)
+    assert isinstance(source, LazyFrameNeighbourhoodData)
+    source.write_index(str(index_path))
+    index = NeighbourhoodIndex.open(index_path)
+
+    expected = (
+        pl.read_parquet(
+            source_path, columns=["zip_code", "neighbourhood_code", "ambiguous"]
+        )
+        .filter(pl.col("zip_code").is_duplicated().not_())
+        .sample(1000, seed=0)
+    )
+    for zip_code, neighbourhood_code, ambiguous in expected.iter_rows():
+        assert index.lookup(zip_code) == (neighbourhood_code, ambiguous != "no")
+
+
+def test_cached_index(tmp_path: Path) -> None:
+    source = Path("./test/data/neighbourhood_files/valid.csv")
+    index_path = cached_index(source, tmp_path)
+    assert index_path.parent == tmp_path and index_path.suffix == ".idx"
+    assert cached_index(source, tmp_path) == index_path
+
+    data = NeighbourhoodData.from_path(str(index_path))
+    assert data is not None and data.fetch_neighbourhood_code("1234AB") == "WK123"
+
+    # Falls back to the source if it can not be indexed
+    invalid_source = Path("./test/data/neighbourhood_files/invalid.csv")
+    assert cached_index(invalid_source, tmp_path) == invalid_source
@@ -0,0 +1,163 @@
+from pathlib import Path
+
+import polars as pl
+
+from hcp.eml_types import (
+    CandidateIdentifier,
+    CheckResult,
+    EmlMetadata,
+    PartyIdentifier,
+    SwitchedCandidate,
+    VoteDifferenceAmount,
+    VoteDifferencePercentage,
+)
+from hcp.main import create_csv_files
+from hcp.parquet_write import CHECK_RESULT_SCHEMA, write_parquet
+
+party_a = PartyIdentifier(id=1, name="A")
+party_b = PartyIdentifier(id=2, name=None)
+
+metadata = EmlMetadata(
+    creation_date_time="2024-06-06T21:00:00",
+    authority_id="1708",
+    authority_name="Steenwijkerland",
+    election_id="EP2024",
+    election_name="Europees Parlement 2024",
+    election_domain=None,
+    election_date="2024-06-06",
+    contest_identifier="alle",
+    reporting_unit_amount=2,
+    reporting_unit_names={"1708::SB1": "Stembureau Gemeentehuis"},
+    reporting_unit_zips={},
+)
+
+
+def _check_result(**fields) -> CheckResult:
+    defaults = dict(
+        zero_votes=False,
+        inexplicable_difference=0,
+        explanation_sum_difference=0,
+        high_invalid_vote_percentage=None,
+        high_blank_vote_percentage=None,
+        high_vote_difference=None,
+        parties_with_high_difference_percentage=[],
+        party_difference_percentages={party_b: -1.5, party_a: 0},
+        potentially_switched_candidates=[],
+        already_recounted=False,
+    )
+    return CheckResult(**{**defaults, **fields})
+
+
+def test_write_parquet(tmp_path: Path) -> None:
+    check_results = {
+        "1708::SB1": _check_result(
+            inexplicable_difference=2,
+            high_invalid_vote_percentage=5.5,
+            high_vote_difference=VoteDifferenceAmount(value=20),
+            parties_with_high_difference_percentage=["A (16.0%)"],
+            potentially_switched_candidates=[
+                SwitchedCandidate(
+                    candidate_with_fewer=CandidateIdentifier(party_a, 1),
+                    candidate_with_fewer_received=10,
+                    candidate_with_fewer_expected=210,
+                    candidate_with_more=CandidateIdentifier(party_a, 2),
+                    candidate_with_more_received=200,
+                    candidate_with_more_expected=5,
+                )
+            ],
+            already_recounted=True,
+        ),
+        "1708::SB2": _check_result(
+            zero_votes=True,
+            high_vote_difference=VoteDifferencePercentage(value=12.5),
+        ),
+    }
+    destination = tmp_path / "results.parquet"
+    write_parquet(check_results.items(), metadata, destination)
+
+    results = pl.read_parquet(destination)
+    assert results.schema == CHECK_RESULT_SCHEMA
+    assert results.to_dicts() == [
+        {
+            "election_id": "EP2024",
+            "contest_identifier": "alle",
+            "authority_id": "1708",
+            "authority_name": "Steenwijkerland",
+            "reporting_unit_id": "1708::SB1",
+            "reporting_unit_name": "Stembureau Gemeentehuis",
+            "zero_votes": False,
+            "inexplicable_difference": 2,
+            "explanation_sum_difference": 0,
+            "high_invalid_vote_percentage": 5.5,
+            "high_blank_vote_percentage": None,
+            "high_vote_difference_amount": 20,
+            "high_vote_difference_percentage": None,
+            "parties_with_high_difference_percentage": ["A (16.0%)"],
+            "party_difference_percentages": [
+                {"party_id": 1, "party_name": "A", "percentage": 0.0},
+                {"party_id": 2, "party_name": None, "percentage": -1.5},
+            ],
+            "potentially_switched_candidates": [
+                {
+                    "party_id": 1,
+                    "party_name": "A",
+                    "candidate_with_fewer": 1,
+                    "candidate_with_fewer_received": 10,
+                    "candidate_with_fewer_expected": 210,
+                    "candidate_with_more": 2,
+                    "candidate_with_more_received": 200,
+                    "candidate_with_more_expected": 5,
+                }
+            ],
+            "already_recounted": True,
+        },
+        {
+            "election_id": "EP2024",
+            "contest_identifier": "alle",
+            "authority_id": "1708",
+            "authority_name": "Steenwijkerland",
+            "reporting_unit_id": "1708::SB2",
+            "reporting_unit_name": None,
+            "zero_votes": True,
+            "inexplicable_difference": 0,
+            "explanation_sum_difference": 0,
+            "high_invalid_vote_percentage": None,
+            "high_blank_vote_percentage": None,
+            "high_vote_difference_amount": None,
+            "high_vote_difference_percentage": 12.5,
+            "parties_with_high_difference_percentage": [],
+            "party_difference_percentages": [
+                {"party_id": 1, "party_name": "A", "percentage": 0.0},
+                {"party_id": 2, "party_name": None, "percentage": -1.5},
+            ],
+            "potentially_switched_candidates": [],
+            "already_recounted": False,
+        },
+    ]
+
+
+def test_write_parquet_empty(tmp_path: Path) -> None:
+    destination = tmp_path / "results.parquet"
+    write_parquet([], metadata, destination)
+
+    results = pl.read_parquet(destination)
+    assert results.schema == CHECK_RESULT_SCHEMA
+    assert len(results) == 0
+
+
+def test_create_csv_files_parquet(tmp_path: Path) -> None:
+    create_csv_files(
+        "./test/data/FAKE_TEST_DATA_TK2023_DORDRECHT/Fake_test_data_Telling_TK2023_gemeente_Dordrecht.eml.xml",
+        str(tmp_path / "a.csv"),
+        str(tmp_path / "b.csv"),
+        str(tmp_path / "c.csv"),
+        "./test/data/FAKE_TEST_DATA_TK2023_DORDRECHT/Model_Na31-1.odt",
+        dest_parquet=str(tmp_path / "results.parquet"),
+    )
+
+    results = pl.read_parquet(tmp_path / "results.parquet")
+    assert results["authority_id"].unique().to_list() == ["0505"]
+    # The same reporting unit which is left out of output file a as recounted
+    assert results.filter(pl.col("already_recounted"))[
+        "inexplicable_difference"
+    ].to_list() == [2]
@@ -0,0 +1,121 @@
+import http.client
+import io
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Iterator
+from zipfile import ZipFile
+
+import pytest
+
+from hcp.eml_cache import EmlCache
+from hcp.main import create_csv_files
+from hcp.serve import DURATION_HEADER, HcpServer, HcpService, make_server
+
+
+@pytest.fixture
+def server(tmp_path: Path, osv_zip) -> Iterator[HcpServer]:
+    service = HcpService(cache=EmlCache(directory=tmp_path / "cache"))
+    service.warm_up()
+    server = make_server(service, port=0, max_upload_size=len(osv_zip()))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def _url(server: HcpServer, path: str) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}{path}"
+
+
+def _post(server: HcpServer, path: str, body: bytes):
+    request = urllib.request.Request(_url(server, path), data=body, method="POST")
+    return urllib.request.urlopen(request, timeout=30)
+
+
+def test_health(server: HcpServer) -> None:
+    with urllib.request.urlopen(_url(server, "/health"), timeout=30) as response:
+        assert response.status == 200
+        assert response.read() == b"ok"
+
+
+def test_run(
+    tmp_path: Path,
+    server: HcpServer,
+    osv_zip,
+    dordrecht_eml_path: str,
+    odt_path: str,
+) -> None:
+    create_csv_files(
+        dordrecht_eml_path,
+        str(tmp_path / "a.csv"),
+        str(tmp_path / "b.csv"),
+        str(tmp_path / "c.csv"),
+        path_to_odt=odt_path,
+    )
+
+    # The second request is served from the cache
+    for _ in range(2):
+        with _post(server, "/run", osv_zip()) as response:
+            assert response.status == 200
+            assert response.headers["Content-Type"] == "application/zip"
+            assert float(response.headers[DURATION_HEADER]) >= 0
+            output = ZipFile(io.BytesIO(response.read()))
+
+        assert output.namelist() == ["a.csv", "b.csv", "c.csv"]
+        for name in output.namelist():
+            assert output.read(name) == (tmp_path / name).read_bytes()
+
+
+@pytest.mark.parametrize(
+    "path, body, status",
+    [
+        ("/run", b"not a zip file", 400),
+        ("/run", b"", 400),
+        ("/other", b"", 404),
+    ],
+)
+def test_run_invalid(server: HcpServer, path: str, body: bytes, status: int) -> None:
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _post(server, path, body)
+    assert error.value.code == status
+
+
+@pytest.mark.parametrize(
+    "eml, message",
+    [
+        (b"<EML", b"Invalid XML"),
+        (
+            b'<!DOCTYPE EML [<!ENTITY a "a">]><EML>&a;</EML>',
+            b"Forbidden XML",
+        ),
+    ],
+)
+def test_run_invalid_xml(
+    server: HcpServer, osv_zip, eml: bytes, message: bytes
+) -> None:
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _post(server, "/run", osv_zip(eml=eml))
+    assert error.value.code == 400
+    assert error.value.read().startswith(message)
+
+
+@pytest.mark.parametrize(
+    "content_length, status", [("-1", 400), ("abc", 411), ("1000000000", 413)]
+)
+def test_run_invalid_content_length(
+    server: HcpServer, content_length: str, status: int
+) -> None:
+    host, port = server.server_address[:2]
+    connection = http.client.HTTPConnection(str(host), port, timeout=30)
+    try:
+        connection.putrequest("POST", "/run")
+        connection.putheader("Content-Length", content_length)
+        connection.endheaders()
+        assert connection.getresponse().status == status
+    finally:
+        connection.close()
@@ -0,0 +1,171 @@
+from typing import Dict
+
+import pytest
+
+from hcp.eml import EML
+from hcp.eml_types import (
+    CandidateIdentifier,
+    EmlMetadata,
+    PartyIdentifier,
+    ReportingUnitInfo,
+)
+from hcp.main import create_csv_buffers
+from hcp.neighbourhood import NeighbourhoodData
+
+party_a = PartyIdentifier(id=1, name="A")
+party_b = PartyIdentifier(id=2, name=None)
+
+
+def _unit(
+    reporting_unit_id,
+    total_counted: int,
+    votes_per_party: Dict[PartyIdentifier, int],
+    rejected_votes: Dict[str, int],
+    uncounted_votes: Dict[str, int],
+) -> ReportingUnitInfo:
+    return ReportingUnitInfo(
+        reporting_unit_id=reporting_unit_id,
+        reporting_unit_name=None,
+        cast=0,
+        total_counted=total_counted,
+        rejected_votes=rejected_votes,
+        uncounted_votes=uncounted_votes,
+        votes_per_party=votes_per_party,
+        votes_per_candidate={
+            CandidateIdentifier(party, 1): votes
+            for party, votes in votes_per_party.items()
+        },
+    )
+
+
+def _eml(main_unit: ReportingUnitInfo, *units: ReportingUnitInfo) -> EML:
+    return EML(
+        eml_file_id="510b",
+        main_unit_info=main_unit,
+        reporting_units_info={unit.reporting_unit_id: unit for unit in units},
+        metadata=EmlMetadata(
+            *([None] * 8),
+            reporting_unit_amount=len(units),
+            reporting_unit_names={},
+            reporting_unit_zips={},
+        ),
+    )
+
+
+edge_case_eml = _eml(
+    _unit(
+        None,
+        150,
+        {party_a: 100, party_b: 50},
+        {"ongeldig": 4, "blanco": 3},
+        {"geen verklaring": 2, "toegelaten kiezers": 150},
+    ),
+    # More votes than admitted voters, partially explained
+    _unit(
+        "SB1",
+        100,
+        {party_a: 60, party_b: 40},
+        {"ongeldig": 4, "blanco": 0},
+        {
+            "geen verklaring": 1,
+            "toegelaten kiezers": 90,
+            "te veel uitgereikte stembiljetten": 3,
+        },
+    ),
+    # Fewer votes than admitted voters, and the only unit with votes for party B
+    _unit(
+        "SB2",
+        50,
+        {party_a: 50, party_b: 10},
+        {"ongeldig": 0, "blanco": 3},
+        {"geen verklaring": 1, "toegelaten kiezers": 80, "meegenomen stembiljetten": 2},
+    ),
+    # No votes at all
+    _unit(
+        "SB3",
+        0,
+        {party_a: 0},
+        {"ongeldig": 0, "blanco": 0},
+        {"geen verklaring": 0, "toegelaten kiezers": 0},
+    ),
+)
+
+# The main unit has no votes, so both percentages divide by zero
+zero_eml = _eml(
+    _unit(
+        None,
+        0,
+        {party_a: 0},
+        {"ongeldig": 0, "blanco": 0},
+        {"geen verklaring": 0, "toegelaten kiezers": 0},
+    ),
+    _unit(
+        "SB1",
+        0,
+        {party_a: 0},
+        {"ongeldig": 0, "blanco": 0},
+        {"geen verklaring": 0, "toegelaten kiezers": 0},
+    ),
+)
+
+
+def test_vectorised_equals_scalar(eml_path: str) -> None:
+    eml = EML.from_xml(eml_path)
+    assert eml.run_protocol(vectorised=True) == eml.run_protocol()
+
+
+def test_vectorised_equals_scalar_with_neighbourhoods(
+    steenwijkerland_eml_path: str,
+) -> None:
+    eml = EML.from_xml(steenwijkerland_eml_path)
+    neighbourhood_data = NeighbourhoodData.from_path(
+        "./data/zip_to_neighbourhood_2024.parquet"
+    )
+    assert neighbourhood_data is not None
+    assert eml.run_protocol(neighbourhood_data, vectorised=True) == eml.run_protocol(
+        neighbourhood_data
+    )
+
+
+def test_create_csv_files_vectorised(steenwijkerland_eml_path: str) -> None:
+    kwargs = {"path_to_neighbourhood_data": "./data/zip_to_neighbourhood_2024.parquet"}
+    vectorised_buffers = create_csv_buffers(
+        steenwijkerland_eml_path, vectorised=True, **kwargs
+    )
+    buffers = create_csv_buffers(steenwijkerland_eml_path, **kwargs)
+    assert [buffer.getvalue() for buffer in vectorised_buffers] == [
+        buffer.getvalue() for buffer in buffers
+    ]
+
+
+@pytest.mark.parametrize("eml", [edge_case_eml, zero_eml])
+def test_vectorised_edge_cases(eml: EML) -> None:
+    vectorised_results = eml.run_protocol(vectorised=True)
+    scalar_results = eml.run_protocol()
+    assert vectorised_results == scalar_results
+
+    # Types matter for the output files, e.g. an integer 0 difference percentage
+    for reporting_unit_id, scalar_result in scalar_results.items():
+        vectorised_result = vectorised_results[reporting_unit_id]
+        for field in vars(scalar_result):
+            assert type(getattr(vectorised_result, field)) is type(
+                getattr(scalar_result, field)
+            )
+        for party, difference in scalar_result.party_difference_percentages.items():
+            assert type(vectorised_result.party_difference_percentages[party]) is type(
+                difference
+            )
+        assert list(vectorised_result.party_difference_percentages) == list(
+            scalar_result.party_difference_percentages
+        )
+
+
+def test_vectorised_missing_reason_code() -> None:
+    eml = _eml(
+        edge_case_eml.main_unit_info,
+        _unit("SB1", 10, {party_a: 10}, {"ongeldig": 0}, {"geen verklaring": 0}),
+    )
+    with pytest.raises(KeyError):
+        eml.run_protocol()
+    with pytest.raises(KeyError):
+        eml.run_protocol(vectorised=True)
@@ -0,0 +1,57 @@
+import pytest
+
+from hcp.eml import EML
+from hcp.eml_types import PartyIdentifier, ReportingUnitInfo
+from hcp.vote_matrix import MISSING, VoteColumns, VoteMatrix
+
+
+def test_columnar_equals_dicts(eml_path: str) -> None:
+    eml = EML.from_xml(eml_path)
+    columnar_eml = EML.from_xml(eml_path, columnar=True)
+    assert eml.vote_matrix is None
+    assert columnar_eml.vote_matrix is not None
+    assert len(columnar_eml.vote_matrix) == len(eml.reporting_units_info) + 1
+    assert columnar_eml == eml
+    assert columnar_eml.run_protocol() == eml.run_protocol()
+
+
+def test_vote_columns() -> None:
+    columns: VoteColumns[str] = VoteColumns()
+    columns.append({"a": 1, "b": 0})
+    columns.append({"b": 2, "c": 3})
+
+    assert columns.keys == ["a", "b", "c"]
+    assert list(columns.columns[0]) == [1, MISSING]
+    assert list(columns.columns[2]) == [MISSING, 3]
+
+    first, second = columns.view(0), columns.view(1)
+    assert first == {"a": 1, "b": 0}
+    assert second == {"b": 2, "c": 3}
+    assert len(second) == 2
+    assert list(second) == ["b", "c"]
+    assert list(second.items()) == [("b", 2), ("c", 3)]
+    assert "a" not in second
+    assert second.get("a") is None
+    with pytest.raises(KeyError):
+        second["a"]
+    with pytest.raises(KeyError):
+        second["d"]
+
+
+def test_vote_matrix_views() -> None:
+    party = PartyIdentifier(id=1, name="Partij")
+    unit = ReportingUnitInfo(
+        reporting_unit_id="0001::SB1",
+        reporting_unit_name="Stembureau",
+        cast=10,
+        total_counted=8,
+        rejected_votes={"ongeldig": 1, "blanco": 1},
+        uncounted_votes={},
+        votes_per_party={party: 8},
+        votes_per_candidate={},
+    )
+    vote_matrix = VoteMatrix()
+    view = vote_matrix.append(unit)
+    assert view == unit
+    assert vote_matrix.unit(0) == unit
+    assert list(vote_matrix.cast) == [10]